@@ -209,6 +209,7 @@ def test_pre_recorded_audio():
     if not found_files:
         print("⚠️  未找到预录制的测试音频文件")
         print("请将测试音频文件（WAV格式，16kHz，单声道）放在当前目录")
+        print("批量转写整个目录请使用: python bulk_transcribe.py <目录> -o results.jsonl")
         return None
     
     print(f"📁 找到测试文件: {found_files}")
@@ -0,0 +1,267 @@
+# asr_server.py
+"""
+多会话ASR引擎：一个已加载的Paraformer流式模型同时服务多路音频
+- 每个会话有自己的重分块环形缓冲和流式缓存（cache），互不干扰
+- 工作线程按tick收集各会话已就绪的chunk_stride分片，一个tick内成批识别，结果按会话ID送回各自的输出队列
+- 模型提供generate_batch(inputs, caches, is_finals)时整批一次调用（真正的批量推理）；
+  FunASR的AutoModel没有generate_batch（流式generate每次只接受一个cache），此时一个tick内逐会话依次调用——
+  成批只是调度上的分组（批处理方式为sequential），收益是多路共享一个模型副本省下的显存/内存，单核吞吐不会因批大小提升
+"""
+import time
+import uuid
+import queue
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from audio_ring_buffer import AudioRingBuffer
+from base_interface import TextData
+
+# Paraformer流式识别参数（与FunASRStreamingASR一致）
+CHUNK_SIZE = [0, 10, 5]          # 600ms
+ENCODER_CHUNK_LOOK_BACK = 4
+DECODER_CHUNK_LOOK_BACK = 1
+CHUNK_STRIDE = CHUNK_SIZE[1] * 960
+SAMPLE_RATE = 16000
+
+
+class ASRSession:
+    """单路音频流的识别状态"""
+
+    def __init__(self, session_id: str, stride: int):
+        self.session_id = session_id
+        self.ring_buffer = AudioRingBuffer(8 * stride)  # 最多积压4.8秒（会话多、识别暂时跟不上时）
+        self.chunk = np.zeros(stride, dtype=np.float32)  # 本次识别的分片（从环形缓冲拷出，写入方可继续写）
+        self.cache: Dict[str, Any] = {}
+        self.output_queue: queue.Queue = queue.Queue()
+        self.ready_times: Deque[float] = deque()  # 每个已就绪分片的就绪时刻
+        self.finishing = False    # 音频流已结束，等待识别剩余音频
+        self.closed = False
+        self.text = ""            # 累计识别结果
+        self.audio_seconds = 0.0
+        self.lock = threading.Lock()
+
+
+class MultiSessionASREngine:
+    """按会话路由的流式ASR引擎，所有会话共享一个模型实例"""
+
+    def __init__(self, asr_model=None, max_batch: int = 8, tick_interval: float = 0.02,
+                 on_result: Optional[Callable[[str, str, bool], None]] = None):
+        """
+        :param asr_model: 已加载的流式ASR模型（如FunASRStreamingASR().asr_model），None时加载paraformer-zh-streaming
+        :param max_batch: 一个tick最多识别的分片数
+        :param tick_interval: 没有新音频时的最长等待（秒）
+        :param on_result: 识别结果回调(session_id, 文本, 是否结束)，另外结果也会放入会话的输出队列
+        """
+        if asr_model is None:
+            from funasr import AutoModel
+            asr_model = AutoModel(model="paraformer-zh-streaming", model_revision="v2.0.4", disable_update=True)
+        self.asr_model = asr_model
+        # native：模型整批推理；sequential：tick内逐会话调用generate（批处理只是调度上的分组）
+        self.batch_mode = "native" if callable(getattr(asr_model, "generate_batch", None)) else "sequential"
+        self.max_batch = max_batch
+        self.tick_interval = tick_interval
+        self.on_result = on_result
+        self.stride = CHUNK_STRIDE
+
+        self._sessions: Dict[str, ASRSession] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+        # 统计
+        self.ticks = 0
+        self.batched_chunks = 0
+        self.audio_seconds = 0.0
+        self.compute_time = 0.0
+        self.cpu_time = 0.0
+        self.queue_waits: Deque[float] = deque(maxlen=10000)  # 分片就绪 → 开始识别
+        self.latencies: Deque[float] = deque(maxlen=10000)    # 分片就绪 → 结果送出
+
+        self._running = True
+        self._worker = threading.Thread(target=self._worker_loop, name="ASR-Server", daemon=True)
+        self._worker.start()
+
+    # ===================== 会话管理 =====================
+    def open_session(self, session_id: Optional[str] = None) -> str:
+        """创建会话，返回会话ID"""
+        session_id = session_id or uuid.uuid4().hex[:8]
+        with self._lock:
+            if session_id in self._sessions:
+                raise ValueError(f"会话已存在: {session_id}")
+            self._sessions[session_id] = ASRSession(session_id, self.stride)
+        return session_id
+
+    def get_output_queue(self, session_id: str) -> queue.Queue:
+        """会话的结果队列（TextData，音频流结束后放入一个空文本的结束标记）"""
+        return self._get_session(session_id).output_queue
+
+    def feed(self, session_id: str, pcm_data: bytes):
+        """送入16kHz单声道16bit PCM（任意长度）"""
+        session = self._get_session(session_id)
+        with session.lock:
+            if session.finishing:
+                raise RuntimeError(f"会话{session_id}的音频流已结束")
+            session.ring_buffer.write_pcm16(pcm_data)
+            now = time.monotonic()
+            ready = session.ring_buffer.available // self.stride
+            while len(session.ready_times) > ready:  # 识别跟不上、最旧的音频被覆盖
+                session.ready_times.popleft()
+            while len(session.ready_times) < ready:
+                session.ready_times.append(now)
+        self._wakeup.set()
+
+    def finish(self, session_id: str):
+        """音频流结束：识别剩余音频（is_final）并输出结束标记"""
+        session = self._get_session(session_id)
+        with session.lock:
+            session.finishing = True
+        self._wakeup.set()
+
+    def close_session(self, session_id: str):
+        """立即关闭会话（丢弃未识别的音频）"""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session.closed = True
+
+    def _get_session(self, session_id: str) -> ASRSession:
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None:
+            raise KeyError(f"会话不存在: {session_id}")
+        return session
+
+    # ===================== 调度 =====================
+    def _collect_batch(self) -> List[Tuple[ASRSession, np.ndarray, bool, float]]:
+        """按就绪时间先后，从各会话取出已就绪的分片（每个会话每个tick最多一个，保证流式缓存按顺序更新）"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        candidates = []
+        for session in sessions:
+            with session.lock:
+                if session.ready_times:
+                    candidates.append((session.ready_times[0], session))
+                elif session.finishing:
+                    candidates.append((time.monotonic(), session))
+        candidates.sort(key=lambda item: item[0])
+
+        batch = []
+        for ready_time, session in candidates[:self.max_batch]:
+            with session.lock:
+                view = session.ring_buffer.read_stride(self.stride)
+                if view is not None:
+                    session.ready_times.popleft()
+                    np.copyto(session.chunk, view)
+                    batch.append((session, session.chunk, False, ready_time))
+                elif session.finishing:
+                    tail = session.ring_buffer.read_remaining()
+                    # 没有剩余音频时用一帧静音触发is_final
+                    tail = tail.copy() if tail is not None else np.zeros(320, dtype=np.float32)
+                    batch.append((session, tail, True, ready_time))
+        return batch
+
+    def _generate_batch(self, batch: List[Tuple[ASRSession, np.ndarray, bool, float]]) -> List[str]:
+        """一批分片的识别：模型支持批量时一次调用，否则依次调用"""
+        if self.batch_mode == "native":
+            return self.asr_model.generate_batch(
+                [chunk for _, chunk, _, _ in batch],
+                [session.cache for session, _, _, _ in batch],
+                [is_final for _, _, is_final, _ in batch],
+            )
+        texts = []
+        for session, chunk, is_final, _ in batch:
+            res = self.asr_model.generate(
+                input=chunk,
+                cache=session.cache,
+                is_final=is_final,
+                chunk_size=CHUNK_SIZE,
+                encoder_chunk_look_back=ENCODER_CHUNK_LOOK_BACK,
+                decoder_chunk_look_back=DECODER_CHUNK_LOOK_BACK
+            )
+            texts.append(res[0]["text"] if res and len(res) > 0 else "")
+        return texts
+
+    def _worker_loop(self):
+        while self._running:
+            self._wakeup.clear()
+            batch = self._collect_batch()
+            if not batch:
+                self._wakeup.wait(self.tick_interval)
+                continue
+
+            start, cpu_start = time.monotonic(), time.thread_time()
+            try:
+                texts = self._generate_batch(batch)
+            except Exception as e:
+                print(f"❌ ASR批量识别错误: {e}")
+                texts = [""] * len(batch)
+            end = time.monotonic()
+            self.ticks += 1
+            self.batched_chunks += len(batch)
+            self.compute_time += end - start
+            self.cpu_time += time.thread_time() - cpu_start
+
+            for (session, chunk, is_final, ready_time), text in zip(batch, texts):
+                try:
+                    self._route(session, chunk, is_final, text)
+                except Exception as e:
+                    # on_result回调出错只影响该会话的这一分片，工作线程继续服务其他会话
+                    print(f"❌ ASR结果分发错误（会话 {session.session_id}）: {e}")
+                    if is_final and not session.closed:
+                        session.output_queue.put(TextData(text="", is_finish=True))
+                        self.close_session(session.session_id)
+                self.queue_waits.append(start - ready_time)
+                self.latencies.append(time.monotonic() - ready_time)
+
+    def _route(self, session: ASRSession, chunk: np.ndarray, is_final: bool, text: str):
+        """把识别结果送回对应会话"""
+        if session.closed:
+            return
+        seconds = len(chunk) / SAMPLE_RATE
+        session.audio_seconds += seconds
+        self.audio_seconds += seconds
+        if text:
+            session.text += text
+            session.output_queue.put(TextData(text=text, is_finish=False))
+            if self.on_result:
+                self.on_result(session.session_id, text, False)
+        if is_final:
+            session.output_queue.put(TextData(text="", is_finish=True))
+            self.close_session(session.session_id)
+            if self.on_result:
+                self.on_result(session.session_id, "", True)
+
+    # ===================== 统计与关闭 =====================
+    @staticmethod
+    def _percentile(values: List[float], p: float) -> Optional[float]:
+        if not values:
+            return None
+        values = sorted(values)
+        return round(values[min(len(values) - 1, int(len(values) * p / 100))] * 1000, 1)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取引擎统计：吞吐（每CPU秒识别的音频秒数）和批处理带来的排队延迟"""
+        with self._lock:
+            active = len(self._sessions)
+        waits, latencies = list(self.queue_waits), list(self.latencies)
+        return {
+            "active_sessions": active,
+            "batch_mode": self.batch_mode,
+            "ticks": self.ticks,
+            "chunks": self.batched_chunks,
+            "mean_batch_size": round(self.batched_chunks / self.ticks, 2) if self.ticks else 0.0,
+            "audio_seconds": round(self.audio_seconds, 2),
+            "compute_seconds": round(self.compute_time, 3),
+            "audio_s_per_cpu_s": round(self.audio_seconds / self.cpu_time, 2) if self.cpu_time else None,
+            "rtf": round(self.compute_time / self.audio_seconds, 4) if self.audio_seconds else None,
+            "queue_wait_ms": {"p50": self._percentile(waits, 50), "p95": self._percentile(waits, 95)},
+            "chunk_latency_ms": {"p50": self._percentile(latencies, 50), "p95": self._percentile(latencies, 95)},
+        }
+
+    def shutdown(self):
+        """停止工作线程"""
+        self._running = False
+        self._wakeup.set()
+        self._worker.join(timeout=2)
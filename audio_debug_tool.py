@@ -6,6 +6,7 @@ import wave
 import os
 from tts_driver import GenieTTSModule
 from base_interface import TextData, AudioData
+from sentence_segmenter import IncrementalSentenceSegmenter
 
 class AudioDebugger:
     """音频调试工具"""
@@ -82,11 +83,8 @@ class AudioDebugger:
         return len(self.audio_chunks)
     
     def _split_into_sentences(self, text, max_sentences):
-        """简单句子分割"""
-        import re
-        # 使用标点符号分割
-        sentences = re.split(r'[。！？!?]', text)
-        sentences = [s.strip() for s in sentences if s.strip()]
+        """句子分割（与对话时LLM→TTS的分句一致）"""
+        sentences = IncrementalSentenceSegmenter.split(text)
         
         # 限制句子数量
         if len(sentences) > max_sentences:
@@ -0,0 +1,432 @@
+# audio_devices.py
+"""
+音频设备后端：AudioDriver通过后端打开输入/输出流，不直接依赖pyaudio
+- PyAudioBackend：声卡（麦克风 + 扬声器）
+- NullSink：丢弃输出音频，按实时速度或不限速地消费（无声卡服务器、压测）
+- WavFileSink：把输出音频写入WAV文件，或把原始PCM写入文件/管道（如 sys.stdout.buffer | aplay）
+- WavFileSource：把WAV文件当作麦克风，按实时速度（或不限速）逐帧送出，读完后送出静音（或循环）
+- CombinedBackend：输入、输出分别使用不同后端（如WAV输入 + 空输出）
+create_backend("null", "wav:in.wav") 按字符串配置创建后端，见其说明。
+
+输入、输出流都是回调模式（返回的流对象需有close()）：
+- 输出：后端按 frames_per_buffer 周期调用 render(frame_count, underflow) 取数据（见playback_engine）
+- 输入：每采到 frames_per_buffer 帧调用 on_frames(pcm, overflow)（见capture_buffer）
+"""
+import os
+import sys
+import time
+import wave
+import threading
+from typing import Any, BinaryIO, Callable, Dict, Optional, Union
+
+import numpy as np
+
+try:
+    import pyaudio
+except ImportError:  # 无声卡的服务器上可以不装pyaudio，只用下面的无头后端
+    pyaudio = None
+
+Render = Callable[[int, bool], bytes]
+OnFrames = Callable[[bytes, bool], None]
+
+
+class AudioBackend:
+    """音频设备后端接口"""
+    name = "base"
+    realtime_input = True  # 输入按实时速度产生（声卡）；False时采集缓冲对输入施加背压而不是丢弃音频
+
+    def open_output(self, sample_rate: int, channels: int, sample_width: int, frames_per_buffer: int,
+                    render: Render):
+        """打开回调模式的输出流（返回的对象需有close()）"""
+        raise RuntimeError(f"{self.name} 后端不支持音频输出")
+
+    def open_input(self, sample_rate: int, channels: int, sample_width: int, frames_per_buffer: int,
+                   on_frames: OnFrames):
+        """打开回调模式的输入流（返回的对象需有close()）"""
+        raise RuntimeError(f"{self.name} 后端不支持音频输入")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+    def terminate(self):
+        """释放后端资源"""
+
+
+# ===================== 声卡 =====================
+class PyAudioBackend(AudioBackend):
+    """声卡（pyaudio）"""
+    name = "pyaudio"
+
+    def __init__(self):
+        if pyaudio is None:
+            raise RuntimeError("未安装pyaudio，无声卡环境请使用 null / wav 后端")
+        self.p = pyaudio.PyAudio()
+
+    def open_output(self, sample_rate, channels, sample_width, frames_per_buffer, render):
+        def callback(in_data, frame_count, time_info, status):
+            return render(frame_count, bool(status & pyaudio.paOutputUnderflow)), pyaudio.paContinue
+
+        return self.p.open(
+            format=self.p.get_format_from_width(sample_width),
+            channels=channels,
+            rate=sample_rate,
+            output=True,
+            frames_per_buffer=frames_per_buffer,
+            stream_callback=callback
+        )
+
+    def open_input(self, sample_rate, channels, sample_width, frames_per_buffer, on_frames):
+        def callback(in_data, frame_count, time_info, status):
+            on_frames(in_data, bool(status & pyaudio.paInputOverflow))
+            return None, pyaudio.paContinue
+
+        return self.p.open(
+            format=self.p.get_format_from_width(sample_width),
+            channels=channels,
+            rate=sample_rate,
+            input=True,
+            frames_per_buffer=frames_per_buffer,
+            stream_callback=callback
+        )
+
+    def terminate(self):
+        if self.p is not None:
+            try:
+                self.p.terminate()
+            except Exception:
+                pass
+            self.p = None
+
+
+# ===================== 无头输出 =====================
+class _CallbackOutputStream:
+    """模拟声卡回调的输出流：后台线程按周期调用render，把取到的数据交给on_data"""
+
+    def __init__(self, sample_rate: int, channels: int, sample_width: int, frames_per_buffer: int,
+                 render: Render, on_data: Callable[[bytes, bool], None], realtime: bool = True):
+        self.frames_per_buffer = frames_per_buffer
+        self.period = frames_per_buffer / sample_rate
+        self.render = render
+        self.on_data = on_data
+        self.realtime = realtime
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="无头音频输出", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        deadline = time.monotonic()
+        while not self._closed.is_set():
+            data = self.render(self.frames_per_buffer, False)
+            silent = not data.strip(b"\0")
+            self.on_data(data, silent)
+            if self.realtime or silent:
+                # 实时模式按回调周期等待；不限速模式只在空闲（全静音）时等待，避免空转
+                deadline = max(deadline + self.period, time.monotonic() - self.period)
+                self._closed.wait(max(0.0, deadline - time.monotonic()))
+            else:
+                deadline = time.monotonic()
+
+    def close(self):
+        self._closed.set()
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout=1)
+
+
+class NullSink(AudioBackend):
+    """空输出：消费并丢弃音频（realtime=False时不限速，有多少取多少）"""
+    name = "null"
+
+    def __init__(self, realtime: bool = True):
+        self.realtime = realtime
+        self._lock = threading.Lock()
+        self.blocks = 0
+        self.audio_seconds = 0.0    # 非静音块的时长
+        self.silence_seconds = 0.0
+
+    def open_output(self, sample_rate, channels, sample_width, frames_per_buffer, render):
+        self._prepare(sample_rate, channels, sample_width)
+        block_seconds = frames_per_buffer / sample_rate
+
+        def on_data(data: bytes, silent: bool):
+            with self._lock:
+                self.blocks += 1
+                if silent:
+                    self.silence_seconds += block_seconds
+                else:
+                    self.audio_seconds += block_seconds
+            if not silent or self.realtime:
+                self._consume(data)
+
+        return _CallbackOutputStream(sample_rate, channels, sample_width, frames_per_buffer, render, on_data,
+                                     realtime=self.realtime)
+
+    def _prepare(self, sample_rate: int, channels: int, sample_width: int):
+        """打开输出流前调用（子类据此准备输出文件）"""
+
+    def _consume(self, data: bytes):
+        """处理一块输出音频（不限速模式下全静音的块视为空闲，不会传入）"""
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": self.name,
+                "realtime": self.realtime,
+                "blocks": self.blocks,
+                "audio_s": round(self.audio_seconds, 3),
+                "silence_s": round(self.silence_seconds, 3),
+            }
+
+
+class WavFileSink(NullSink):
+    """把输出音频写入WAV文件（raw=True时把原始PCM写入文件或管道）"""
+    name = "wav"
+
+    def __init__(self, target: Union[str, BinaryIO], realtime: bool = True, raw: bool = False):
+        """
+        :param target: 文件路径，或已打开的二进制流（如sys.stdout.buffer）
+        :param raw: True时不写WAV头（写入不可seek的管道时使用）
+        """
+        super().__init__(realtime)
+        self.target = target
+        self.raw = raw
+        if raw:
+            self.name = "raw"
+        self._file = None
+        self._format = None
+        self._files = 0
+        self.paths = []
+
+    def _prepare(self, sample_rate, channels, sample_width):
+        fmt = (sample_rate, channels, sample_width)
+        if fmt == self._format:
+            return  # 格式不变时继续写同一个文件
+        if self._file is not None and not isinstance(self.target, str):
+            raise ValueError("写入流时不支持中途改变音频格式")
+        self._close_file()
+        self._format = fmt
+        target = self.target
+        if isinstance(target, str):
+            if self._files:
+                # 格式变化：另起一个文件 out.1.wav、out.2.wav……
+                stem, ext = os.path.splitext(target)
+                target = f"{stem}.{self._files}{ext}"
+            self.paths.append(target)
+        self._files += 1
+        if self.raw:
+            self._file = open(target, "wb") if isinstance(target, str) else target
+        else:
+            self._file = wave.open(target, "wb")
+            self._file.setnchannels(channels)
+            self._file.setsampwidth(sample_width)
+            self._file.setframerate(sample_rate)
+
+    def _consume(self, data: bytes):
+        with self._lock:
+            if self._file is None:
+                return
+            if self.raw:
+                self._file.write(data)
+                self._file.flush()
+            else:
+                self._file.writeframes(data)
+
+    def _close_file(self):
+        with self._lock:
+            if self._file is None:
+                return
+            if not self.raw or isinstance(self.target, str):
+                self._file.close()
+            self._file = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = super().get_stats()
+        stats["files"] = list(self.paths)
+        return stats
+
+    def terminate(self):
+        self._close_file()
+
+
+# ===================== 无头输入 =====================
+def read_wav(path: str, sample_rate: int, channels: int = 1) -> np.ndarray:
+    """读取PCM WAV，转换为指定采样率/声道数的int16（交错存放）"""
+    with wave.open(path, "rb") as wf:
+        width = wf.getsampwidth()
+        file_channels = wf.getnchannels()
+        file_rate = wf.getframerate()
+        raw = wf.readframes(wf.getnframes())
+    if width == 1:
+        audio = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        audio = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768
+    elif width == 4:
+        audio = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648
+    else:
+        raise ValueError(f"不支持的WAV位深：{width * 8}bit")
+    audio = audio.reshape(-1, file_channels).mean(axis=1)
+    if file_rate != sample_rate and len(audio):
+        # 线性插值重采样（与bulk_transcribe一致）
+        num = int(round(len(audio) * sample_rate / file_rate))
+        audio = np.interp(np.arange(num) * (file_rate / sample_rate), np.arange(len(audio)), audio)
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+    return np.repeat(pcm, channels) if channels > 1 else pcm
+
+
+class _WavInputStream:
+    """后台线程按实时速度把WAV内容逐帧交给on_frames的输入流（模拟麦克风回调）"""
+
+    def __init__(self, source: "WavFileSource", pcm: np.ndarray, sample_rate: int, channels: int,
+                 frames_per_buffer: int, on_frames: OnFrames):
+        self.source = source
+        self.pcm = pcm
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.pos = 0  # 已输出的样本数（含声道）
+        self.start = time.monotonic()
+        self.frames_read = 0
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(frames_per_buffer, on_frames),
+                                        name="WAV音频输入", daemon=True)
+        self._thread.start()
+
+    def _run(self, frames_per_buffer: int, on_frames: OnFrames):
+        while not self._closed.is_set():
+            data = self.read(frames_per_buffer)
+            if self._closed.is_set():
+                break
+            on_frames(data, False)
+
+    def read(self, frame_count: int) -> bytes:
+        want = frame_count * self.channels
+        out = self.pcm[self.pos:self.pos + want]
+        self.pos += len(out)
+        if len(out) < want:
+            if self.source.loop and len(self.pcm):
+                parts = [out]
+                missing = want - len(out)
+                while missing:
+                    self.pos = min(missing, len(self.pcm))
+                    parts.append(self.pcm[:self.pos])
+                    missing -= self.pos
+                out = np.concatenate(parts)
+            else:
+                self.source.finished.set()
+                out = np.concatenate([out, np.zeros(want - len(out), dtype=np.int16)])
+        self.frames_read += frame_count
+        # 实时模式（以及读完后的静音）按音频时长等待，模拟麦克风
+        if self.source.realtime or self.source.finished.is_set():
+            delay = self.start + self.frames_read / self.sample_rate - time.monotonic()
+            if delay > 0:
+                self._closed.wait(delay)
+            else:
+                self.start -= min(0.0, delay + 0.5)  # 落后太多（如不限速读完后）时不补读
+        return out.tobytes()
+
+    def close(self):
+        self._closed.set()
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout=1)
+
+
+class WavFileSource(AudioBackend):
+    """把WAV文件当作麦克风（读完后输出静音，loop=True时循环播放）"""
+    name = "wav-source"
+
+    def __init__(self, path: str, realtime: bool = True, loop: bool = False):
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self.finished = threading.Event()  # 文件已读完
+        self._stream: Optional[_WavInputStream] = None
+
+    @property
+    def realtime_input(self) -> bool:
+        return self.realtime
+
+    def open_input(self, sample_rate, channels, sample_width, frames_per_buffer, on_frames):
+        if sample_width != 2:
+            raise ValueError("WAV输入只支持16bit采集")
+        pcm = read_wav(self.path, sample_rate, channels)
+        self.finished.clear()
+        self._stream = _WavInputStream(self, pcm, sample_rate, channels, frames_per_buffer, on_frames)
+        return self._stream
+
+    def get_stats(self) -> Dict[str, Any]:
+        stream = self._stream
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "realtime": self.realtime,
+            "read_s": round(stream.frames_read / stream.sample_rate, 3) if stream else 0.0,
+            "finished": self.finished.is_set(),
+        }
+
+
+# ===================== 组合 =====================
+class CombinedBackend(AudioBackend):
+    """输出、输入分别使用不同后端"""
+
+    def __init__(self, output: Optional[AudioBackend] = None, input: Optional[AudioBackend] = None):
+        self.output = output
+        self.input = input
+        self.name = f"{output.name if output else '-'}/{input.name if input else '-'}"
+
+    @property
+    def realtime_input(self) -> bool:
+        return self.input.realtime_input if self.input else True
+
+    def open_output(self, sample_rate, channels, sample_width, frames_per_buffer, render):
+        if self.output is None:
+            raise RuntimeError("没有配置音频输出")
+        return self.output.open_output(sample_rate, channels, sample_width, frames_per_buffer, render)
+
+    def open_input(self, sample_rate, channels, sample_width, frames_per_buffer, on_frames):
+        if self.input is None:
+            raise RuntimeError("没有配置音频输入")
+        return self.input.open_input(sample_rate, channels, sample_width, frames_per_buffer, on_frames)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "output": self.output.get_stats() if self.output else None,
+            "input": self.input.get_stats() if self.input else None,
+        }
+
+    def terminate(self):
+        for backend in {id(b): b for b in (self.output, self.input) if b is not None}.values():
+            backend.terminate()
+
+
+def _parse(spec: str, output: bool) -> Optional[AudioBackend]:
+    kind, _, arg = spec.partition(":")
+    if kind == "none":
+        return None
+    if output:
+        if kind in ("null", "null-fast"):
+            return NullSink(realtime=kind == "null")
+        if kind in ("wav", "wav-fast"):
+            return WavFileSink(arg, realtime=kind == "wav")
+        if kind == "raw":
+            return WavFileSink(sys.stdout.buffer if arg in ("", "-") else arg, raw=True)
+    elif kind in ("wav", "wav-fast", "wav-loop"):
+        return WavFileSource(arg, realtime=kind != "wav-fast", loop=kind == "wav-loop")
+    raise ValueError(f"无法识别的音频{'输出' if output else '输入'}配置：{spec}")
+
+
+def create_backend(output: str = "pyaudio", input: Optional[str] = None) -> AudioBackend:
+    """
+    按字符串配置创建后端
+    :param output: pyaudio | null（实时消费）| null-fast（不限速）| wav:out.wav | wav-fast:out.wav
+                   | raw:out.pcm | raw:-（原始PCM写到标准输出）| none
+    :param input: pyaudio | wav:in.wav（实时）| wav-fast:in.wav | wav-loop:in.wav | none；
+                  None表示输出为pyaudio时用麦克风，否则不配置输入
+    """
+    if input is None:
+        input = "pyaudio" if output == "pyaudio" else "none"
+    if output == "pyaudio" and input == "pyaudio":
+        return PyAudioBackend()
+    device = PyAudioBackend() if "pyaudio" in (output, input) else None
+    return CombinedBackend(
+        device if output == "pyaudio" else _parse(output, True),
+        device if input == "pyaudio" else _parse(input, False),
+    )
@@ -1,141 +1,214 @@
 # audio_player.py（修复后完整代码）
-import pyaudio
 import numpy as np
 import queue
 import threading
+import time
+from typing import Dict, Any, Optional
+from audio_devices import AudioBackend, PyAudioBackend
 from base_interface import AudioData
+from capture_buffer import CaptureBuffer
+from latency_tracer import tracer
+from playback_engine import PlaybackEngine
+
+# 播放回调每次取的帧数：越小打断（flush）越快，过小则回调开销大、易欠载
+PLAY_FRAMES_PER_BUFFER = 512
+# 抖动缓冲：每轮开始出声前至少缓冲的音频时长（毫秒）
+JITTER_BUFFER_MS = 80
+# 采集回调帧长（毫秒）：10~30ms，帧越小采集引入的延迟越低
+CAPTURE_FRAME_MS = 20
+# 采集缓冲最多积压的音频时长（秒）：ASR卡住时丢弃最旧的音频
+CAPTURE_BUFFER_SECONDS = 2.0
 
 
 class AudioDriver:
     """音频驱动类：整合实时音频采集（麦克风）和播放功能，直接透传音频格式播放"""
     
-    def __init__(self):
-        # 初始化pyaudio核心实例
-        self.p = pyaudio.PyAudio()
+    def __init__(self, jitter_buffer_ms: float = JITTER_BUFFER_MS, backend: Optional[AudioBackend] = None,
+                 capture_frame_ms: int = CAPTURE_FRAME_MS):
+        """
+        :param jitter_buffer_ms: 每轮开始出声前至少缓冲的音频时长（毫秒）
+        :param capture_frame_ms: 采集回调帧长（毫秒）
+        :param backend: 音频设备后端（默认声卡；无声卡环境见audio_devices.create_backend）
+        """
+        # 音频设备后端（打开采集/播放流）
+        self.backend = backend if backend is not None else PyAudioBackend()
         # 播放模块状态
         self.is_playing = False
         self.play_thread = None
         self.audio_play_queue = queue.Queue()  # 播放队列
-        # 采集模块状态
-        self.is_recording = False
-        self.record_thread = None
-        self.audio_record_queue = queue.Queue()  # 采集队列
         # 【仅采集侧固定参数】播放侧完全透传TTS的音频格式
         self.sample_rate = 16000    # 仅用于采集
         self.channels = 1           # 仅用于采集
-        self.format = pyaudio.paInt16  # 仅用于采集
+        self.sample_width = 2       # 仅用于采集（16bit）
         self.chunk_duration = 0.6
         self.chunk_samples = int(self.sample_rate * self.chunk_duration)
-        # 新增：播放流缓存（避免重复创建/销毁）
-        self.play_stream = None
-        self.last_play_format = None
-        self.last_play_rate = None
-        self.last_play_channels = None
+        # 采集模块状态
+        self.is_recording = False
+        self.record_stream = None
+        self.capture_frame_ms = capture_frame_ms
+        self.capture_frames = int(self.sample_rate * capture_frame_ms / 1000)
+        # 采集队列：采集回调写入的有界环形缓冲，按chunk_samples取出（接口同queue.Queue）
+        self.audio_record_queue = CaptureBuffer(self.sample_rate, self.channels, CAPTURE_BUFFER_SECONDS,
+                                                self.chunk_samples)
+        # 播放引擎（回调模式输出流 + 环形缓冲），首次播放时按音频格式创建，之后常驻
+        self.playback: Optional[PlaybackEngine] = None
+        self.jitter_buffer_ms = jitter_buffer_ms
+        # 打断（barge-in）支持
+        self._abort_playback = threading.Event()  # 要求播放线程立即丢弃正在播放的音频
+        self._abort_done = threading.Event()      # 播放线程已丢弃播放缓冲
+        self.dropped_through_turn = 0             # 轮次号不大于该值的音频一律丢弃
+        self._buffer_lock = threading.Lock()
+        self._queued_seconds = 0.0                # 播放队列中音频的总时长
+        self._turn_received: Dict[int, float] = {}  # 每轮收到的音频时长
+
+    # ===================== 音频播放相关方法（常驻播放线程 + 回调模式播放引擎） =====================
+    def _ensure_playback(self, audio_data: AudioData) -> bool:
+        """按音频格式创建播放引擎（格式变化时等缓冲播完再重新打开流）"""
+        sample_width = getattr(audio_data, "bit_depth", 16) // 8
+        if self.playback is None:
+            self.playback = PlaybackEngine(
+                self.backend.open_output, audio_data.sample_rate, audio_data.channels, sample_width,
+                jitter_target_ms=self.jitter_buffer_ms, frames_per_buffer=PLAY_FRAMES_PER_BUFFER
+            )
+            return True
+        return self.playback.reconfigure(audio_data.sample_rate, audio_data.channels, sample_width,
+                                         abort=self._abort_playback)
 
-    # ===================== 音频播放相关方法（核心修改：常驻播放线程） =====================
     def _play_worker(self):
-        """播放线程工作函数：常驻运行，仅处理结束信号不退出，透传TTS格式"""
+        """播放线程：把播放队列中的音频写入播放引擎的环形缓冲（输出流常驻，轮次之间不关闭）"""
         while self.is_playing:
             try:
+                # 被打断：丢弃播放引擎中尚未播放的缓冲
+                if self._abort_playback.is_set():
+                    self._discard_playback()
+                    continue
+                
                 # 从播放队列取音频分片（超时0.1秒避免卡死）
                 audio_data: AudioData = self.audio_play_queue.get(timeout=0.1)
+                if audio_data is not None:
+                    with self._buffer_lock:
+                        self._queued_seconds = max(0.0, self._queued_seconds - self._duration(audio_data))
+                    # 已被打断的轮次：直接丢弃
+                    if self._is_dropped(audio_data):
+                        continue
                 
-                # 结束信号：仅清空当前播放流，不退出线程
+                # 结束信号：标记本轮结束（播放引擎播到此处时记录turn_complete），流保持打开
                 if audio_data is None or audio_data.pcm_data == b"":
-                    # 仅关闭流但不退出线程，下次播放重新创建
-                    if self.play_stream is not None:
-                        self.play_stream.stop_stream()
-                        self.play_stream.close()
-                        self.play_stream = None
-                        self.last_play_format = None
-                        self.last_play_rate = None
-                        self.last_play_channels = None
+                    if audio_data is not None:
+                        if self.playback is not None:
+                            self.playback.end_turn(audio_data.turn_id)
+                        else:
+                            tracer.mark(audio_data.turn_id, "turn_complete")
+                        with self._buffer_lock:
+                            self._turn_received.pop(audio_data.turn_id, None)
                     continue
 
-                # 提取TTS返回的音频格式（优先使用AudioData自带的参数）
-                current_format = self._get_pyaudio_format(audio_data)
-                current_rate = audio_data.sample_rate
-                current_channels = audio_data.channels
-
-                # 格式变化/流未创建时重新打开播放流（适配TTS的任意格式）
-                if (self.play_stream is None or 
-                    current_format != self.last_play_format or 
-                    current_rate != self.last_play_rate or 
-                    current_channels != self.last_play_channels):
-                    # 关闭旧的播放流（如果存在）
-                    if self.play_stream is not None:
-                        self.play_stream.stop_stream()
-                        self.play_stream.close()
-                    
-                    # 打开新的播放流（使用TTS的音频格式）
-                    self.play_stream = self.p.open(
-                        format=current_format,
-                        channels=current_channels,
-                        rate=current_rate,
-                        output=True,
-                        frames_per_buffer=1024
-                    )
-                    # 更新格式缓存
-                    self.last_play_format = current_format
-                    self.last_play_rate = current_rate
-                    self.last_play_channels = current_channels
-                    # audio_player.py 修改 _play_worker 函数中的日志部分
-                    ##print(f"🔄 适配TTS音频格式：采样率={current_rate}Hz, 声道={current_channels}, "
-                        ##f"位深={self._get_bit_depth(current_format)}bit, "
-                        ##f"数据大小={len(audio_data.pcm_data) if audio_data.pcm_data else 0}字节")
-                    
-                # 直接播放TTS生成的原始PCM数据（无任何转换）
-                if self.play_stream is not None and audio_data.pcm_data:
-                    self.play_stream.write(audio_data.pcm_data)
+                # 直接写入TTS生成的原始PCM（无任何转换），缓冲满时等待，期间可被打断
+                if self._ensure_playback(audio_data):
+                    self.playback.write(audio_data.pcm_data, audio_data.turn_id, abort=self._abort_playback)
 
             except queue.Empty:
                 continue
             except Exception as e:
                 print(f"❌ 音频播放错误：{str(e)}")
-                # 出错时重置播放流，不退出线程
-                if self.play_stream is not None:
-                    self.play_stream.stop_stream()
-                    self.play_stream.close()
-                    self.play_stream = None
-                    self.last_play_format = None
-                    self.last_play_rate = None
-                    self.last_play_channels = None
+                # 出错时重建播放引擎，不退出线程
+                if self.playback is not None:
+                    self.playback.close()
+                    self.playback = None
                 continue
 
         # 线程退出时最终释放播放流
-        if self.play_stream is not None:
-            self.play_stream.stop_stream()
-            self.play_stream.close()
-            self.play_stream = None
-
-    def _get_pyaudio_format(self, audio_data: AudioData) -> int:
-        """根据AudioData推导pyaudio格式（默认16bit）"""
-        # 优先从AudioData获取位深，无则默认16bit
-        bit_depth = getattr(audio_data, "bit_depth", 16)
-        if bit_depth == 8:
-            return pyaudio.paInt8
-        elif bit_depth == 16:
-            return pyaudio.paInt16
-        elif bit_depth == 24:
-            return pyaudio.paInt24
-        elif bit_depth == 32:
-            return pyaudio.paInt32
-        elif bit_depth == 32 and getattr(audio_data, "is_float", False):
-            return pyaudio.paFloat32
-        else:
-            # 默认返回16bit（兼容大部分TTS）
-            return pyaudio.paInt16
-
-    def _get_bit_depth(self, pyaudio_format: int) -> int:
-        """反向推导位深（日志用）"""
-        format_map = {
-            pyaudio.paInt8: 8,
-            pyaudio.paInt16: 16,
-            pyaudio.paInt24: 24,
-            pyaudio.paInt32: 32,
-            pyaudio.paFloat32: 32
+        if self.playback is not None:
+            self.playback.close()
+            self.playback = None
+
+    def _discard_playback(self):
+        """丢弃播放引擎中尚未播放的音频（输出流不关闭，下一次回调起输出静音）"""
+        if self.playback is not None:
+            self.playback.flush()
+        self._abort_playback.clear()
+        self._abort_done.set()
+
+    @property
+    def speaking(self) -> bool:
+        """是否正在播放回复（本轮音频已开始写入、尚未播完）"""
+        return self.playback is not None and self.playback.speaking
+
+    @property
+    def current_turn_id(self) -> Optional[int]:
+        """正在播放的轮次"""
+        return self.playback.current_turn_id if self.playback is not None else None
+
+    @property
+    def turn_played_seconds(self) -> float:
+        """当前轮次已播放的音频时长"""
+        return self.playback.turn_played_seconds if self.playback is not None else 0.0
+
+    def get_playback_stats(self) -> Dict[str, Any]:
+        """获取播放统计（缓冲时长、欠载次数、播放位置等）"""
+        return self.playback.get_stats() if self.playback is not None else {}
+
+    def get_device_stats(self) -> Dict[str, Any]:
+        """获取音频设备后端统计"""
+        return self.backend.get_stats() if self.backend is not None else {}
+
+    @staticmethod
+    def _duration(audio_data: AudioData) -> float:
+        """音频分片时长（秒）"""
+        bytes_per_second = audio_data.sample_rate * audio_data.channels * (getattr(audio_data, "bit_depth", 16) // 8)
+        return len(audio_data.pcm_data) / bytes_per_second if bytes_per_second else 0.0
+
+    def _is_dropped(self, audio_data: AudioData) -> bool:
+        turn_id = getattr(audio_data, "turn_id", None)
+        return turn_id is not None and turn_id <= self.dropped_through_turn
+
+    # ===================== 打断（barge-in） =====================
+    def flush_playback(self, through_turn_id: Optional[int] = None, timeout: float = 0.15) -> Dict[str, Any]:
+        """
+        立即停止播放：清空播放队列，中止当前写入并丢弃播放缓冲
+        :param through_turn_id: 之后再收到轮次号不大于该值的音频也一律丢弃
+        :param timeout: 等待播放线程确认的最长时间（秒）
+        :return: 被打断轮次的收听情况与停止耗时
+        """
+        start = time.monotonic()
+        if through_turn_id is not None:
+            self.dropped_through_turn = max(self.dropped_through_turn, through_turn_id)
+
+        # 清空播放队列
+        while True:
+            try:
+                self.audio_play_queue.get_nowait()
+            except queue.Empty:
+                break
+        with self._buffer_lock:
+            self._queued_seconds = 0.0
+
+        # 通知播放线程中止当前写入
+        self._abort_done.clear()
+        self._abort_playback.set()
+        if self.is_playing and self.play_thread is not None and self.play_thread.is_alive():
+            self._abort_done.wait(timeout)
+
+        turn_id = self.current_turn_id
+        heard = self.turn_played_seconds
+        with self._buffer_lock:
+            received = self._turn_received.pop(turn_id, heard) if turn_id is not None else heard
+        return {
+            "turn_id": turn_id,
+            "heard_seconds": round(heard, 3),
+            "generated_seconds": round(max(received, heard), 3),
+            "stop_latency": time.monotonic() - start,
         }
-        return format_map.get(pyaudio_format, 16)
+
+    def get_buffered_duration(self) -> float:
+        """尚未播放的音频时长（秒）：播放队列 + 播放引擎缓冲"""
+        with self._buffer_lock:
+            queued = self._queued_seconds
+        return queued + (self.playback.buffered_duration if self.playback is not None else 0.0)
+
+    def is_speaking(self) -> bool:
+        """是否正在播放（或即将播放）回复"""
+        return self.speaking or self.get_buffered_duration() > 0
 
     def start_play(self):
         """启动实时音频播放线程（常驻）"""
@@ -144,7 +217,7 @@ class AudioDriver:
             self.play_thread = threading.Thread(target=self._play_worker)
             self.play_thread.daemon = True  # 主线程退出时自动终止
             self.play_thread.start()
-            print("✅ 音频播放线程已启动（透传TTS原始格式，常驻运行）")
+            print(f"✅ 音频播放线程已启动（回调模式，抖动缓冲{self.jitter_buffer_ms:.0f}ms，常驻运行）")
 
     def stop_play(self):
         """停止音频播放并释放资源"""
@@ -160,61 +233,63 @@ class AudioDriver:
     def push_audio_for_play(self, audio_data: AudioData):
         """推送音频数据到播放队列（供TTS等模块调用）"""
         if self.is_playing:
+            if self._is_dropped(audio_data):
+                return
+            duration = self._duration(audio_data)
+            with self._buffer_lock:
+                self._queued_seconds += duration
+                if audio_data.turn_id is not None and duration:
+                    self._turn_received[audio_data.turn_id] = self._turn_received.get(audio_data.turn_id, 0.0) + duration
             self.audio_play_queue.put(audio_data)
 
-    # ===================== 音频采集相关方法（保持不变） =====================
-    def _record_worker(self):
-        """采集线程工作函数：循环采集麦克风数据并写入队列"""
-        # 打开采集流（采集侧仍固定16kHz/单声道/16bit）
-        record_stream = self.p.open(
-            format=self.format,
-            channels=self.channels,
-            rate=self.sample_rate,
-            input=True,
-            frames_per_buffer=self.chunk_samples
-        )
-
-        while self.is_recording:
-            try:
-                # 读取麦克风PCM数据（忽略溢出异常）
-                pcm_data = record_stream.read(self.chunk_samples, exception_on_overflow=False)
-                # 封装为AudioData格式存入采集队列
-                self.audio_record_queue.put(AudioData(pcm_data=pcm_data))
-            except Exception as e:
-                print(f"❌ 音频采集错误：{str(e)}")
-                break
-
-        # 释放采集流资源
-        record_stream.stop_stream()
-        record_stream.close()
-        # 发送采集结束标记
-        self.audio_record_queue.put(AudioData(pcm_data=b"", sample_rate=16000, channels=1, is_finish=True))
-
+    # ===================== 音频采集相关方法（回调小帧 + 预分配环形缓冲） =====================
     def start_record(self, chunk_duration: float = None):
         """
         启动麦克风实时采集
-        :param chunk_duration: 采集分片时长（秒），覆盖默认值
+        :param chunk_duration: 消费端（ASR）每次取出的分片时长（秒），覆盖默认值；采集回调帧长固定为capture_frame_ms
         """
         if not self.is_recording:
             # 覆盖分片时长（如果传入有效值）
             if chunk_duration and chunk_duration > 0:
                 self.chunk_duration = chunk_duration
                 self.chunk_samples = int(self.sample_rate * self.chunk_duration)
-            # 启动采集线程
+            self.audio_record_queue.set_block_frames(self.chunk_samples)
+            self.audio_record_queue.reset()
+            # 不限速的输入（如wav-fast:）由缓冲施加背压，实时设备写满时丢弃最旧的音频
+            self.audio_record_queue.set_backpressure(not self.backend.realtime_input)
+            # 打开回调模式的采集流（采集侧仍固定16kHz/单声道/16bit），回调直接写入环形缓冲
+            try:
+                self.record_stream = self.backend.open_input(
+                    self.sample_rate, self.channels, self.sample_width, self.capture_frames,
+                    self.audio_record_queue.write
+                )
+            except Exception as e:
+                print(f"❌ 打开音频采集失败：{str(e)}")
+                self.audio_record_queue.finish()
+                return
             self.is_recording = True
-            self.record_thread = threading.Thread(target=self._record_worker)
-            self.record_thread.daemon = True
-            self.record_thread.start()
-            print(f"✅ 音频采集线程已启动（分片时长：{self.chunk_duration}秒）")
+            print(f"✅ 音频采集已启动（采集帧：{self.capture_frame_ms}ms，分片时长：{self.chunk_duration}秒）")
 
     def stop_record(self):
         """停止麦克风采集并释放资源"""
         if self.is_recording:
             self.is_recording = False
-            # 等待采集线程结束
-            if self.record_thread:
-                self.record_thread.join(timeout=2)
-            print("✅ 音频采集线程已停止")
+            # 关闭背压：正在等待空间的采集线程立即返回，采集流才能关闭
+            self.audio_record_queue.set_backpressure(False)
+            # 释放采集流资源
+            if self.record_stream is not None:
+                try:
+                    self.record_stream.close()
+                except Exception as e:
+                    print(f"❌ 关闭音频采集流错误：{str(e)}")
+                self.record_stream = None
+            # 消费端取完剩余音频后收到采集结束标记
+            self.audio_record_queue.finish()
+            print("✅ 音频采集已停止")
+
+    def get_capture_stats(self) -> Dict[str, Any]:
+        """获取采集统计（积压、丢弃、设备溢出等）"""
+        return self.audio_record_queue.get_stats()
 
     def get_record_queue(self):
         """获取采集队列（供ASR模块读取音频数据）"""
@@ -230,13 +305,13 @@ class AudioDriver:
         # 停止所有线程
         self.stop_play()
         self.stop_record()
-        # 终止pyaudio实例（增加空值判断）
-        if self.p is not None:
+        # 释放音频设备后端（增加空值判断）
+        if self.backend is not None:
             try:
-                self.p.terminate()
+                self.backend.terminate()
             except:
                 pass
-        self.p = None  # 置空避免重复释放
+        self.backend = None  # 置空避免重复释放
         print("✅ 音频驱动所有资源已释放")
 
 
@@ -0,0 +1,131 @@
+# audio_ring_buffer.py
+"""
+采集端与ASR之间的重分块环形缓冲
+- 预分配float32缓冲，int16 PCM写入时直接换算进缓冲区（不产生中间数组）
+- 采集分片可以是任意长度（如20~60ms），读取端按ASR的chunk_stride取出严格对齐的分片
+- 缓冲区按"镜像"方式存放（每个样本同时写在i和i+capacity处），任意位置起长度不超过capacity的
+  窗口都是连续内存，read_stride直接返回视图，无需拷贝或拼接
+"""
+import threading
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+# int16 → float32 的换算系数（与FunASRStreamingASR._audio_data_to_numpy一致）
+PCM16_SCALE = 1.0 / 32767.0
+
+
+class AudioRingBuffer:
+    """单生产者/单消费者的float32环形缓冲，按固定步长读取连续视图"""
+
+    def __init__(self, capacity: int):
+        """
+        :param capacity: 最多缓存的样本数（需不小于读取步长；写满后丢弃最旧的样本）
+        """
+        if capacity <= 0:
+            raise ValueError(f"capacity必须为正数，当前为{capacity}")
+        self.capacity = capacity
+        self._buffer = np.zeros(2 * capacity, dtype=np.float32)
+        self._read = 0    # 累计读取的样本数
+        self._write = 0   # 累计写入的样本数
+        self._lock = threading.Lock()
+
+        # 统计
+        self.strides_read = 0
+        self.overrun_samples = 0  # 写满时被丢弃的最旧样本数
+
+    # ===================== 写入 =====================
+    def write_pcm16(self, pcm_data: bytes) -> int:
+        """写入16bit单声道PCM，返回写入的样本数"""
+        return self._write_samples(np.frombuffer(pcm_data, dtype=np.int16), PCM16_SCALE)
+
+    def write(self, samples: np.ndarray) -> int:
+        """写入float32样本，返回写入的样本数"""
+        return self._write_samples(np.asarray(samples, dtype=np.float32), None)
+
+    def _write_samples(self, samples: np.ndarray, scale: Optional[float]) -> int:
+        n = len(samples)
+        if n == 0:
+            return 0
+        if n > self.capacity:
+            # 超出容量的部分只保留最新的capacity个样本
+            self.overrun_samples += n - self.capacity
+            samples = samples[-self.capacity:]
+            n = self.capacity
+
+        with self._lock:
+            start = self._write % self.capacity
+            first = min(n, self.capacity - start)
+            # 每段同时写入主区和镜像区
+            for offset, src in ((start, samples[:first]), (0, samples[first:])):
+                if len(src) == 0:
+                    continue
+                for base in (offset, offset + self.capacity):
+                    dest = self._buffer[base:base + len(src)]
+                    if scale is None:
+                        dest[:] = src
+                    else:
+                        np.multiply(src, scale, out=dest, casting="unsafe")
+            self._write += n
+            # 写满：丢弃最旧的样本
+            overrun = self._write - self._read - self.capacity
+            if overrun > 0:
+                self._read += overrun
+                self.overrun_samples += overrun
+        return n
+
+    # ===================== 读取 =====================
+    @property
+    def available(self) -> int:
+        """可读取的样本数"""
+        with self._lock:
+            return self._write - self._read
+
+    def read_stride(self, stride: int) -> Optional[np.ndarray]:
+        """
+        读取恰好stride个样本，返回缓冲区内的连续视图（不足时返回None）。
+        视图在下一次写入前有效；需要长期保存时请copy()。
+        """
+        if stride > self.capacity:
+            raise ValueError(f"读取步长{stride}超过缓冲容量{self.capacity}")
+        with self._lock:
+            if self._write - self._read < stride:
+                return None
+            start = self._read % self.capacity
+            self._read += stride
+            self.strides_read += 1
+        return self._buffer[start:start + stride]
+
+    def read_remaining(self) -> Optional[np.ndarray]:
+        """读取剩余的全部样本（不足一个步长的尾部），没有时返回None"""
+        with self._lock:
+            n = self._write - self._read
+            if n == 0:
+                return None
+            start = self._read % self.capacity
+            self._read += n
+        return self._buffer[start:start + n]
+
+    def latest(self, n: int) -> np.ndarray:
+        """查看最近写入的n个样本（不消费，最多capacity个），返回连续视图"""
+        with self._lock:
+            n = max(0, min(n, self.capacity, self._write))
+            start = (self._write - n) % self.capacity
+        return self._buffer[start:start + n]
+
+    def clear(self):
+        """丢弃所有未读样本"""
+        with self._lock:
+            self._read = self._write
+
+    # ===================== 统计 =====================
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓冲统计"""
+        with self._lock:
+            return {
+                "capacity": self.capacity,
+                "available": self._write - self._read,
+                "samples_written": self._write,
+                "strides_read": self.strides_read,
+                "overrun_samples": self.overrun_samples,
+            }
@@ -0,0 +1,105 @@
+# barge_in.py
+"""
+打断（barge-in）控制：助手说话时检测到用户开口，立即
+1. 清空播放队列、中止当前声卡写入（AudioDriver.flush_playback，分段写入保证停止时间有界）
+2. 取消尚未合成/正在合成的TTS句子（按轮次号取消）
+3. 取消正在进行的LLM解码（StoppingCriteria在下一个解码步生效）
+并记录被打断的回复实际被听到了多少。
+"""
+import time
+import threading
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Dict, Any
+
+from latency_tracer import tracer
+
+
+@dataclass
+class BargeInEvent:
+    """一次打断的记录"""
+    turn_id: Optional[int]
+    heard_seconds: float       # 实际播放出来的时长
+    generated_seconds: float   # 打断时已合成（已送入播放队列）的时长
+    stop_latency: float        # 从触发到播放停止的耗时（秒）
+    cancelled_llm: int         # 被取消的LLM请求数
+    timestamp: float
+
+    @property
+    def heard_fraction(self) -> float:
+        """已合成部分中被听到的比例"""
+        return self.heard_seconds / self.generated_seconds if self.generated_seconds > 0 else 0.0
+
+
+class BargeInController:
+    """把"用户开口"事件转换为对播放、TTS、LLM的取消"""
+
+    def __init__(self, audio_driver, tts_module=None, cancel_llm: Optional[Callable[[str], int]] = None,
+                 cooldown: float = 0.5, stop_timeout: float = 0.15, verbose: bool = True):
+        """
+        :param audio_driver: AudioDriver（需支持flush_playback / is_speaking）
+        :param tts_module: TTS模块（需支持cancel_turns），可为None
+        :param cancel_llm: 取消LLM生成的函数（如control.cancel_generation），可为None
+        :param cooldown: 两次打断之间的最小间隔（秒），避免同一段话重复触发
+        :param stop_timeout: 等待播放线程确认停止的最长时间（秒）
+        """
+        self.audio_driver = audio_driver
+        self.tts_module = tts_module
+        self.cancel_llm = cancel_llm
+        self.cooldown = cooldown
+        self.stop_timeout = stop_timeout
+        self.verbose = verbose
+        self.events: List[BargeInEvent] = []
+        self._last_trigger = 0.0
+        self._lock = threading.Lock()
+
+    def on_speech_start(self) -> bool:
+        """VAD检测到用户开始说话时调用；助手正在说话则触发打断，返回是否触发"""
+        if not self.audio_driver.is_speaking():
+            return False
+        if time.monotonic() - self._last_trigger < self.cooldown:
+            return False
+        self.trigger()
+        return True
+
+    def trigger(self, reason: str = "barge_in") -> BargeInEvent:
+        """立即打断当前回复"""
+        with self._lock:
+            self._last_trigger = time.monotonic()
+            # 到目前为止分配的所有轮次都作废（用户新的一句话会分配更大的轮次号）
+            through_turn_id = tracer.last_turn_id()
+
+            # 先停播放（用户能直接感知），再释放TTS和LLM的算力
+            playback = self.audio_driver.flush_playback(through_turn_id, timeout=self.stop_timeout)
+            if self.tts_module is not None and hasattr(self.tts_module, "cancel_turns"):
+                self.tts_module.cancel_turns(through_turn_id)
+            cancelled_llm = self.cancel_llm(reason) if self.cancel_llm else 0
+
+            event = BargeInEvent(
+                turn_id=playback["turn_id"],
+                heard_seconds=playback["heard_seconds"],
+                generated_seconds=playback["generated_seconds"],
+                stop_latency=playback["stop_latency"],
+                cancelled_llm=cancelled_llm,
+                timestamp=time.time(),
+            )
+            self.events.append(event)
+            tracer.mark(event.turn_id, "barge_in")
+
+        if self.verbose:
+            print(f"\n✋ 用户打断：已播放 {event.heard_seconds:.1f}s / {event.generated_seconds:.1f}s"
+                  f"（{event.heard_fraction:.0%}），播放停止耗时 {event.stop_latency * 1000:.0f}ms")
+        return event
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取打断统计"""
+        with self._lock:
+            events = list(self.events)
+        if not events:
+            return {"count": 0}
+        latencies = sorted(e.stop_latency for e in events)
+        return {
+            "count": len(events),
+            "median_stop_latency_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+            "max_stop_latency_ms": round(latencies[-1] * 1000, 1),
+            "mean_heard_fraction": round(sum(e.heard_fraction for e in events) / len(events), 3),
+        }
@@ -15,6 +15,7 @@ class AudioData:
     channels: int = 1  
     is_finish: bool = False  # 新增：标记是否是最后一个音频分片
     bit_depth: int = 16  # 确保有这个字段
+    turn_id: Optional[int] = None  # 所属对话轮次（延迟追踪用）
 
 # 3. 定义文本数据的统一格式（LLM/ASR/TTS交互文本时用）
 @dataclass
@@ -23,6 +24,8 @@ class TextData:
     text: str  
     # 核心字段2：是否是最后一个分片（流式输出关键）→ 默认True（批量输出），流式时设为False
     is_finish: bool = True  
+    # 所属对话轮次（延迟追踪用），随数据在ASR→LLM→TTS→播放间传递
+    turn_id: Optional[int] = None
 
 # 4. 定义对话上下文的统一格式（LLM多轮对话专用）
 # 类型别名：把「List[Dict[str, str]]」简化为「ChatHistory」，代码更易读
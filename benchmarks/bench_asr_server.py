@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+多会话ASR引擎基准测试（asr_server.MultiSessionASREngine）
+N路会话按实时速度送入音频（40ms一块），同一个模型实例服务所有会话；
+对比max_batch=1（逐个识别）与成批识别，统计每CPU秒识别的音频秒数（吞吐/核）和分片的排队、识别延迟。
+默认加载paraformer-zh-streaming（需要funasr）；--stub 使用占用CPU的桩模型，--stub-batched 让桩模型支持整批调用
+（固定开销每批只算一次，模拟能真正批量推理的后端）。
+FunASR的AutoModel（以及不加--stub-batched的桩模型）没有批量接口，引擎在一个tick内逐会话调用generate：
+批处理方式显示为sequential，此时"批大小"只是调度分组，吞吐/核的差别来自调度而不是批量推理。
+用法：python benchmarks/bench_asr_server.py [--stub [--stub-batched]] [--sessions 1 4 8 16] [--wav sample.wav]
+"""
+import os
+import sys
+import time
+import wave
+import queue
+import random
+import argparse
+import threading
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from asr_server import MultiSessionASREngine, CHUNK_STRIDE, SAMPLE_RATE
+
+BLOCK_DURATION = 0.04  # 采集分片时长
+
+
+class StubStreamingASRModel:
+    """桩模型：每次调用占用CPU base_ms + per_chunk_ms × (分片长度/chunk_stride)，每个完整分片输出一个字"""
+
+    def __init__(self, base_ms: float, per_chunk_ms: float):
+        self.base_ms = base_ms
+        self.per_chunk_ms = per_chunk_ms
+
+    @staticmethod
+    def _spin(ms: float):
+        end = time.perf_counter() + ms / 1000
+        while time.perf_counter() < end:
+            pass
+
+    def _text(self, chunk, cache, is_final) -> str:
+        cache["chunks"] = cache.get("chunks", 0) + 1
+        return ("字" if len(chunk) >= CHUNK_STRIDE else "") + ("完" if is_final else "")
+
+    def generate(self, input, cache, is_final=False, **kwargs):
+        self._spin(self.base_ms + self.per_chunk_ms * len(input) / CHUNK_STRIDE)
+        return [{"text": self._text(input, cache, is_final)}]
+
+
+class BatchedStubStreamingASRModel(StubStreamingASRModel):
+    """支持整批调用的桩模型：固定开销每批只算一次"""
+
+    def generate_batch(self, inputs, caches, is_finals):
+        self._spin(self.base_ms + self.per_chunk_ms * sum(len(x) for x in inputs) / CHUNK_STRIDE)
+        return [self._text(x, c, f) for x, c, f in zip(inputs, caches, is_finals)]
+
+
+def load_audio(path: str, seconds: float) -> bytes:
+    """读取16kHz单声道WAV（循环到指定时长）；没有给出时生成带噪声的合成音频"""
+    num_bytes = int(seconds * SAMPLE_RATE) * 2
+    if path:
+        with wave.open(path, "rb") as wf:
+            pcm = wf.readframes(wf.getnframes())
+        return (pcm * (num_bytes // max(1, len(pcm)) + 1))[:num_bytes]
+    rng = np.random.default_rng(0)
+    t = np.arange(num_bytes // 2) / SAMPLE_RATE
+    samples = 0.2 * np.sin(2 * np.pi * 220 * t) + 0.02 * rng.standard_normal(len(t))
+    return (samples * 32767).astype(np.int16).tobytes()
+
+
+def run(model, pcm: bytes, num_sessions: int, max_batch: int):
+    engine = MultiSessionASREngine(asr_model=model, max_batch=max_batch)
+    block = int(BLOCK_DURATION * SAMPLE_RATE) * 2
+    sessions = [engine.open_session(f"s{i}") for i in range(num_sessions)]
+    queues = [engine.get_output_queue(s) for s in sessions]
+
+    def produce(session_id: str):
+        time.sleep(random.uniform(0, 0.6))  # 各会话的分片边界错开
+        next_time = time.monotonic()
+        for offset in range(0, len(pcm), block):
+            engine.feed(session_id, pcm[offset:offset + block])
+            next_time += BLOCK_DURATION
+            time.sleep(max(0.0, next_time - time.monotonic()))
+        engine.finish(session_id)
+
+    wall_start, cpu_start = time.monotonic(), time.process_time()
+    producers = [threading.Thread(target=produce, args=(s,), daemon=True) for s in sessions]
+    for t in producers:
+        t.start()
+    texts = []
+    for q in queues:
+        text = ""
+        while True:
+            try:
+                item = q.get(timeout=60)
+            except queue.Empty:
+                print("⚠️ 等待识别结果超时")
+                break
+            if item.is_finish:
+                break
+            text += item.text
+        texts.append(text)
+    wall = time.monotonic() - wall_start
+    process_cpu = time.process_time() - cpu_start
+    stats = engine.get_stats()
+    engine.shutdown()
+    return wall, process_cpu, stats, texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多会话ASR引擎基准测试")
+    parser.add_argument("--stub", action="store_true", help="使用桩模型")
+    parser.add_argument("--stub-batched", action="store_true", help="桩模型支持整批调用")
+    parser.add_argument("--base-ms", type=float, default=15.0, help="桩模型每次调用的固定耗时")
+    parser.add_argument("--per-chunk-ms", type=float, default=10.0, help="桩模型每个600ms分片的耗时")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 8, 16], help="并发会话数")
+    parser.add_argument("--max-batch", type=int, default=8, help="成批识别时每个tick的最大分片数")
+    parser.add_argument("--seconds", type=float, default=6.0, help="每路音频时长")
+    parser.add_argument("--wav", default="", help="16kHz单声道WAV样本（默认合成音频）")
+    args = parser.parse_args()
+
+    if args.stub:
+        model_cls = BatchedStubStreamingASRModel if args.stub_batched else StubStreamingASRModel
+        model = model_cls(args.base_ms, args.per_chunk_ms)
+    else:
+        from funasr import AutoModel
+        model = AutoModel(model="paraformer-zh-streaming", model_revision="v2.0.4", disable_update=True)
+    pcm = load_audio(args.wav, args.seconds)
+
+    print(f"CPU核数: {os.cpu_count()}，每路音频 {args.seconds:.1f}s")
+    if callable(getattr(model, "generate_batch", None)):
+        print("批处理方式: native（模型generate_batch整批推理）")
+    else:
+        print("批处理方式: sequential（模型不支持批量推理，tick内逐会话调用generate；批大小只是调度分组，没有批量推理的吞吐提升）")
+    print(f"{'会话':>4} {'批大小上限':>10} {'平均批大小':>10} {'音频秒/CPU秒':>12} {'引擎RTF':>8} "
+          f"{'排队p50/p95(ms)':>16} {'延迟p50/p95(ms)':>16}  结果一致")
+    for num_sessions in args.sessions:
+        baseline = None
+        for max_batch in (1, args.max_batch):
+            wall, process_cpu, stats, texts = run(model, pcm, num_sessions, max_batch)
+            if baseline is None:
+                baseline = texts
+            audio_per_cpu = stats["audio_seconds"] / process_cpu if process_cpu else float("nan")
+            waits, latency = stats["queue_wait_ms"], stats["chunk_latency_ms"]
+            print(f"{num_sessions:>4} {max_batch:>10} {stats['mean_batch_size']:>10} {audio_per_cpu:>12.1f} "
+                  f"{stats['rtf']:>8} {waits['p50']:>7}/{waits['p95']:<8} {latency['p50']:>7}/{latency['p95']:<8}  "
+                  f"{'是' if texts == baseline else '否'}")
+
+
+if __name__ == "__main__":
+    main()
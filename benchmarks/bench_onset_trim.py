@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+爆破音切除微基准：原逐窗循环实现 vs onset_trimmer向量化实现
+用法：python benchmarks/bench_onset_trim.py [--sentences 200] [--sample-rate 32000]
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from onset_trimmer import OnsetTrimmer
+
+
+class LegacyTrimmer:
+    """原 GenieTTSModule._process_audio_start 实现（原样保留，作为对比基线）"""
+
+    def __init__(self, sample_rate: int, bit_depth: int = 16):
+        self.sample_rate = sample_rate
+        self.bit_depth = bit_depth
+
+    def _process_audio_start(self, pcm_data: bytes) -> bytes:
+        """
+        专门处理TTS开头爆破音的函数
+        爆破音特征：低频能量高、突然的能量爆发、持续时间短（<50ms）
+        """
+        import numpy as np
+        
+        # 将字节转换为numpy数组
+        dtype = np.int16 if self.bit_depth == 16 else np.int32
+        samples = np.frombuffer(pcm_data, dtype=dtype)
+        
+        if len(samples) < 1600:  # 小于100ms的音频不处理
+            return pcm_data
+        
+        # 1. 爆破音专用检测算法
+        def detect_plosive_noise(audio_data):
+            """检测爆破音噪音"""
+            # 分析前100ms（1600个样本）
+            analysis_length = min(1600, len(audio_data))
+            segment = audio_data[:analysis_length].astype(np.float32)
+            
+            # 计算短期能量（用于检测突发能量）
+            window_size = 160  # 10ms窗口
+            num_windows = analysis_length // window_size
+            
+            energies = []
+            for i in range(num_windows):
+                window = segment[i * window_size:(i + 1) * window_size]
+                energy = np.sum(window ** 2) / window_size
+                energies.append(energy)
+            
+            # 计算能量变化率（爆破音的特点是能量突然增加）
+            energy_diffs = np.diff(energies)
+            
+            # 检测能量突然爆发的点
+            sudden_increase_threshold = np.max(energies) * 0.3
+            
+            for i in range(1, len(energy_diffs)):
+                if energy_diffs[i] > sudden_increase_threshold:
+                    # 爆破音通常在前3个窗口内
+                    if i * window_size < 480:  # 前30ms内
+                        # 向前找更合适的起始点（可能在爆发的稍前位置）
+                        return max(0, (i - 1) * window_size)
+            
+            return 0
+        
+        # 2. 低频爆破音检测（爆破音通常在低频）
+        def detect_low_freq_plosive(audio_data):
+            """检测低频爆破音"""
+            try:
+                from scipy import signal
+                
+                analysis_length = min(800, len(audio_data))
+                segment = audio_data[:analysis_length].astype(np.float32)
+                
+                # 设计带通滤波器（50-200Hz，爆破音主要频率范围）
+                lowcut = 50
+                highcut = 200
+                nyquist = self.sample_rate / 2
+                
+                # 巴特沃斯带通滤波器
+                b, a = signal.butter(
+                    4, 
+                    [lowcut/nyquist, highcut/nyquist], 
+                    btype='band'
+                )
+                
+                # 应用滤波器
+                filtered = signal.filtfilt(b, a, segment)
+                
+                # 计算滤波后的能量
+                window_size = 80  # 5ms
+                num_windows = analysis_length // window_size
+                
+                filtered_energies = []
+                for i in range(num_windows):
+                    window = filtered[i * window_size:(i + 1) * window_size]
+                    energy = np.sum(window ** 2) / window_size
+                    filtered_energies.append(energy)
+                
+                # 找到第一个低频能量峰值
+                energy_threshold = np.percentile(filtered_energies, 70)
+                
+                for i, energy in enumerate(filtered_energies):
+                    if energy > energy_threshold:
+                        # 爆破音通常持续1-2个窗口（5-10ms）
+                        return max(0, (i - 1) * window_size)
+                        
+            except ImportError:
+                # scipy不可用时使用简化方法
+                pass
+            
+            return 0
+        
+        # 3. 经验法则：根据TTS引擎特性直接切除
+        def empirical_cut_for_tts():
+            """根据经验直接切除固定长度"""
+            # Genie TTS通常在开头有固定模式的噪音
+            # 尝试切除前30-50ms（480-800个样本）
+            
+            # 先检查前100ms的能量分布
+            first_100ms = min(1600, len(samples))
+            
+            # 分成4个25ms的窗口
+            window_25ms = 400  # 16kHz * 0.025s
+            windows = []
+            
+            for i in range(0, first_100ms, window_25ms):
+                if i + window_25ms <= first_100ms:
+                    window = samples[i:i+window_25ms]
+                    rms = np.sqrt(np.mean(window.astype(np.float64) ** 2))
+                    windows.append(rms)
+            
+            # 如果第一个窗口能量明显高于后面，很可能是噪音
+            if len(windows) >= 2 and windows[0] > windows[1] * 1.5:
+                return 400  # 切除前25ms
+            
+            # 默认切除30ms（480个样本）
+            return 480
+        
+        # 4. 波形形状检测（爆破音的波形特征）
+        def detect_by_waveform_shape(audio_data):
+            """通过波形形状检测爆破音"""
+            analysis_length = min(800, len(audio_data))
+            segment = audio_data[:analysis_length]
+            
+            # 计算波形的一阶和二阶差分（检测突变）
+            diff1 = np.diff(segment)
+            diff2 = np.diff(diff1)
+            
+            # 寻找幅度突变点
+            amplitude_threshold = np.percentile(np.abs(diff1), 90)
+            
+            for i in range(len(diff1) - 10):
+                # 检查是否有一系列的突变
+                if np.abs(diff1[i]) > amplitude_threshold:
+                    # 检查后续几个点是否也有较大变化
+                    subsequent = np.abs(diff1[i:i+10])
+                    if np.mean(subsequent) > amplitude_threshold * 0.5:
+                        return max(0, i - 20)  # 稍微提前一点
+            
+            return 0
+        
+        # 5. 综合多种检测方法
+        def combined_detection():
+            """综合使用多种检测方法"""
+            detection_results = []
+            
+            # 方法1：能量突变检测
+            pos1 = detect_plosive_noise(samples)
+            if pos1 > 0:
+                detection_results.append(pos1)
+            
+            # 方法2：低频检测（需要scipy）
+            pos2 = detect_low_freq_plosive(samples)
+            if pos2 > 0:
+                detection_results.append(pos2)
+            
+            # 方法3：波形形状检测
+            pos3 = detect_by_waveform_shape(samples)
+            if pos3 > 0:
+                detection_results.append(pos3)
+            
+            # 方法4：经验切除
+            pos4 = empirical_cut_for_tts()
+            detection_results.append(pos4)
+            
+            # 如果所有方法都认为有噪音，取中间值
+            if detection_results:
+                # 去掉最大最小值，取中间值
+                sorted_results = sorted(detection_results)
+                if len(sorted_results) >= 3:
+                    # 取中位数
+                    return sorted_results[len(sorted_results) // 2]
+                else:
+                    # 取平均值
+                    return int(np.mean(sorted_results))
+            
+            return 480  # 默认切除30ms
+        
+        # 执行检测
+        start_index = combined_detection()
+        
+        # 确保不会切除太多（不超过20%，且不超过200ms）
+        max_cut = min(len(samples) // 5, 3200)  # 200ms或20%
+        start_index = min(start_index, max_cut)
+        
+        # 应用切除
+        if start_index > 0:
+            # 添加更长的淡入效果来平滑过渡（50ms）
+            fade_in_length = min(800, len(samples) - start_index)  # 50ms淡入
+            
+            # 复制切除后的音频
+            processed_samples = samples[start_index:].copy()
+            
+            if fade_in_length > 0 and len(processed_samples) > fade_in_length:
+                # 使用更平滑的淡入曲线（余弦曲线）
+                fade_in = np.cos(np.linspace(np.pi/2, 0, fade_in_length))
+                processed_samples[:fade_in_length] = (processed_samples[:fade_in_length] * fade_in).astype(dtype)
+                
+                pass  # 计时时不打印
+            
+            # 确保切除后音频不会太短
+            if len(processed_samples) > 1600:  # 至少100ms
+                return processed_samples.tobytes()
+        
+        # 如果没有切除或切除后太短，返回原始数据
+        return pcm_data
+
+
+def make_sentences(count: int, sample_rate: int, seed: int = 0):
+    """生成带开头爆破噪声的合成语音（确定性随机）"""
+    rng = np.random.default_rng(seed)
+    sentences = []
+    for _ in range(count):
+        duration = rng.uniform(0.8, 4.0)
+        n = int(duration * sample_rate)
+        t = np.arange(n) / sample_rate
+        f0 = rng.uniform(120, 260)
+        voice = 0.3 * np.sin(2 * np.pi * f0 * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 3 * t))
+        voice += 0.02 * rng.standard_normal(n)
+        burst = int(rng.uniform(0.005, 0.03) * sample_rate)
+        voice[:burst] += rng.uniform(0.3, 0.8) * rng.standard_normal(burst)
+        sentences.append((np.clip(voice, -1, 1) * 32767).astype(np.int16).tobytes())
+    return sentences
+
+
+def time_trim(trim, sentences):
+    """逐句计时，返回每句耗时（微秒）和输出"""
+    costs = []
+    outputs = []
+    for pcm in sentences:
+        start = time.perf_counter()
+        outputs.append(trim(pcm))
+        costs.append((time.perf_counter() - start) * 1e6)
+    return costs, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="爆破音切除微基准")
+    parser.add_argument("--sentences", type=int, default=200, help="测试句子数")
+    parser.add_argument("--sample-rate", type=int, default=32000, help="采样率")
+    args = parser.parse_args()
+
+    sentences = make_sentences(args.sentences, args.sample_rate)
+    legacy = LegacyTrimmer(args.sample_rate)
+    trimmer = OnsetTrimmer(args.sample_rate, verbose=False)
+
+    legacy_costs, legacy_out = time_trim(legacy._process_audio_start, sentences)
+    new_costs, new_out = time_trim(trimmer.trim, sentences)
+
+    mismatches = sum(1 for a, b in zip(legacy_out, new_out) if a != b)
+    legacy_median = float(np.median(legacy_costs))
+    new_median = float(np.median(new_costs))
+    print(f"📊 每句耗时（中位数）: 原实现 {legacy_median:.0f}us → 向量化 {new_median:.0f}us "
+          f"（{legacy_median / new_median:.1f}x）")
+    print(f"📊 每句耗时（平均）: 原实现 {np.mean(legacy_costs):.0f}us → 向量化 {np.mean(new_costs):.0f}us")
+    print(f"🔍 输出不一致的句子数: {mismatches}/{len(sentences)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+标点恢复对比：每次对整句重新标点（旧实现） vs 滑动窗口增量标点（streaming_punctuator）
+模拟ASR每个分片新增几个字、每次都对整句累计文本做标点，统计不同句长下单次调用的耗时和送入模型的字符数。
+默认使用CT-Transformer（需要funasr）；--stub 使用按字符数计时的桩模型。
+用法：python benchmarks/bench_punctuation.py [--stub] [--lengths 25 50 100 200 400]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streaming_punctuator import StreamingPunctuator
+
+FILLER = "今天天气很好我们一起去公园散步吧你最近在看什么书呢我很喜欢听音乐周末打算去哪里玩"
+
+
+def make_text(num_chars: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    return "".join(rng.choice(FILLER) for _ in range(num_chars))
+
+
+class StubPuncModel:
+    """桩模型：耗时 = base_ms + per_char_ms × 字数；按字符内容插入标点（与位置无关，窗口切分不改变结果）"""
+
+    def __init__(self, base_ms: float, per_char_ms: float):
+        self.base_ms = base_ms
+        self.per_char_ms = per_char_ms
+
+    def __call__(self, text: str) -> str:
+        time.sleep((self.base_ms + self.per_char_ms * len(text)) / 1000)
+        return "".join(ch + ("，" if ord(ch) % 11 == 0 else "") for ch in text) + "。"
+
+
+def create_model(args):
+    if args.stub:
+        return StubPuncModel(args.base_ms, args.per_char_ms)
+    from funasr import AutoModel
+    model = AutoModel(model=args.model, disable_update=True)
+
+    def punc(text: str) -> str:
+        result = model.generate(input=text)
+        return result[0]["text"] if result else text
+
+    return punc
+
+
+def run(punc_fn, text: str, step: int):
+    """逐步增长的整句文本，返回(最后一次调用耗时ms, 平均调用耗时ms, 送入模型的字符数, 最终结果)"""
+    latencies = []
+    model_chars = 0
+    result = ""
+    for end in range(step, len(text) + step, step):
+        partial = text[:end]
+        start = time.perf_counter()
+        result = punc_fn(partial)
+        latencies.append((time.perf_counter() - start) * 1000)
+        model_chars += len(partial)
+    return latencies[-1], sum(latencies) / len(latencies), model_chars, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="增量标点基准测试")
+    parser.add_argument("--stub", action="store_true", help="使用桩模型")
+    parser.add_argument("--model", default="ct-punc", help="funasr标点模型名称")
+    parser.add_argument("--base-ms", type=float, default=2.0, help="桩模型每次调用的固定耗时")
+    parser.add_argument("--per-char-ms", type=float, default=0.05, help="桩模型每个字符的耗时")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[25, 50, 100, 200, 400], help="句长（字符）")
+    parser.add_argument("--step", type=int, default=3, help="每次新增的字数（一个ASR分片）")
+    parser.add_argument("--window", type=int, default=40, help="增量标点的窗口长度")
+    args = parser.parse_args()
+
+    model = create_model(args)
+    print(f"{'句长':>5} {'整句-末次(ms)':>14} {'增量-末次(ms)':>14} {'整句-平均(ms)':>14} {'增量-平均(ms)':>14} "
+          f"{'整句送入字数':>12} {'增量送入字数':>12}  结果一致")
+    for length in args.lengths:
+        text = make_text(length)
+        full_last, full_mean, full_chars, full_result = run(model, text, args.step)
+
+        punctuator = StreamingPunctuator(model, window_chars=args.window)
+        inc_last, inc_mean, _, inc_result = run(punctuator.punctuate, text, args.step)
+        inc_chars = punctuator.get_stats()["model_chars"]
+
+        print(f"{length:>5} {full_last:>14.2f} {inc_last:>14.2f} {full_mean:>14.2f} {inc_mean:>14.2f} "
+              f"{full_chars:>12} {inc_chars:>12}  {'是' if inc_result == full_result else '否'}")
+
+
+if __name__ == "__main__":
+    main()
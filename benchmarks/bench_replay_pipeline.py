@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+回放基准测试：把16kHz WAV样本按AudioDriver的分片方式送入完整语音流水线
+    音频分片 → ASR.stream_process → control.asr_to_llm → TTS.stream_process
+无需麦克风和交互输入，输出JSON报告便于跨提交对比：
+首音频延迟、ASR实时率、对照参考文本的WER/CER、各阶段吞吐，以及latency_tracer的分阶段统计。
+
+样本目录：每个 xxx.wav 旁边放同名 xxx.txt（参考文本，可省略，省略时不计算WER）
+--playback null（或 wav:reply.wav）时TTS音频经AudioDriver的播放引擎送入无头输出设备，
+first_playback/turn_complete按实际播放时刻记录（含抖动缓冲）。
+用法：python benchmarks/bench_replay_pipeline.py fixtures/ [--stub --profile gpu] [--pace fast] [--playback null]
+      [--json out.json]
+"""
+import os
+import re
+import sys
+import json
+import time
+import wave
+import queue
+import argparse
+import threading
+import subprocess
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import control
+from base_interface import AudioData, TextData
+from latency_tracer import tracer
+from stub_backends import PROFILES, StubASRModule, create_stub_backends
+
+SAMPLE_RATE = 16000
+CHUNK_DURATION = 0.6  # 与AudioDriver的采集分片一致
+TURN_TIMEOUT = 120.0  # 单个样本的最长等待时间
+SETTLE_TIME = 0.5     # TTS结束后再等待一段时间，确认没有后续句子
+
+
+# ===================== 样本与文本指标 =====================
+def load_fixtures(fixture_dir: str):
+    """读取样本目录：[(名称, PCM字节, 时长秒, 参考文本或None)]"""
+    fixtures = []
+    for name in sorted(os.listdir(fixture_dir)):
+        if not name.lower().endswith(".wav"):
+            continue
+        path = os.path.join(fixture_dir, name)
+        with wave.open(path, "rb") as wf:
+            if wf.getframerate() != SAMPLE_RATE or wf.getnchannels() != 1 or wf.getsampwidth() != 2:
+                print(f"⚠️ 跳过 {name}：需要16kHz/单声道/16bit，实际为"
+                      f"{wf.getframerate()}Hz/{wf.getnchannels()}声道/{wf.getsampwidth() * 8}bit")
+                continue
+            pcm = wf.readframes(wf.getnframes())
+            duration = wf.getnframes() / SAMPLE_RATE
+
+        reference = None
+        txt_path = os.path.splitext(path)[0] + ".txt"
+        if os.path.exists(txt_path):
+            with open(txt_path, "r", encoding="utf-8") as f:
+                reference = f.read().strip()
+        fixtures.append((os.path.splitext(name)[0], pcm, duration, reference))
+    return fixtures
+
+
+def _tokens(text: str, by_char: bool):
+    """去掉标点和空白后切分：CER按字符；WER中文按字、英文/数字按词"""
+    text = re.sub(r"[^\w]", " ", text.lower())
+    if by_char:
+        return [ch for ch in text if not ch.isspace()]
+    return re.findall(r"[a-z0-9]+|[^\sa-z0-9]", text)
+
+
+def edit_distance(ref, hyp) -> int:
+    """Levenshtein距离（单行滚动数组）"""
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        curr = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            curr[j] = min(prev[j] + 1, curr[j - 1] + 1, prev[j - 1] + (r != h))
+        prev = curr
+    return prev[-1]
+
+
+def error_rates(pairs):
+    """汇总[(参考, 识别)]的WER与CER"""
+    word_errors = word_total = char_errors = char_total = 0
+    for reference, hypothesis in pairs:
+        ref_words, hyp_words = _tokens(reference, False), _tokens(hypothesis, False)
+        ref_chars, hyp_chars = _tokens(reference, True), _tokens(hypothesis, True)
+        word_errors += edit_distance(ref_words, hyp_words)
+        word_total += len(ref_words)
+        char_errors += edit_distance(ref_chars, hyp_chars)
+        char_total += len(ref_chars)
+    return (
+        round(word_errors / word_total, 4) if word_total else None,
+        round(char_errors / char_total, 4) if char_total else None,
+    )
+
+
+# ===================== 流水线 =====================
+class ReplayPipeline:
+    """搭建 ASR → LLM → TTS 流水线，在各级队列之间插入计时探针"""
+
+    def __init__(self, asr_module, tts_module, audio_driver=None):
+        self.asr_module = asr_module
+        self.tts_module = tts_module
+        self.audio_driver = audio_driver  # 为None时音频到达探针即视为播放
+        self.asr_output_q = queue.Queue()   # ASR → 探针
+        self.llm_input_q = queue.Queue()    # 探针 → asr_to_llm
+        self.tts_text_q = queue.Queue()     # asr_to_llm → 探针
+        self.tts_input_q = queue.Queue()    # 探针 → TTS
+        self.tts_output_q = queue.Queue()   # TTS → 探针（代替播放）
+        self.lock = threading.Lock()
+        self.running = True
+        self.reset_turn()
+
+    def reset_turn(self):
+        with self.lock:
+            self.asr_texts = []
+            self.asr_done_time = None
+            self.sentences = 0
+            self.response_chars = 0
+            self.first_sentence_time = None
+            self.last_sentence_time = None
+            self.text_end_markers = 0
+            self.audio_end_markers = 0
+            self.first_audio_time = None
+            self.last_audio_time = None
+            self.audio_seconds = 0.0
+
+    def start(self):
+        control.is_running = True
+        for target, name in (
+            (self._asr_tap, "回放-ASR探针"),
+            (lambda: control.asr_to_llm(self.llm_input_q, self.tts_text_q), "回放-LLM"),
+            (self._text_tap, "回放-文本探针"),
+            (self._tts_loop, "回放-TTS"),
+            (self._audio_sink, "回放-音频探针"),
+        ):
+            threading.Thread(target=target, name=name, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        control.is_running = False
+
+    def _asr_tap(self):
+        while self.running:
+            try:
+                text_data: TextData = self.asr_output_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            with self.lock:
+                if text_data.text:
+                    self.asr_texts.append(text_data.text)
+                elif text_data.is_finish:
+                    self.asr_done_time = time.perf_counter()
+            self.llm_input_q.put(text_data)
+
+    def _text_tap(self):
+        while self.running:
+            try:
+                text_data: TextData = self.tts_text_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            now = time.perf_counter()
+            with self.lock:
+                if text_data.text:
+                    self.sentences += 1
+                    self.response_chars += len(text_data.text)
+                    if self.first_sentence_time is None:
+                        self.first_sentence_time = now
+                    self.last_sentence_time = now
+                # asr_to_llm出错时只发兜底回复（is_finish=True且有文本），同样算作一轮结束
+                if text_data.is_finish:
+                    self.text_end_markers += 1
+            self.tts_input_q.put(text_data)
+            if text_data.is_finish and text_data.text:
+                self.tts_input_q.put(TextData(text="", is_finish=True, turn_id=text_data.turn_id))
+
+    def _tts_loop(self):
+        # TTS的stream_process每收到一个结束标记返回一次，循环重启
+        while self.running:
+            self.tts_module.stream_process(self.tts_input_q, self.tts_output_q)
+
+    def _audio_sink(self):
+        while self.running:
+            try:
+                audio: AudioData = self.tts_output_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            now = time.perf_counter()
+            if self.audio_driver is not None:
+                self.audio_driver.push_audio_for_play(audio)
+            with self.lock:
+                if audio.pcm_data:
+                    # 没有播放设备：音频到达这里即视为开始播放
+                    if self.audio_driver is None:
+                        tracer.mark(audio.turn_id, "first_playback")
+                    if self.first_audio_time is None:
+                        self.first_audio_time = now
+                    self.last_audio_time = now
+                    bytes_per_second = audio.sample_rate * audio.channels * audio.bit_depth // 8
+                    self.audio_seconds += len(audio.pcm_data) / bytes_per_second
+                elif audio.is_finish:
+                    if self.audio_driver is None:
+                        tracer.mark(audio.turn_id, "turn_complete")
+                    self.audio_end_markers += 1
+
+    def turn_settled(self) -> bool:
+        """ASR已结束，且所有LLM回复都已合成完毕"""
+        with self.lock:
+            if self.asr_done_time is None:
+                return False
+            if not self.asr_texts:
+                return True
+            if self.audio_driver is not None and self.audio_driver.is_speaking():
+                return False
+            return self.text_end_markers > 0 and self.audio_end_markers >= self.text_end_markers
+
+    def feed(self, pcm: bytes, pace: str, chunk_duration: float):
+        """按AudioData分片送入ASR；realtime模式按分片时长等待"""
+        asr_input_q = queue.Queue()
+        asr_thread = threading.Thread(
+            target=self.asr_module.stream_process, args=(asr_input_q, self.asr_output_q), daemon=True
+        )
+        asr_thread.start()
+
+        chunk_bytes = int(SAMPLE_RATE * chunk_duration) * 2
+        start = time.perf_counter()
+        for i, offset in enumerate(range(0, len(pcm), chunk_bytes)):
+            if pace == "realtime":
+                delay = start + i * chunk_duration - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            asr_input_q.put(AudioData(pcm_data=pcm[offset:offset + chunk_bytes], sample_rate=SAMPLE_RATE, channels=1))
+        # 实时模式下最后一个分片录满才会送出
+        if pace == "realtime":
+            remaining = start + len(pcm) / (SAMPLE_RATE * 2) - time.perf_counter()
+            if remaining > 0:
+                time.sleep(remaining)
+        feed_end = time.perf_counter()
+        asr_input_q.put(AudioData(pcm_data=b"", sample_rate=SAMPLE_RATE, channels=1, is_finish=True))
+        return start, feed_end, asr_thread
+
+
+def run_fixture(pipeline: ReplayPipeline, fixture, pace: str, chunk_duration: float):
+    """回放一个样本，返回该样本的指标"""
+    name, pcm, duration, reference = fixture
+    pipeline.reset_turn()
+    feed_start, feed_end, asr_thread = pipeline.feed(pcm, pace, chunk_duration)
+
+    deadline = time.perf_counter() + TURN_TIMEOUT
+    while not pipeline.turn_settled() and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    timed_out = not pipeline.turn_settled()
+    time.sleep(SETTLE_TIME)
+    asr_thread.join(timeout=5)
+
+    with pipeline.lock:
+        hypothesis = "".join(pipeline.asr_texts)
+        asr_done = pipeline.asr_done_time or feed_end
+        result = {
+            "name": name,
+            "audio_s": round(duration, 3),
+            "reference": reference,
+            "hypothesis": hypothesis,
+            "timed_out": timed_out,
+            # ASR：整段处理耗时/音频时长（fast模式下即实时率），以及送完音频到出最终结果的延迟
+            "asr_rtf": round((asr_done - feed_start) / duration, 4) if duration else None,
+            "asr_final_latency_s": round(asr_done - feed_end, 4),
+            # 首音频：用户说完（最后一个分片送出）到TTS产出第一段音频
+            "time_to_first_audio_s": (
+                round(pipeline.first_audio_time - feed_end, 4) if pipeline.first_audio_time else None
+            ),
+            "sentences": pipeline.sentences,
+            "response_chars": pipeline.response_chars,
+            "llm_chars_per_s": (
+                round(pipeline.response_chars / (pipeline.last_sentence_time - asr_done), 2)
+                if pipeline.last_sentence_time and pipeline.last_sentence_time > asr_done else None
+            ),
+            "tts_audio_s": round(pipeline.audio_seconds, 3),
+            "tts_rtf": (
+                round((pipeline.last_audio_time - pipeline.first_sentence_time) / pipeline.audio_seconds, 4)
+                if pipeline.audio_seconds and pipeline.first_sentence_time else None
+            ),
+        }
+    return result
+
+
+def _median(values):
+    values = sorted(v for v in values if v is not None)
+    return values[len(values) // 2] if values else None
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def create_backends(args, fixtures):
+    """创建(ASR, TTS)，并设置control使用的LLM后端"""
+    if args.stub:
+        _, tokenizer, llm_model, tts_module = create_stub_backends(args.profile, tts_workers=args.tts_workers)
+        # 桩ASR直接"识别"出参考文本，使下游拿到真实的对话内容
+        transcripts = [ref or "你好。" for _, _, _, ref in fixtures]
+        asr_module = StubASRModule(PROFILES[args.profile], transcripts=transcripts)
+        control.use_llm_backend(tokenizer, llm_model)
+        return asr_module, tts_module
+
+    from funasr_driver import FunASRStreamingASR
+    from tts_driver import GenieTTSModule
+    control.init_control_modules()
+    return FunASRStreamingASR(), GenieTTSModule()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WAV样本回放的端到端流水线基准测试")
+    parser.add_argument("fixtures", help="WAV样本目录（16kHz单声道16bit，同名.txt为参考文本）")
+    parser.add_argument("--stub", action="store_true", help="使用stub_backends桩后端")
+    parser.add_argument("--profile", default="gpu", choices=sorted(PROFILES), help="桩后端延迟配置")
+    parser.add_argument("--tts-workers", type=int, default=1, help="桩TTS预合成线程数")
+    parser.add_argument("--pace", default="realtime", choices=["realtime", "fast"], help="按实时速度或尽快送入音频")
+    parser.add_argument("--chunk-duration", type=float, default=CHUNK_DURATION, help="音频分片时长（秒）")
+    parser.add_argument("--no-speculative", action="store_true", help="关闭推测式LLM生成（对比用）")
+    parser.add_argument("--fixed-chunks", action="store_true", help="关闭LLM→TTS自适应分块（对比用）")
+    parser.add_argument("--playback", default=None,
+                        help="经播放引擎输出到无头设备：null | null-fast | wav:reply.wav（见audio_devices.create_backend）")
+    parser.add_argument("--trace", default=None, help="导出Chrome trace的路径")
+    parser.add_argument("--json", default=None, help="结果输出的JSON文件路径")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures)
+    if not fixtures:
+        print(f"❌ {args.fixtures} 中没有可用的WAV样本")
+        sys.exit(1)
+
+    asr_module, tts_module = create_backends(args, fixtures)
+    if args.no_speculative:
+        control.SPECULATIVE_STABLE_TIME = None
+    if args.fixed_chunks:
+        control.ADAPTIVE_CHUNKING = False
+    audio_driver = None
+    if args.playback:
+        from audio_player import AudioDriver
+        from audio_devices import create_backend
+        audio_driver = AudioDriver(backend=create_backend(args.playback, "none"))
+        audio_driver.start_play()
+    control.configure_chunk_policy(tts_module, audio_driver)
+    asr_module.partial_callback = control.on_partial_transcript
+    tracer.reset()
+    pipeline = ReplayPipeline(asr_module, tts_module, audio_driver)
+    pipeline.start()
+
+    results = []
+    bench_start = time.perf_counter()
+    try:
+        for fixture in fixtures:
+            result = run_fixture(pipeline, fixture, args.pace, args.chunk_duration)
+            print(f"🎧 {result['name']}: 首音频={result['time_to_first_audio_s']}s, "
+                  f"ASR RTF={result['asr_rtf']}, 识别: {result['hypothesis']}")
+            results.append(result)
+    finally:
+        speculative_stats = control.speculative_llm.get_stats() if control.speculative_llm else None
+        pipeline.stop()
+    wall_time = time.perf_counter() - bench_start
+    playback_stats = None
+    if audio_driver is not None:
+        playback_stats = {"engine": audio_driver.get_playback_stats(), "device": audio_driver.get_device_stats()}
+        audio_driver.release()
+
+    wer, cer = error_rates([(r["reference"], r["hypothesis"]) for r in results if r["reference"]])
+    total_audio = sum(r["audio_s"] for r in results)
+    summary = {
+        "revision": _git_revision(),
+        "backend": f"stub:{args.profile}" if args.stub else "real",
+        "pace": args.pace,
+        "chunk_duration_s": args.chunk_duration,
+        "fixtures": len(results),
+        "timed_out": sum(r["timed_out"] for r in results),
+        "median_time_to_first_audio_s": _median(r["time_to_first_audio_s"] for r in results),
+        "median_asr_rtf": _median(r["asr_rtf"] for r in results),
+        "median_asr_final_latency_s": _median(r["asr_final_latency_s"] for r in results),
+        "wer": wer,
+        "cer": cer,
+        "throughput": {
+            "asr_audio_s_per_wall_s": round(total_audio / wall_time, 3) if wall_time else None,
+            "llm_chars_per_s": _median(r["llm_chars_per_s"] for r in results),
+            "tts_rtf": _median(r["tts_rtf"] for r in results),
+        },
+        "speculative_llm": speculative_stats,
+        "chunk_policy": control.chunk_policy.get_stats() if control.ADAPTIVE_CHUNKING else None,
+        "playback": playback_stats,
+        "stages_ms": tracer.stage_stats(),
+        "results": results,
+    }
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+    if args.trace:
+        tracer.export_chrome_trace(args.trace)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
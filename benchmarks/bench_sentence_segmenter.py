@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+LLM→TTS分句对比：每个token都重扫整个缓冲的SmartSentenceSplitter（旧实现） vs 增量分句（sentence_segmenter）
+模拟LLM逐token（1-3个字符）输出，统计每个token的平均分句耗时和吞吐；
+--max-length 调大时旧实现的缓冲更长，重扫开销更明显。
+用法：python benchmarks/bench_sentence_segmenter.py [--chars 200 1000 5000] [--max-length 40]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sentence_segmenter import IncrementalSentenceSegmenter
+
+PIECES = ["今天天气很好", "我们一起去公园散步吧", "你最近在看什么书呢", "价格是3.14元", "他说：“你好。”",
+          "我很喜欢听音乐", "然后……", "真的吗？！", "比如", "这个问题很复杂"]
+ENDINGS = ["。", "！", "？", "，", "，", "、", ""]
+
+
+class LegacySmartSentenceSplitter:
+    """旧实现（原control.SmartSentenceSplitter）：每次追加都用str.find重扫整个缓冲"""
+
+    def __init__(self, min_chunk_length=5, max_chunk_length=100):
+        self.min_length = min_chunk_length
+        self.max_length = max_chunk_length
+        self.buffer = ""
+        self.endings = ['。', '！', '？', '.', '!', '?', '；', ';']
+        self.weak_endings = ['，', ',', '、', '：', ':']
+
+    def add_text(self, text):
+        self.buffer += text
+        sentences = []
+        end_positions = []
+        for ending in self.endings:
+            pos = self.buffer.find(ending)
+            while pos != -1:
+                end_positions.append(pos)
+                pos = self.buffer.find(ending, pos + 1)
+        end_positions.sort()
+        last_end = 0
+        for pos in end_positions:
+            sentence = self.buffer[last_end:pos + 1].strip()
+            if len(sentence) >= self.min_length:
+                sentences.append(sentence)
+                last_end = pos + 1
+        self.buffer = self.buffer[last_end:]
+        if len(self.buffer) > self.max_length:
+            split_pos = -1
+            for ending in self.weak_endings:
+                pos = self.buffer.rfind(ending)
+                if pos > split_pos:
+                    split_pos = pos
+            if split_pos > 0:
+                sentences.append(self.buffer[:split_pos + 1])
+                self.buffer = self.buffer[split_pos + 1:]
+            else:
+                sentences.append(self.buffer)
+                self.buffer = ""
+        return sentences
+
+    def flush(self):
+        remaining = self.buffer
+        self.buffer = ""
+        return remaining
+
+
+def make_tokens(num_chars: int, seed: int = 0):
+    """生成回复并切成1-3个字符的token"""
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    while length < num_chars:
+        piece = rng.choice(PIECES) + rng.choice(ENDINGS)
+        parts.append(piece)
+        length += len(piece)
+    text = "".join(parts)
+    tokens = []
+    i = 0
+    while i < len(text):
+        step = rng.randint(1, 3)
+        tokens.append(text[i:i + step])
+        i += step
+    return tokens
+
+
+def run(splitter, tokens, repeat: int):
+    """返回(每token平均耗时µs, 句子数)"""
+    best = float("inf")
+    count = 0
+    for _ in range(repeat):
+        count = 0
+        start = time.perf_counter()
+        for token in tokens:
+            count += len(splitter.add_text(token))
+        if splitter.flush().strip():
+            count += 1
+        best = min(best, time.perf_counter() - start)
+    return best / len(tokens) * 1e6, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="增量分句基准测试")
+    parser.add_argument("--chars", type=int, nargs="+", default=[200, 1000, 5000], help="回复长度（字符）")
+    parser.add_argument("--max-length", type=int, default=40, help="无结束符时的最大句长")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数（取最快）")
+    args = parser.parse_args()
+
+    print(f"{'回复字数':>8} {'token数':>7} {'旧-µs/token':>12} {'新-µs/token':>12} {'新-万token/s':>13} "
+          f"{'旧-句数':>7} {'新-句数':>7}")
+    for num_chars in args.chars:
+        tokens = make_tokens(num_chars)
+        legacy_us, legacy_count = run(LegacySmartSentenceSplitter(3, args.max_length), tokens, args.repeat)
+        new_us, new_count = run(IncrementalSentenceSegmenter(3, args.max_length), tokens, args.repeat)
+        print(f"{num_chars:>8} {len(tokens):>7} {legacy_us:>12.2f} {new_us:>12.2f} {100 / new_us:>13.1f} "
+              f"{legacy_count:>7} {new_count:>7}")
+
+
+if __name__ == "__main__":
+    main()
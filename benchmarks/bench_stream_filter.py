@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+身份关键词过滤对比：累计回复上逐词replace（旧实现） vs 流式Aho-Corasick过滤（stream_filter）
+模拟stream_chat逐步产出累计回复，统计每轮过滤总耗时，并检查旧实现的吞字/重复问题。
+用法：python benchmarks/bench_stream_filter.py [--chars 4000] [--repeat 5]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stream_filter import StreamingResponseFilter, StreamingWordFilter, DEFAULT_FILTER_WORDS
+
+FILLER = "今天天气很好，我们一起去公园散步吧！你最近在看什么书呢？我很喜欢听音乐。"
+
+
+def make_response(num_chars: int, seed: int = 0) -> str:
+    """生成夹杂关键词的长回复"""
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    while length < num_chars:
+        piece = FILLER[rng.randrange(len(FILLER)):][:rng.randint(3, 12)]
+        if rng.random() < 0.1:
+            piece += rng.choice(DEFAULT_FILTER_WORDS)
+        parts.append(piece)
+        length += len(piece)
+    return "".join(parts)
+
+
+def cumulative_steps(response: str, seed: int = 0):
+    """stream_chat式的累计回复序列（每步新增1-3个字符）"""
+    rng = random.Random(seed)
+    steps = []
+    end = 0
+    while end < len(response):
+        end = min(len(response), end + rng.randint(1, 3))
+        steps.append(response[:end])
+    return steps
+
+
+def legacy_filter(steps):
+    """旧实现：每步对整段累计回复逐词replace，再按长度切出增量"""
+    full_response = ""
+    output = []
+    for response in steps:
+        filtered_response = response
+        for word in DEFAULT_FILTER_WORDS:
+            filtered_response = filtered_response.replace(word, "")
+        if len(filtered_response) > len(full_response):
+            output.append(filtered_response[len(full_response):])
+            full_response = filtered_response
+    return "".join(output)
+
+
+def streaming_filter(steps):
+    """新实现：只处理每步新增的文本"""
+    response_filter = StreamingResponseFilter(DEFAULT_FILTER_WORDS)
+    output = [response_filter.feed(response) for response in steps]
+    output.append(response_filter.flush())
+    return "".join(output)
+
+
+def bench(func, steps, repeat):
+    best = float("inf")
+    result = ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(steps)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式关键词过滤基准测试")
+    parser.add_argument("--chars", type=int, nargs="+", default=[500, 2000, 8000], help="回复长度（字符）")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数（取最快一次）")
+    args = parser.parse_args()
+
+    print(f"{'长度':>6} {'步数':>6} {'旧实现(ms)':>12} {'流式(ms)':>10} {'加速比':>8}  旧实现输出是否正确")
+    for num_chars in args.chars:
+        response = make_response(num_chars)
+        steps = cumulative_steps(response)
+        expected = StreamingWordFilter(DEFAULT_FILTER_WORDS).filter_text(response)
+
+        legacy_time, legacy_output = bench(legacy_filter, steps, args.repeat)
+        stream_time, stream_output = bench(streaming_filter, steps, args.repeat)
+        assert stream_output == expected, "流式过滤结果与整段过滤不一致"
+
+        print(f"{num_chars:>6} {len(steps):>6} {legacy_time * 1000:>12.2f} {stream_time * 1000:>10.2f} "
+              f"{legacy_time / stream_time:>7.1f}x  {'是' if legacy_output == expected else '否（吞字/重复）'}")
+
+
+if __name__ == "__main__":
+    main()
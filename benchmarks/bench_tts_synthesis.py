@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+TTS合成路径对比测试：临时WAV文件往返 vs 内存PCM
+用法：python benchmarks/bench_tts_synthesis.py [--rounds 3] [--json result.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tts_driver import GenieTTSModule
+
+# 长短混合的测试句子（贴近LLM分句后的实际长度）
+TEST_SENTENCES = [
+    "你好呀！",
+    "今天天气真不错，要不要出去走走？",
+    "我最近在听一首很好听的歌，旋律特别温柔。",
+    "抱歉，我刚才有点走神了，我们继续聊吧。",
+    "如果你有一种超能力，但只能在周二使用，你会选什么能力？",
+]
+
+
+def run_path(synthesize, sentences, rounds):
+    """对单一合成路径计时，返回每句耗时列表（毫秒）和总字节数"""
+    latencies = []
+    total_bytes = 0
+    for _ in range(rounds):
+        for text in sentences:
+            start = time.perf_counter()
+            pcm = synthesize(text, split_sentence=False)
+            latencies.append((time.perf_counter() - start) * 1000)
+            total_bytes += len(pcm)
+    return latencies, total_bytes
+
+
+def summarize(latencies, total_bytes):
+    """汇总耗时统计"""
+    ordered = sorted(latencies)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.mean(ordered), 2),
+        "p50_ms": round(ordered[len(ordered) // 2], 2),
+        "max_ms": round(ordered[-1], 2),
+        "total_bytes": total_bytes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TTS合成路径对比测试")
+    parser.add_argument("--rounds", type=int, default=3, help="每条路径重复的轮数")
+    parser.add_argument("--json", default=None, help="结果输出的JSON文件路径")
+    args = parser.parse_args()
+
+    tts_module = GenieTTSModule()
+
+    # 预热一次，避免首次推理的初始化开销混入结果
+    tts_module._synthesize_pcm_in_memory(TEST_SENTENCES[0])
+
+    results = {}
+    for name, synthesize in [
+        ("file", tts_module._synthesize_pcm_via_file),
+        ("memory", tts_module._synthesize_pcm_in_memory),
+    ]:
+        print(f"🔄 测试合成路径: {name}")
+        latencies, total_bytes = run_path(synthesize, TEST_SENTENCES, args.rounds)
+        results[name] = summarize(latencies, total_bytes)
+        print(f"   {results[name]}")
+
+    saved = results["file"]["mean_ms"] - results["memory"]["mean_ms"]
+    results["saved_mean_ms"] = round(saved, 2)
+    print(f"📊 内存路径平均每句节省: {saved:.2f}ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已保存到 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
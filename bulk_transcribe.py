@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+批量转写工具：把一个目录（或清单）里的录音分发到多个进程并行识别，结果写成JSONL
+- 每个工作进程只加载一次模型，之后处理分到的所有文件
+- 默认使用与实时对话相同的流式识别（FunASRStreamingASR.process，含标点恢复），结果与线上一致
+- --offline 使用非流式的 paraformer-zh（+fsmn-vad+ct-punc），整段识别，吞吐更高、准确率更好
+- 清单可以带参考文本，原样写入结果，便于构建WER测试集；--resume 跳过输出文件里已有的条目
+
+清单格式：
+    .jsonl  每行 {"audio": "路径", "text": "参考文本（可省略）", "id": "可省略"}
+    其他    每行 "路径" 或 "ID 路径"（Kaldi wav.scp）
+用法：python bulk_transcribe.py archive/ -o results.jsonl [--offline] [--workers 4] [--resume]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import soundfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE_RATE = 16000
+AUDIO_EXTENSIONS = (".wav", ".flac", ".ogg", ".mp3")
+
+# 工作进程内的识别器（由_init_worker创建，每个进程一个）
+_transcriber = None
+
+
+# ===================== 输入 =====================
+def collect_inputs(source: str) -> List[Dict[str, Any]]:
+    """目录（递归查找音频文件）或清单 → [{"id", "audio", "text"}]"""
+    items = []
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                if name.lower().endswith(AUDIO_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    items.append({"id": os.path.splitext(os.path.relpath(path, source))[0], "audio": path,
+                                  "text": None})
+        items.sort(key=lambda item: item["id"])
+        return items
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    with open(source, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if source.endswith(".jsonl"):
+                entry = json.loads(line)
+                path, text, item_id = entry["audio"], entry.get("text"), entry.get("id")
+            else:
+                parts = line.split(maxsplit=1)
+                item_id, path = (parts[0], parts[1]) if len(parts) == 2 else (None, parts[0])
+                text = None
+            if not os.path.isabs(path):
+                path = os.path.join(base_dir, path)  # 清单中的相对路径以清单所在目录为准
+            items.append({"id": item_id or os.path.splitext(os.path.basename(path))[0], "audio": path, "text": text})
+    return items
+
+
+def load_audio(path: str) -> np.ndarray:
+    """读取音频为16kHz单声道float32（其他采样率线性插值重采样）"""
+    audio, sr = soundfile.read(path, dtype="float32", always_2d=True)
+    audio = audio[:, 0]
+    if sr != SAMPLE_RATE:
+        new_length = int(len(audio) * SAMPLE_RATE / sr)
+        audio = np.interp(np.linspace(0, len(audio) - 1, new_length), np.arange(len(audio)), audio).astype(np.float32)
+    return audio
+
+
+# ===================== 识别器 =====================
+class StreamingTranscriber:
+    """与实时对话相同的流式识别路径"""
+
+    def __init__(self):
+        from funasr_driver import FunASRStreamingASR
+        self.asr = FunASRStreamingASR()
+
+    def transcribe(self, audio: np.ndarray) -> str:
+        from funasr_driver import AudioData
+        self.asr.punctuator.reset()
+        pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+        return self.asr.process(AudioData(pcm_data=pcm, sample_rate=SAMPLE_RATE, channels=1, is_finish=True)).text
+
+
+class OfflineTranscriber:
+    """非流式paraformer-zh整段识别（fsmn-vad切分长音频，ct-punc加标点）"""
+
+    def __init__(self, batch_size_s: int = 300):
+        from funasr import AutoModel
+        self.batch_size_s = batch_size_s
+        self.model = AutoModel(model="paraformer-zh", vad_model="fsmn-vad", punc_model="ct-punc",
+                               disable_update=True)
+
+    def transcribe(self, audio: np.ndarray) -> str:
+        res = self.model.generate(input=audio, batch_size_s=self.batch_size_s)
+        return "".join(r.get("text", "") for r in res) if res else ""
+
+
+def _init_worker(offline: bool, threads: int):
+    """工作进程初始化：限制推理线程数（避免多进程争抢CPU），加载一次模型"""
+    global _transcriber
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _transcriber = OfflineTranscriber() if offline else StreamingTranscriber()
+
+
+def _transcribe_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    result = {"id": item["id"], "audio": item["audio"], "worker_pid": os.getpid()}
+    try:
+        load_start = time.perf_counter()
+        audio = load_audio(item["audio"])
+        decode_start = time.perf_counter()
+        text = _transcriber.transcribe(audio)
+        decode_s = time.perf_counter() - decode_start
+        duration = len(audio) / SAMPLE_RATE
+        result.update({
+            "text": text,
+            "duration_s": round(duration, 3),
+            "load_s": round(decode_start - load_start, 3),
+            "decode_s": round(decode_s, 3),
+            "rtf": round(decode_s / duration, 4) if duration else None,
+        })
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    if item.get("text") is not None:
+        result["reference"] = item["text"]
+    return result
+
+
+# ===================== 主流程 =====================
+def _load_done_ids(path: str) -> set:
+    """已成功转写的条目ID（--resume）"""
+    done = set()
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 上次中断时写了一半的行
+                if "error" not in entry:
+                    done.add(entry.get("id"))
+    return done
+
+
+def run(items: List[Dict[str, Any]], output: str, offline: bool, workers: int, threads: int,
+        resume: bool) -> Dict[str, Any]:
+    if resume:
+        done = _load_done_ids(output)
+        skipped = sum(1 for item in items if item["id"] in done)
+        items = [item for item in items if item["id"] not in done]
+        print(f"⏭️ 跳过已转写的{skipped}个文件")
+    mode = "offline" if offline else "streaming"
+    print(f"🚀 {len(items)}个文件，{workers}个进程 × {threads}线程，模式: {mode}")
+
+    start = time.perf_counter()
+    audio_seconds = decode_seconds = 0.0
+    failed = 0
+    with open(output, "a" if resume else "w", encoding="utf-8") as f, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(offline, threads)) as pool:
+        futures = {pool.submit(_transcribe_item, item): item for item in items}
+        for i, future in enumerate(as_completed(futures), 1):
+            try:
+                result = future.result()
+            except Exception as e:
+                # 工作进程初始化失败/崩溃（BrokenProcessPool）：剩余条目逐个记为失败，而不是中断整批
+                item = futures[future]
+                result = {"id": item["id"], "audio": item["audio"], "error": f"{type(e).__name__}: {e}"}
+            result["mode"] = mode
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+            f.flush()
+            if "error" in result:
+                failed += 1
+                print(f"❌ [{i}/{len(items)}] {result['id']}: {result['error']}")
+            else:
+                audio_seconds += result["duration_s"]
+                decode_seconds += result["decode_s"]
+                print(f"✅ [{i}/{len(items)}] {result['id']} ({result['duration_s']:.1f}s, RTF {result['rtf']}): "
+                      f"{result['text']}")
+
+    wall = time.perf_counter() - start
+    summary = {
+        "files": len(items),
+        "failed": failed,
+        "audio_seconds": round(audio_seconds, 1),
+        "wall_seconds": round(wall, 1),
+        "decode_seconds": round(decode_seconds, 1),
+        "throughput_x_realtime": round(audio_seconds / wall, 2) if wall else None,
+    }
+    print(f"📊 转写完成: {summary}")
+    return summary
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="批量并行转写")
+    parser.add_argument("source", help="音频目录或清单文件（.jsonl / wav.scp / 每行一个路径）")
+    parser.add_argument("-o", "--output", default="transcripts.jsonl", help="结果JSONL")
+    parser.add_argument("--offline", action="store_true", help="使用非流式paraformer-zh整段识别")
+    parser.add_argument("--workers", type=int, default=2, help="工作进程数（每个进程各加载一份模型）")
+    parser.add_argument("--threads", type=int, default=0, help="每个进程的推理线程数（默认CPU核数/进程数）")
+    parser.add_argument("--resume", action="store_true", help="追加到已有结果，跳过已成功的条目")
+    args = parser.parse_args(argv)
+
+    items = collect_inputs(args.source)
+    if not items:
+        print(f"⚠️ 没有找到音频文件: {args.source}")
+        return
+    workers = max(1, min(args.workers, len(items)))
+    threads = args.threads or max(1, (os.cpu_count() or 1) // workers)
+    run(items, args.output, args.offline, workers, threads, args.resume)
+
+
+if __name__ == "__main__":
+    main()
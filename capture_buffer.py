@@ -0,0 +1,179 @@
+# capture_buffer.py
+"""
+麦克风采集缓冲：采集回调（10~30ms小帧）→ 预分配int16环形缓冲 → 消费端按需要的块长取出
+- 采集回调只做一次内存拷贝，不创建AudioData、不入队，采集帧长与ASR分片长度解耦
+- 容量有上限：消费端（ASR）卡住时丢弃最旧的音频（drop-oldest），内存不会无限增长，丢弃量计入统计
+- 非实时输入（如不限速读取的WAV）开启背压（backpressure）：写满时写入方等待消费端腾出空间，不丢音频
+- get()/get_nowait()与queue.Queue接口一致，每次返回block_frames帧的AudioData；
+  采集结束后先返回不足一块的尾部，再返回结束标记（is_finish=True）
+"""
+import queue
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from base_interface import AudioData
+
+
+class CaptureBuffer:
+    """单生产者（采集回调）/单消费者的int16环形缓冲，写满时丢弃最旧的音频"""
+
+    def __init__(self, sample_rate: int = 16000, channels: int = 1, capacity_seconds: float = 2.0,
+                 block_frames: int = 640):
+        """
+        :param capacity_seconds: 最多积压的音频时长（秒），超出时丢弃最旧的音频
+        :param block_frames: 消费端每次取出的帧数（ASR需要的分片长度）
+        """
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.capacity = int(capacity_seconds * sample_rate) * channels  # 样本数
+        if self.capacity <= 0:
+            raise ValueError(f"capacity_seconds必须为正数，当前为{capacity_seconds}")
+        self._ring = np.zeros(self.capacity, dtype=np.int16)
+        self._cond = threading.Condition()
+        self.backpressure = False  # True：写满时写入方等待（非实时输入），False：丢弃最旧的音频（实时设备）
+        self.set_block_frames(block_frames)
+        self.reset()
+
+    def set_block_frames(self, block_frames: int):
+        """设置消费端的块长（帧），不超过缓冲容量"""
+        block = max(1, int(block_frames)) * self.channels
+        if block > self.capacity:
+            raise ValueError(f"块长{block_frames}帧超过缓冲容量{self.capacity // self.channels}帧")
+        with self._cond:
+            self._block = block
+
+    def set_backpressure(self, enabled: bool):
+        """开启/关闭背压；关闭时唤醒正在等待空间的写入方（停止采集时）"""
+        with self._cond:
+            self.backpressure = enabled
+            self._cond.notify_all()
+
+    def reset(self):
+        """清空缓冲和统计（每次开始采集时调用）"""
+        with self._cond:
+            self._write = 0        # 累计写入的样本数
+            self._read = 0         # 累计读出（含丢弃）的样本数
+            self._finished = False
+            self._finish_sent = False
+            # 统计
+            self.callbacks = 0
+            self.overflow_events = 0     # 写满丢弃最旧音频的次数
+            self.dropped_samples = 0     # 被丢弃的样本数
+            self.device_overflows = 0    # 设备报告的输入溢出次数
+            self.blocks_read = 0
+            self.max_fill = 0            # 最大积压样本数
+            self._cond.notify_all()
+
+    # ===================== 写入（采集回调线程） =====================
+    def write(self, pcm_data: bytes, device_overflow: bool = False):
+        """写入一帧16bit PCM（写满时丢弃最旧的音频；开启背压时等待消费端腾出空间）"""
+        samples = np.frombuffer(pcm_data, dtype=np.int16)
+        n = len(samples)
+        with self._cond:
+            self.callbacks += 1
+            if device_overflow:
+                self.device_overflows += 1
+            # 背压：等到放得下整帧（采集结束或背压被关闭时不再等待，按丢弃最旧的音频处理）
+            while (self.backpressure and not self._finished
+                   and self._write - self._read + min(n, self.capacity) > self.capacity):
+                self._cond.wait(0.01)
+            if n > self.capacity:
+                self.dropped_samples += n - self.capacity
+                samples = samples[-self.capacity:]
+                n = self.capacity
+            start = self._write % self.capacity
+            first = min(n, self.capacity - start)
+            self._ring[start:start + first] = samples[:first]
+            if n > first:
+                self._ring[:n - first] = samples[first:]
+            self._write += n
+            overflow = self._write - self._read - self.capacity
+            if overflow > 0:
+                # 消费端跟不上：丢弃最旧的音频（保证读出的块仍按帧对齐）
+                self._read += overflow
+                self.overflow_events += 1
+                self.dropped_samples += overflow
+            fill = self._write - self._read
+            self.max_fill = max(self.max_fill, fill)
+            if fill >= self._block:
+                self._cond.notify()
+
+    def finish(self):
+        """采集结束：消费端取完剩余音频后收到结束标记"""
+        with self._cond:
+            self._finished = True
+            self._cond.notify_all()
+
+    # ===================== 读取（消费线程） =====================
+    def _take(self, n: int) -> bytes:
+        start = self._read % self.capacity
+        first = min(n, self.capacity - start)
+        data = self._ring[start:start + first].tobytes()
+        if n > first:
+            data += self._ring[:n - first].tobytes()
+        self._read += n
+        if self.backpressure:
+            self._cond.notify_all()  # 唤醒等待空间的写入方
+        return data
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> AudioData:
+        """取出一块音频（接口同queue.Queue.get，没有数据时抛出queue.Empty）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                available = self._write - self._read
+                if available >= self._block:
+                    self.blocks_read += 1
+                    return AudioData(pcm_data=self._take(self._block), sample_rate=self.sample_rate,
+                                     channels=self.channels)
+                if self._finished:
+                    if available:
+                        return AudioData(pcm_data=self._take(available), sample_rate=self.sample_rate,
+                                         channels=self.channels)
+                    if not self._finish_sent:
+                        self._finish_sent = True
+                        return AudioData(pcm_data=b"", sample_rate=self.sample_rate, channels=self.channels,
+                                         is_finish=True)
+                if not block:
+                    raise queue.Empty
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                self._cond.wait(remaining)
+
+    def get_nowait(self) -> AudioData:
+        return self.get(block=False)
+
+    def qsize(self) -> int:
+        """可取出的完整块数"""
+        with self._cond:
+            return (self._write - self._read) // self._block
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    @property
+    def buffered_duration(self) -> float:
+        """积压的音频时长（秒）"""
+        with self._cond:
+            return (self._write - self._read) / (self.sample_rate * self.channels)
+
+    # ===================== 统计 =====================
+    def get_stats(self) -> Dict[str, Any]:
+        """获取采集统计"""
+        rate = self.sample_rate * self.channels
+        with self._cond:
+            return {
+                "block_ms": round(self._block / rate * 1000, 1),
+                "buffered_ms": round((self._write - self._read) / rate * 1000, 1),
+                "captured_s": round(self._write / rate, 3),
+                "callbacks": self.callbacks,
+                "blocks_read": self.blocks_read,
+                "max_fill_ms": round(self.max_fill / rate * 1000, 1),
+                "overflow_events": self.overflow_events,
+                "dropped_ms": round(self.dropped_samples / rate * 1000, 1),
+                "device_overflows": self.device_overflows,
+            }
@@ -0,0 +1,259 @@
+# chunk_policy.py
+"""
+按延迟自适应的LLM→TTS分块策略
+- 第一块：越早送入TTS越好——达到first_soft_chars后的第一个逗号处（或first_max_chars处）就切分
+- 后续块：播放缓冲里的音频足够时，把块变长（合并短句），摊薄每次TTS调用的固定开销；
+  块长取"在剩余播放时长内来得及等到LLM输出并合成完"的最大字数（按实测的TTS合成耗时和LLM输出速度估算），
+  且不小于合成速度能追上播放的最短块长，合成始终略领先于播放
+- 剩余播放时长已不够合成一个短块时（如LLM中途长时间停顿），回到首块规则
+剩余播放时长 = max(播放缓冲实测时长, 按已发送文本估算的未播放音频时长)。
+"""
+import time
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from sentence_segmenter import IncrementalSentenceSegmenter
+
+
+class TTSRateEstimator:
+    """TTS合成耗时模型：合成耗时 ≈ 固定开销 + 每字耗时 × 字数（按最近的合成记录拟合）"""
+
+    def __init__(self, overhead: float = 0.15, seconds_per_char: float = 0.06, audio_per_char: float = 0.22,
+                 window: int = 32):
+        """
+        :param overhead: 没有记录时假定的每次调用固定开销（秒）
+        :param seconds_per_char: 没有记录时假定的每字合成耗时（秒）
+        :param audio_per_char: 没有记录时假定的每字音频时长（秒，中文语速约4.5字/秒）
+        :param window: 参与拟合的最近记录数
+        """
+        self.default_overhead = overhead
+        self.default_seconds_per_char = seconds_per_char
+        self.default_audio_per_char = audio_per_char
+        self._records: Deque[Tuple[int, float, float]] = deque(maxlen=window)  # (字数, 合成耗时, 音频时长)
+        self._lock = threading.Lock()
+        self._fit()
+
+    def record(self, chars: int, synth_seconds: float, audio_seconds: float):
+        """记录一次合成（缓存命中不应记录）"""
+        if chars <= 0 or audio_seconds <= 0:
+            return
+        with self._lock:
+            self._records.append((chars, synth_seconds, audio_seconds))
+            self._fit()
+
+    def _fit(self):
+        records = list(self._records)
+        if not records:
+            self.overhead = self.default_overhead
+            self.seconds_per_char = self.default_seconds_per_char
+            self.audio_per_char = self.default_audio_per_char
+            return
+        xs = [r[0] for r in records]
+        ys = [r[1] for r in records]
+        n = len(records)
+        mean_x, mean_y = sum(xs) / n, sum(ys) / n
+        var_x = sum((x - mean_x) ** 2 for x in xs)
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x if var_x else 0.0
+        if slope > 0 and mean_y - slope * mean_x >= 0:
+            self.seconds_per_char = slope
+            self.overhead = mean_y - slope * mean_x
+        else:
+            # 句长都一样（或数据噪声大）：按默认模型的比例整体缩放
+            scale = mean_y / (self.default_overhead + self.default_seconds_per_char * mean_x)
+            self.overhead = self.default_overhead * scale
+            self.seconds_per_char = self.default_seconds_per_char * scale
+        self.audio_per_char = sum(r[2] for r in records) / sum(xs)
+
+    @property
+    def rtf(self) -> Optional[float]:
+        """实测实时率（合成耗时/音频时长）"""
+        with self._lock:
+            audio = sum(r[2] for r in self._records)
+            return sum(r[1] for r in self._records) / audio if audio else None
+
+    def synth_time(self, chars: int) -> float:
+        """预计合成chars个字需要的时间（秒）"""
+        return self.overhead + self.seconds_per_char * chars
+
+    def chars_within(self, seconds: float, text_chars_per_second: Optional[float] = None) -> int:
+        """seconds秒内来得及（等到文本并）合成的字数"""
+        per_char = self.seconds_per_char + (1.0 / text_chars_per_second if text_chars_per_second else 0.0)
+        return max(0, int((seconds - self.overhead) / per_char))
+
+    def sustainable_chars(self) -> Optional[int]:
+        """合成出的音频时长不短于合成耗时所需的最短块长（合成比播放还慢时为None）"""
+        margin = self.audio_per_char - self.seconds_per_char
+        if margin <= 0:
+            return None
+        return int(self.overhead / margin) + 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        rtf = self.rtf
+        return {
+            "records": len(self._records),
+            "rtf": round(rtf, 3) if rtf is not None else None,
+            "overhead_ms": round(self.overhead * 1000, 1),
+            "ms_per_char": round(self.seconds_per_char * 1000, 2),
+            "audio_ms_per_char": round(self.audio_per_char * 1000, 1),
+        }
+
+
+@dataclass
+class ChunkLimits:
+    """下一块的分句参数（含义同IncrementalSentenceSegmenter）"""
+    min_length: int
+    soft_length: Optional[int]
+    max_length: int
+    early: bool = False  # 按首块规则尽早切分
+
+
+class AdaptiveChunkPolicy:
+    """根据TTS合成速度和播放缓冲深度决定每一块的长度"""
+
+    def __init__(self, estimator: Optional[TTSRateEstimator] = None,
+                 buffer_fn: Optional[Callable[[], float]] = None,
+                 first_soft_chars: int = 2, first_max_chars: int = 12,
+                 min_chars: int = 3, max_chars: int = 80, safety: float = 1.5):
+        """
+        :param estimator: TTS合成耗时模型（通常为TTS模块的rate_estimator）
+        :param buffer_fn: 返回播放缓冲中未播放音频时长（秒），如AudioDriver.get_buffered_duration
+        :param first_soft_chars: 第一块达到该字数后遇到逗号即切分
+        :param first_max_chars: 第一块没有标点时的最大字数
+        :param min_chars: 块的最短字数
+        :param max_chars: 块的最大字数
+        :param safety: 合成时间的安全系数（预计合成时间 × safety 不超过剩余播放时长）
+        """
+        self.estimator = estimator or TTSRateEstimator()
+        self.buffer_fn = buffer_fn
+        self.first_soft_chars = first_soft_chars
+        self.first_max_chars = first_max_chars
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.safety = safety
+        self._lock = threading.Lock()
+        self.chunk_lengths: List[List[int]] = []  # 最近几轮回复的各块字数
+        self.early_chunks = 0   # 因播放即将中断而按首块规则切分的后续块数
+
+    def configure(self, estimator: Optional[TTSRateEstimator] = None,
+                  buffer_fn: Optional[Callable[[], float]] = None):
+        """接入实际的TTS模块和播放驱动"""
+        if estimator is not None:
+            self.estimator = estimator
+        if buffer_fn is not None:
+            self.buffer_fn = buffer_fn
+
+    def first_limits(self) -> ChunkLimits:
+        return ChunkLimits(self.min_chars, self.first_soft_chars, self.first_max_chars, early=True)
+
+    def next_limits(self, lead_seconds: float, text_chars_per_second: Optional[float] = None) -> ChunkLimits:
+        """
+        下一块的参数
+        :param lead_seconds: 下一块开始播放前还剩的音频时长
+        :param text_chars_per_second: LLM输出速度（字/秒），None表示不计等待文本的时间
+        """
+        estimator = self.estimator
+        if lead_seconds < estimator.synth_time(self.first_soft_chars) * self.safety:
+            # 播放即将中断：像第一块一样尽早切分
+            return self.first_limits()
+        target = estimator.chars_within(lead_seconds / self.safety, text_chars_per_second)
+        sustainable = estimator.sustainable_chars()
+        target = max(target, sustainable if sustainable is not None else self.first_max_chars)
+        target = max(self.first_max_chars, min(self.max_chars, target))
+        # 结束符处至少凑够target的一半（合并短句），逗号处凑够target，没有标点时最长2倍target
+        return ChunkLimits(max(self.min_chars, target // 2), target, min(self.max_chars, 2 * target))
+
+    def measured_buffer(self) -> float:
+        if self.buffer_fn is None:
+            return 0.0
+        try:
+            return self.buffer_fn()
+        except Exception:
+            return 0.0
+
+    def record_response(self, lengths: List[int], early_chunks: int = 0):
+        with self._lock:
+            self.early_chunks += early_chunks
+            self.chunk_lengths.append(lengths)
+            del self.chunk_lengths[:-20]
+
+    def create_chunker(self) -> "AdaptiveChunker":
+        """每轮回复创建一个分块器"""
+        return AdaptiveChunker(self)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取分块统计"""
+        with self._lock:
+            responses = list(self.chunk_lengths)
+            early = self.early_chunks
+        firsts = [r[0] for r in responses if r]
+        laters = [n for r in responses for n in r[1:]]
+        return {
+            "responses": len(responses),
+            "mean_first_chunk_chars": round(sum(firsts) / len(firsts), 1) if firsts else None,
+            "mean_later_chunk_chars": round(sum(laters) / len(laters), 1) if laters else None,
+            "early_chunks": early,
+            "tts": self.estimator.get_stats(),
+        }
+
+
+class AdaptiveChunker(IncrementalSentenceSegmenter):
+    """按AdaptiveChunkPolicy逐块调整长度限制的分句器（接口同IncrementalSentenceSegmenter）"""
+
+    def __init__(self, policy: AdaptiveChunkPolicy):
+        self.policy = policy
+        self._limits = policy.first_limits()
+        super().__init__(self._limits.min_length, self._limits.max_length, self._limits.soft_length)
+
+    def reset(self):
+        super().reset()
+        self._lengths: List[int] = []
+        self._started: Optional[float] = None  # 预计第一块开始播放的时刻
+        self._emitted_audio = 0.0               # 已送出文本的预计音频时长
+        self._early = 0                         # 按首块规则切分的后续块数
+        self._text_start: Optional[float] = None  # 收到第一段文本的时刻（估算LLM输出速度）
+        self._text_chars = 0
+
+    def add_text(self, text: str) -> List[str]:
+        now = time.monotonic()
+        if self._text_start is None:
+            self._text_start = now
+        self._text_chars += len(text)
+        if self._lengths:
+            self._apply(self._next_limits())  # 播放缓冲随时间变化，每次追加前刷新
+        return super().add_text(text)
+
+    def flush(self) -> str:
+        remaining = self.pending.strip()
+        lengths = self._lengths + ([len(remaining)] if remaining else [])
+        if lengths:
+            self.policy.record_response(lengths, self._early)
+        self._apply(self.policy.first_limits())
+        self.reset()
+        return remaining
+
+    def _on_emit(self, sentence: str):
+        estimator = self.policy.estimator
+        now = time.monotonic()
+        if self._started is None:
+            # 预计第一块开始播放的时刻
+            self._started = now + estimator.synth_time(len(sentence))
+        elif self._limits.early:
+            self._early += 1
+        self._lengths.append(len(sentence))
+        self._emitted_audio += len(sentence) * estimator.audio_per_char
+        self._apply(self._next_limits(now))
+
+    def _next_limits(self, now: Optional[float] = None) -> ChunkLimits:
+        now = time.monotonic() if now is None else now
+        estimated = self._emitted_audio - max(0.0, now - self._started)
+        elapsed = now - self._text_start if self._text_start is not None else 0.0
+        text_rate = self._text_chars / elapsed if elapsed > 0.2 else None  # 刚开始时速度估计不可靠
+        return self.policy.next_limits(max(self.policy.measured_buffer(), estimated), text_rate)
+
+    def _apply(self, limits: ChunkLimits):
+        self._limits = limits
+        self.min_length = limits.min_length
+        self.soft_length = limits.soft_length
+        self.max_length = limits.max_length
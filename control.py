@@ -1,17 +1,32 @@
 # control.py
 import gc
-import torch
 import queue
 import threading
 import time
 from typing import Optional, List
 from base_interface import AudioData, TextData, ChatHistory
-from llm_zhipu_driver import init_model_and_tokenizer, CUSTOM_SYSTEM_PROMPT, MemorySystem
-import keyboard
+from llm_zhipu_driver import CUSTOM_SYSTEM_PROMPT, MemorySystem
 from sentence_processor import SentenceProcessor
+from latency_tracer import tracer
+from llm_service import LLMGenerationService
+from speculative_llm import SpeculativeLLM
+from chunk_policy import AdaptiveChunkPolicy
+from sentence_segmenter import IncrementalSentenceSegmenter
 import re
 
 name = "妮可(Nicole)"
+# 出错时的兜底回复（启动时预先合成进TTS缓存）
+FALLBACK_REPLY = "抱歉，我刚才有点走神了，我们继续聊吧。"
+# 单次LLM生成的截止时间（秒）
+LLM_REQUEST_TIMEOUT = 60.0
+# 推测式生成：ASR中间结果稳定该时长（秒）后提前开始生成，None表示关闭
+SPECULATIVE_STABLE_TIME: Optional[float] = 0.3
+# LLM→TTS自适应分块（False时每块都按固定规则在句末切分）
+ADAPTIVE_CHUNKING = True
+# 采集缓冲每次交给ASR的分片时长（秒）：采集回调按20ms小帧写入环形缓冲，ASR侧再重新切成chunk_stride对齐的分片，分片越小延迟越低
+CAPTURE_CHUNK_DURATION = 0.04
+# 触发强制记忆检索的关键词
+MEMORY_KEYWORDS = ['之前', '刚才', '记得', '说过', '告诉过']
 
 # ===================== 全局控制标记 =====================
 is_recording: bool = False
@@ -21,93 +36,82 @@ asr_input_q: Optional[queue.Queue] = None
 # ===================== 模块实例 =====================
 tokenizer = None
 llm_model = None
-
-# ===================== 智能句子分割器 =====================
-class SmartSentenceSplitter:
-    """实时智能分句器"""
-    
-    def __init__(self, min_chunk_length=5, max_chunk_length=100):
-        self.min_length = min_chunk_length
-        self.max_length = max_chunk_length
-        self.buffer = ""
-        
-        # 句子结束符
-        self.endings = ['。', '！', '？', '.', '!', '?', '；', ';']
-        self.weak_endings = ['，', ',', '、', '：', ':']
-        
-    def add_text(self, text):
-        """添加文本并返回完整的句子"""
-        self.buffer += text
-        sentences = []
-        
-        # 查找所有句子结束符的位置
-        end_positions = []
-        for ending in self.endings:
-            pos = self.buffer.find(ending)
-            while pos != -1:
-                end_positions.append(pos)
-                pos = self.buffer.find(ending, pos + 1)
-        
-        # 按位置排序
-        end_positions.sort()
-        
-        # 提取完整的句子
-        last_end = 0
-        for pos in end_positions:
-            sentence = self.buffer[last_end:pos+1].strip()
-            if len(sentence) >= self.min_length:
-                sentences.append(sentence)
-                last_end = pos + 1
-        
-        # 更新缓冲区
-        self.buffer = self.buffer[last_end:]
-        
-        # 检查缓冲区是否过长
-        if len(self.buffer) > self.max_length:
-            # 在弱结束符处分割
-            split_pos = -1
-            for ending in self.weak_endings:
-                pos = self.buffer.rfind(ending)
-                if pos > split_pos:
-                    split_pos = pos
-            
-            if split_pos > 0:
-                long_sentence = self.buffer[:split_pos+1]
-                if long_sentence.strip():
-                    sentences.append(long_sentence)
-                self.buffer = self.buffer[split_pos+1:]
-            else:
-                # 直接分割
-                long_sentence = self.buffer
-                if long_sentence.strip():
-                    sentences.append(long_sentence)
-                self.buffer = ""
-        
-        return sentences
-    
-    def flush(self):
-        """清空缓冲区，返回剩余内容"""
-        remaining = self.buffer
-        self.buffer = ""
-        return remaining
+llm_service: Optional[LLMGenerationService] = None  # 常驻生成线程
+speculative_llm: Optional[SpeculativeLLM] = None    # 推测式生成（asr_to_llm运行时创建）
+chunk_policy = AdaptiveChunkPolicy()                # LLM→TTS分块：首块尽早送出，后续按播放缓冲加长
 
 # ===================== 初始化函数 =====================
 def memory_cleanup():
     """清理显存和内存"""
+    try:
+        import torch
+    except ImportError:  # 桩后端运行时可以不装torch
+        gc.collect()
+        return
     if torch.cuda.is_available():
         torch.cuda.empty_cache()
         torch.cuda.synchronize()
     gc.collect()
 
+def _start_llm_service():
+    """（重新）启动常驻生成服务"""
+    global llm_service
+    if llm_service is not None:
+        llm_service.shutdown()
+    llm_service = LLMGenerationService(llm_model, tokenizer, default_timeout=LLM_REQUEST_TIMEOUT)
+
 def init_control_modules():
     """初始化LLM相关模块"""
     global tokenizer, llm_model
+    # 真实模型才需要torch/transformers，放在这里导入（桩后端路径不依赖它们）
+    from llm_zhipu_driver import init_model_and_tokenizer
     tokenizer, llm_model, _ = init_model_and_tokenizer()
+    _start_llm_service()
     print("✅ 控制模块初始化完成")
 
+def use_llm_backend(new_tokenizer, new_model):
+    """替换LLM后端（如stub_backends中的桩模型），需与ChatGLM3的stream_chat签名一致"""
+    global tokenizer, llm_model
+    tokenizer, llm_model = new_tokenizer, new_model
+    _start_llm_service()
+    print(f"✅ LLM后端已切换为: {type(new_model).__name__}")
+
+def cancel_generation(reason: str = "cancelled") -> int:
+    """停止正在进行的LLM生成（下一个解码步生效），返回取消的请求数"""
+    if llm_service is None:
+        return 0
+    return llm_service.cancel_all(reason)
+
+def configure_chunk_policy(tts_module=None, audio_driver=None):
+    """让分块策略使用TTS模块的实测合成速度和播放驱动的缓冲深度"""
+    chunk_policy.configure(
+        estimator=getattr(tts_module, "rate_estimator", None),
+        buffer_fn=audio_driver.get_buffered_duration if audio_driver is not None else None
+    )
+
+def create_sentence_splitter():
+    """每轮回复创建一个LLM→TTS分块器"""
+    if ADAPTIVE_CHUNKING:
+        return chunk_policy.create_chunker()
+    return IncrementalSentenceSegmenter(min_length=3, max_length=40)
+
+def split_for_tts(text: str) -> List[str]:
+    """按回复时的分块方式切分一段完整文本（TTS缓存预热用，切出的块与运行时的缓存键一致）"""
+    splitter = create_sentence_splitter()
+    chunks = splitter.add_text(text)
+    tail = splitter.pending.strip()  # 不调用flush：预热不计入分块统计
+    if tail:
+        chunks.append(tail)
+    return chunks
+
+def on_partial_transcript(text: str):
+    """ASR中间识别结果回调（供推测式生成判断结果是否稳定）"""
+    if speculative_llm is not None:
+        speculative_llm.on_partial(text)
+
 # ===================== 真正的异步流式生成 =====================
-def create_async_stream_generator(user_input, history=None, memory_system=None, temperature=0.8):
-    """创建异步流式生成器"""
+def submit_generation(user_input, history=None, memory_system=None, temperature=0.8, supersede=True):
+    """准备提示词并向常驻生成线程提交请求，返回GenerationRequest"""
     
     # 准备记忆上下文
     memory_context = ""
@@ -132,76 +136,64 @@ def create_async_stream_generator(user_input, history=None, memory_system=None,
     
     ##print(f"🚀 LLM开始异步生成...")
     
-    # 使用线程实现真正的异步
-    result_queue = queue.Queue()
+    # 提交到常驻生成线程（supersede时新请求会取代尚未结束的旧请求）
+    # 系统提示词的KV前缀缓存由生成线程在生成前查询，前缀prefill与其他生成串行、可被取消
+    return llm_service.submit(
+        user_input,
+        history=history,
+        supersede=supersede,
+        top_p=0.9,
+        temperature=temperature,
+        system=dynamic_prompt
+    )
+
+def create_async_stream_generator(user_input, history=None, memory_system=None, temperature=0.8, request=None):
+    """创建异步流式生成器（request为已提交的请求时直接读取其结果，如命中的推测式生成）"""
+    if request is None:
+        request = submit_generation(user_input, history, memory_system, temperature)
     
-    def generate_stream():
-        """在独立线程中生成流"""
-        try:
-            full_response = ""
-            
-            # 使用模型的stream_chat方法
-            for response, new_history, _ in llm_model.stream_chat(
-                tokenizer=tokenizer,
-                query=user_input,
-                history=history,
-                top_p=0.9,
-                temperature=temperature,
-                system=dynamic_prompt,
-                past_key_values=None,
-                return_past_key_values=True
-            ):
-                # 过滤AI身份关键词
-                filter_words = ["AI", "助手", "ChatGLM", "模型", "训练", "开发", "智谱", "人工智能"]
-                filtered_response = response
-                for word in filter_words:
-                    filtered_response = filtered_response.replace(word, "")
-                
-                # 提取新增的内容
-                if len(filtered_response) > len(full_response):
-                    new_content = filtered_response[len(full_response):]
-                    full_response = filtered_response
-                    
-                    if new_content:
-                        # 将新内容放入队列
-                        result_queue.put(("chunk", new_content))
-            
-            # 生成完成
-            result_queue.put(("complete", full_response))
-            
-        except Exception as e:
-            print(f"❌ LLM流式生成错误: {e}")
-            result_queue.put(("error", str(e)))
+    # 逐段读取过滤后的增量
+    for new_content in request.deltas():
+        yield new_content, False, ""
     
-    # 启动生成线程
-    gen_thread = threading.Thread(target=generate_stream, daemon=True)
-    gen_thread.start()
+    if request.status == "error":
+        raise Exception(f"LLM生成错误: {request.error}")
+    if request.status != "done":
+        reason = request.stop_reason or request.status
+        print(f"\n⏹️ LLM生成提前结束（{'超时' if reason == 'timeout' else reason}）")
     
-    # 返回一个生成器，从队列中读取结果
-    while True:
-        try:
-            item_type, data = result_queue.get(timeout=30)  # 30秒超时
-            
-            if item_type == "chunk":
-                yield data, False, ""
-            elif item_type == "complete":
-                yield "", True, data
-                break
-            elif item_type == "error":
-                raise Exception(f"LLM生成错误: {data}")
-                
-        except queue.Empty:
-            print("⏳ LLM生成超时")
-            break
+    # 以已生成的部分作为最终回复
+    yield "", True, request.text
 
 # ===================== 异步LLM-TTS流水线 =====================
+def _is_memory_query(user_input: str) -> bool:
+    """是否包含需要强制检索记忆的关键词"""
+    return any(keyword in user_input for keyword in MEMORY_KEYWORDS)
+
+def _temperature_for(user_input: str) -> float:
+    """记忆类问题用低温度，保证复述准确"""
+    return 0.2 if _is_memory_query(user_input) else 0.8
+
 def asr_to_llm(asr_output_q: queue.Queue, tts_input_q: queue.Queue):
     """ASR → LLM → TTS（真正的异步流水线）"""
     
+    global speculative_llm
     memory_system = MemorySystem()
     sentence_processor = SentenceProcessor(min_length=3, max_silence=1.5)
     sentence_queue = queue.Queue()
     
+    # 推测式生成：用稳定的中间识别结果提前提交（不取代正在进行的生成）
+    if SPECULATIVE_STABLE_TIME is not None:
+        speculative_llm = SpeculativeLLM(
+            lambda text: submit_generation(
+                text,
+                memory_system=memory_system,
+                temperature=_temperature_for(text),
+                supersede=False
+            ),
+            stable_time=SPECULATIVE_STABLE_TIME
+        )
+    
     # 启动句子处理线程
     def process_asr_output():
         while is_running:
@@ -214,12 +206,16 @@ def asr_to_llm(asr_output_q: queue.Queue, tts_input_q: queue.Queue):
     # LLM-TTS并行处理线程
     def process_conversation():
         while is_running:
+            turn_id = None
             try:
                 sentence_data = sentence_queue.get(timeout=0.1)
                 if not sentence_data.text:
                     continue
                 
                 user_input = sentence_data.text
+                # 沿用ASR分配的轮次（没有时新开一轮）
+                turn_id = sentence_data.turn_id if sentence_data.turn_id is not None else tracer.new_turn()
+                tracer.set_label(turn_id, user_input)
                 
                 print(f"\n👤 用户说: {user_input}")
                 print("="*50)
@@ -227,12 +223,15 @@ def asr_to_llm(asr_output_q: queue.Queue, tts_input_q: queue.Queue):
                 print(f"🤖 {name}: ", end="", flush=True)
                 
                 # 检查记忆关键词
-                force_memory = any(keyword in user_input for keyword in ['之前', '刚才', '记得', '说过', '告诉过'])
+                force_memory = _is_memory_query(user_input)
                 if force_memory:
                     print("🧠 检测到记忆关键词，强制使用记忆...")
                 
-                # 创建智能分句器
-                sentence_splitter = SmartSentenceSplitter(min_length=3, max_length=40)
+                # 推测式生成命中时直接沿用已开始的请求
+                request = speculative_llm.take(user_input) if speculative_llm is not None else None
+                
+                # 创建分块器（首块尽早送入TTS，后续块按播放缓冲加长）
+                sentence_splitter = create_sentence_splitter()
                 
                 # 开始异步流式生成
                 start_time = time.time()
@@ -243,9 +242,11 @@ def asr_to_llm(asr_output_q: queue.Queue, tts_input_q: queue.Queue):
                 for chunk, is_final, final_response in create_async_stream_generator(
                     user_input,
                     memory_system=memory_system,
-                    temperature=0.2 if force_memory else 0.8
+                    temperature=_temperature_for(user_input),
+                    request=request
                 ):
                     if chunk:
+                        tracer.mark(turn_id, "llm_first_token")
                         # 打印chunk
                         print(chunk, end="", flush=True)
                         full_response += chunk
@@ -258,7 +259,8 @@ def asr_to_llm(asr_output_q: queue.Queue, tts_input_q: queue.Queue):
                             if sentence.strip():
                                 tts_chunks_sent += 1
                                 # print(f"\n📤 发送TTS分片#{tts_chunks_sent}: {sentence}")
-                                tts_input_q.put(TextData(text=sentence, is_finish=False))
+                                tracer.mark(turn_id, "first_sentence")
+                                tts_input_q.put(TextData(text=sentence, is_finish=False, turn_id=turn_id))
                     
                     if is_final:
                         # 发送剩余的文本
@@ -266,10 +268,11 @@ def asr_to_llm(asr_output_q: queue.Queue, tts_input_q: queue.Queue):
                         if remaining.strip():
                             tts_chunks_sent += 1
                             # print(f"\n📤 发送最终TTS分片#{tts_chunks_sent}: {remaining}")
-                            tts_input_q.put(TextData(text=remaining, is_finish=False))
+                            tracer.mark(turn_id, "first_sentence")
+                            tts_input_q.put(TextData(text=remaining, is_finish=False, turn_id=turn_id))
                         
                         # 发送结束标记
-                        tts_input_q.put(TextData(text="", is_finish=True))
+                        tts_input_q.put(TextData(text="", is_finish=True, turn_id=turn_id))
                         
                         # 更新记忆
                         memory_system.add_conversation(user_input, final_response)
@@ -290,8 +293,8 @@ def asr_to_llm(asr_output_q: queue.Queue, tts_input_q: queue.Queue):
                 print(f"\n❌ 对话处理错误: {e}")
                 import traceback
                 traceback.print_exc()
-                error_text = "抱歉，我刚才有点走神了，我们继续聊吧。"
-                tts_input_q.put(TextData(text=error_text, is_finish=True))
+                error_text = FALLBACK_REPLY
+                tts_input_q.put(TextData(text=error_text, is_finish=True, turn_id=turn_id))
                 continue
     
     # 启动线程
@@ -311,6 +314,10 @@ def asr_to_llm(asr_output_q: queue.Queue, tts_input_q: queue.Queue):
     finally:
         asr_thread.join(timeout=1)
         conv_thread.join(timeout=1)
+        if speculative_llm is not None:
+            print(f"🔮 推测式生成统计: {speculative_llm.get_stats()}")
+            speculative_llm.shutdown()
+            speculative_llm = None
 
 # ===================== TTS播放 =====================
 def tts_to_play(tts_output_q: queue.Queue, audio_driver):
@@ -348,6 +355,7 @@ def tts_to_play(tts_output_q: queue.Queue, audio_driver):
 def key_control(audio_driver):
     """按键控制线程"""
     global is_recording, is_running, asr_input_q
+    import keyboard  # 只有交互模式需要键盘监听
     
     print("="*50)
     print("🎙️  流式语音交互系统")
@@ -368,7 +376,7 @@ def key_control(audio_driver):
                 is_recording = not is_recording
                 if is_recording:
                     print("\n▶️  开始录音...")
-                    audio_driver.start_record(chunk_duration=0.6)
+                    audio_driver.start_record(chunk_duration=CAPTURE_CHUNK_DURATION)
                 else:
                     print("\n⏹️  停止录音...")
                     audio_driver.stop_record()
@@ -397,6 +405,7 @@ def cleanup():
     is_running = False
     is_recording = False
     asr_input_q = None
+    cancel_generation("shutdown")
     print("✅ 控制模块资源已清理")
 
 # ===================== 记忆保存/加载 =====================
@@ -441,8 +450,10 @@ def text_to_llm(text_input: str, tts_input_q: queue.Queue):
     """
     memory_system = MemorySystem()
     
-    # 创建智能分句器
-    sentence_splitter = SmartSentenceSplitter(min_chunk_length=3, max_chunk_length=40)
+    # 创建分块器（首块尽早送入TTS，后续块按播放缓冲加长）
+    sentence_splitter = create_sentence_splitter()
+    
+    turn_id = tracer.new_turn(text_input)
     
     print(f"\n👤 用户输入: {text_input}")
     print("=" * 50)
@@ -450,7 +461,7 @@ def text_to_llm(text_input: str, tts_input_q: queue.Queue):
     print(f"🤖 {name}: ", end="", flush=True)
     
     # 检查记忆关键词
-    force_memory = any(keyword in text_input for keyword in ['之前', '刚才', '记得', '说过', '告诉过'])
+    force_memory = _is_memory_query(text_input)
     if force_memory:
         print("🧠 检测到记忆关键词，强制使用记忆...")
     
@@ -467,6 +478,7 @@ def text_to_llm(text_input: str, tts_input_q: queue.Queue):
             temperature=0.2 if force_memory else 0.8
         ):
             if chunk:
+                tracer.mark(turn_id, "llm_first_token")
                 # 打印chunk
                 print(chunk, end="", flush=True)
                 full_response += chunk
@@ -479,7 +491,8 @@ def text_to_llm(text_input: str, tts_input_q: queue.Queue):
                     if sentence.strip():
                         tts_chunks_sent += 1
                         # print(f"\n📤 发送TTS分片#{tts_chunks_sent}: {sentence}")
-                        tts_input_q.put(TextData(text=sentence, is_finish=False))
+                        tracer.mark(turn_id, "first_sentence")
+                        tts_input_q.put(TextData(text=sentence, is_finish=False, turn_id=turn_id))
             
             if is_final:
                 # 发送剩余的文本
@@ -487,10 +500,11 @@ def text_to_llm(text_input: str, tts_input_q: queue.Queue):
                 if remaining.strip():
                     tts_chunks_sent += 1
                     # print(f"\n📤 发送最终TTS分片#{tts_chunks_sent}: {remaining}")
-                    tts_input_q.put(TextData(text=remaining, is_finish=False))
+                    tracer.mark(turn_id, "first_sentence")
+                    tts_input_q.put(TextData(text=remaining, is_finish=False, turn_id=turn_id))
                 
                 # 发送结束标记
-                tts_input_q.put(TextData(text="", is_finish=True))
+                tts_input_q.put(TextData(text="", is_finish=True, turn_id=turn_id))
                 
                 # 更新记忆
                 memory_system.add_conversation(text_input, final_response)
@@ -508,6 +522,6 @@ def text_to_llm(text_input: str, tts_input_q: queue.Queue):
         print(f"\n❌ LLM处理错误: {e}")
         import traceback
         traceback.print_exc()
-        error_text = "抱歉，我刚才有点走神了，我们继续聊吧。"
-        tts_input_q.put(TextData(text=error_text, is_finish=True))
+        error_text = FALLBACK_REPLY
+        tts_input_q.put(TextData(text=error_text, is_finish=True, turn_id=turn_id))
         return ""
\ No newline at end of file
@@ -0,0 +1,149 @@
+# endpointing.py
+"""
+自适应断句（endpointing）：用户停顿后等多久才认定这句话说完
+固定的静音阈值对"你好。"这类短句太慢，对"我想问一下，那个……"这类停顿又太快。
+这里根据停顿时已识别的文本给出每句话自己的等待时长：
+- 标点模型判定为句末（。！？）、以语气词结尾（吗/呢/吧…）、常见的完整短回答（好的/谢谢…）→ 缩短
+- 以连词/介词/语气填充词结尾（然后/因为/那个/嗯…）、标点模型给出逗号 → 延长到上限
+每句话的实际断句延迟和判定依据都会记录下来，便于按日志调参。
+"""
+import json
+import time
+import threading
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional
+
+# 句末标点
+SENTENCE_END_PUNCTUATION = "。！？.!?"
+# 句中标点（说明后面还有内容）
+CLAUSE_PUNCTUATION = "，、；：,;:"
+# 句末语气词
+FINAL_PARTICLES = ("吗", "呢", "吧", "啊", "呀", "啦", "嘛", "哦", "哈")
+# 说明话还没说完的结尾（连词、介词、填充词）
+CONTINUATION_ENDINGS = (
+    "然后", "但是", "可是", "因为", "所以", "而且", "或者", "还有", "就是", "如果", "的话", "比如",
+    "那个", "这个", "那么", "还是", "以及", "和", "跟", "与", "把", "被", "给", "在", "从", "对于",
+    "嗯", "呃", "额", "就", "想", "要", "是",
+)
+# 常见的完整短回答
+COMPLETE_SHORT_REPLIES = {
+    "好", "好的", "好啊", "行", "可以", "对", "对的", "是", "是的", "不是", "不对", "没有", "不用",
+    "不要", "谢谢", "再见", "拜拜", "知道了", "明白了", "没问题", "继续", "停", "算了",
+}
+
+
+@dataclass
+class EndpointDecision:
+    """一次停顿时的断句判定"""
+    timeout_ms: float
+    reasons: List[str] = field(default_factory=list)
+
+
+@dataclass
+class EndpointRecord:
+    """一句话的断句记录"""
+    turn_id: Optional[int]
+    text: str
+    timeout_ms: float
+    delay_ms: float        # 最后一个语音帧到断句的实际耗时
+    reasons: List[str]
+    resumed: int           # 这句话中途停顿后又继续说的次数
+    timestamp: float
+
+
+class AdaptiveEndpointer:
+    """按已识别文本为每句话计算静音等待时长"""
+
+    def __init__(self, min_timeout_ms: float = 200, default_timeout_ms: float = 600, max_timeout_ms: float = 1000,
+                 verbose: bool = True):
+        """
+        :param min_timeout_ms: 最短等待（同时作为VAD的拖尾时长，即"停顿"的判定）
+        :param default_timeout_ms: 没有任何线索时的等待
+        :param max_timeout_ms: 话明显没说完时的等待上限
+        """
+        self.min_timeout_ms = min_timeout_ms
+        self.default_timeout_ms = default_timeout_ms
+        self.max_timeout_ms = max_timeout_ms
+        self.verbose = verbose
+        self.records: List[EndpointRecord] = []
+        self.resumed = 0  # 停顿后又继续说的次数（等待时长不够的信号）
+        self._lock = threading.Lock()
+
+    # ===================== 判定 =====================
+    def decide(self, text: str, punctuated: Optional[str] = None) -> EndpointDecision:
+        """
+        :param text: 停顿时已识别的文本（无标点）
+        :param punctuated: 标点模型的输出（没有标点模型时为None，规则标点不作为依据）
+        """
+        text = text.strip()
+        if not text:
+            return EndpointDecision(self.max_timeout_ms, ["empty"])
+
+        if text in COMPLETE_SHORT_REPLIES:
+            return EndpointDecision(self.min_timeout_ms, ["short_reply"])
+        if text.endswith(CONTINUATION_ENDINGS):
+            return EndpointDecision(self.max_timeout_ms, ["continuation"])
+
+        timeout = self.default_timeout_ms
+        reasons = []
+        tail = punctuated.strip()[-1:] if punctuated and punctuated.strip() else ""
+        if tail and tail in SENTENCE_END_PUNCTUATION:
+            timeout -= 250
+            reasons.append("punc_end")
+        elif tail and tail in CLAUSE_PUNCTUATION:
+            timeout += 300
+            reasons.append("punc_clause")
+        if text.endswith(FINAL_PARTICLES):
+            timeout -= 200
+            reasons.append("particle")
+        if len(text) <= 2:
+            timeout += 200  # 单字/两字多半是犹豫
+            reasons.append("very_short")
+
+        timeout = min(self.max_timeout_ms, max(self.min_timeout_ms, timeout))
+        return EndpointDecision(timeout, reasons or ["default"])
+
+    # ===================== 记录 =====================
+    def on_resume(self):
+        """停顿后用户又继续说话（这次停顿没有断句）"""
+        with self._lock:
+            self.resumed += 1
+
+    def record(self, turn_id: Optional[int], text: str, decision: EndpointDecision, delay_ms: float,
+               resumed: int = 0) -> EndpointRecord:
+        """记录一句话的断句结果"""
+        record = EndpointRecord(turn_id, text, decision.timeout_ms, round(delay_ms, 1), list(decision.reasons),
+                                resumed, time.time())
+        with self._lock:
+            self.records.append(record)
+        if self.verbose:
+            print(f"⏱️ 断句: 静音{delay_ms:.0f}ms后结束（等待{decision.timeout_ms:.0f}ms，"
+                  f"依据: {','.join(decision.reasons)}）")
+        return record
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取断句统计（按判定依据分组的平均延迟）"""
+        with self._lock:
+            records = list(self.records)
+            resumed = self.resumed
+        if not records:
+            return {"turns": 0, "resumed": resumed}
+        delays = sorted(r.delay_ms for r in records)
+        by_reason: Dict[str, List[float]] = {}
+        for r in records:
+            by_reason.setdefault("+".join(r.reasons), []).append(r.delay_ms)
+        return {
+            "turns": len(records),
+            "resumed": resumed,
+            "median_delay_ms": delays[len(delays) // 2],
+            "max_delay_ms": delays[-1],
+            "by_reason": {k: {"count": len(v), "mean_delay_ms": round(sum(v) / len(v), 1)} for k, v in by_reason.items()},
+        }
+
+    def export(self, path: str):
+        """导出每句话的断句记录（JSON）"""
+        with self._lock:
+            records = [asdict(r) for r in self.records]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"stats": self.get_stats(), "records": records}, f, ensure_ascii=False, indent=2)
+        print(f"📝 断句记录已导出: {path}")
@@ -11,6 +11,12 @@ import soundfile
 import numpy as np
 from funasr import AutoModel
 
+from latency_tracer import tracer
+from audio_ring_buffer import AudioRingBuffer
+from vad import StreamingVAD, VADEvent
+from endpointing import AdaptiveEndpointer
+from streaming_punctuator import StreamingPunctuator
+
 # 复用基础接口定义
 @dataclass
 class AudioData:
@@ -18,11 +24,13 @@ class AudioData:
     sample_rate: int = 16000  
     channels: int = 1  
     is_finish: bool = False  # 补充is_finish字段，对齐其他模块
+    turn_id: Optional[int] = None  # 所属对话轮次（延迟追踪用）
 
 @dataclass
 class TextData:
     text: str  
     is_finish: bool = True  
+    turn_id: Optional[int] = None  # 所属对话轮次（延迟追踪用）
 
 ChatHistory = List[Dict[str, str]]  
 
@@ -37,7 +45,10 @@ class BaseModule(abc.ABC):
 
 # FunASR流式识别驱动（集成标点恢复）
 class FunASRStreamingASR(BaseModule):
-    def __init__(self):
+    def __init__(self, vad_backend: str = "energy"):
+        """
+        :param vad_backend: 帧级VAD后端，"energy"（能量/过零率）或 "fsmn"（FunASR fsmn-vad）
+        """
         # ========== 1. 初始化ASR模型（原有逻辑） ==========
         self.chunk_size = [0, 10, 5]  # 600ms chunk
         self.encoder_chunk_look_back = 4
@@ -48,6 +59,13 @@ class FunASRStreamingASR(BaseModule):
             disable_update=True  # 禁用版本更新检查
         )
         self.chunk_stride = self.chunk_size[1] * 960  # 600ms stride
+        # 采集分片 → chunk_stride对齐分片的重分块缓冲（容纳4个步长，采集可使用任意分片时长）
+        self.ring_buffer = AudioRingBuffer(4 * self.chunk_stride)
+        # 自适应断句：VAD检测到停顿后，按已识别文本决定还要等多久
+        self.endpointer = AdaptiveEndpointer()
+        # 帧级VAD：只把语音段（含300ms预录）送入ASR；拖尾取最短等待时长，语音结束事件即"停顿"
+        self.vad = StreamingVAD(sample_rate=16000, backend=vad_backend, pre_roll_ms=300,
+                                hangover_ms=int(self.endpointer.min_timeout_ms))
         
         # ========== 2. 初始化标点恢复模型（使用本地模型路径） ==========
         self.use_punc_model = False
@@ -118,94 +136,97 @@ class FunASRStreamingASR(BaseModule):
         # ========== 3. 流式缓存 ==========
         self.cache = {}  # ASR流式缓存
         self.punc_buffer = ""  # 标点恢复用文本缓存
-        self.vad_active = False  # 简易VAD状态标记
+        self._punc_emitted = 0  # _add_punctuation已输出的带标点文本长度
+        # 增量标点：模型只在滑动窗口上运行，滚出窗口的部分直接复用，结果按文本缓存
+        self.punctuator = StreamingPunctuator(self._run_punc_model)
+        self.vad_active = False  # VAD状态标记（语音段内）
         self.last_speech_time = time.time()
-        self.silence_threshold = 1.0  # 静音阈值（秒）
+        self.last_speech_monotonic = time.monotonic()  # 最后一次检测到语音的时刻（延迟追踪用）
+        self.current_turn_id = None  # 当前这句话所属的对话轮次
+        self.silence_threshold = 1.0  # 静音阈值（秒）：采集中断（收不到音频）时的兜底断句
+        self._pending_endpoint: Optional[Dict[str, Any]] = None  # 停顿后等待断句的状态
+        self._utterance_resumed = 0  # 当前这句话停顿后又继续说的次数
+        self.speech_start_callback = None  # 检测到用户开始说话时调用（打断助手播放用）
+        self.partial_callback = None  # 中间识别结果回调，参数为这句话到目前为止的累计文本（推测式生成用）
+        self.partial_text = ""  # 当前这句话的累计中间结果
 
-    def _audio_data_to_numpy(self, audio_data: AudioData) -> np.ndarray:
-        """格式转换：AudioData → numpy float32数组（适配FunASR）"""
+    def _check_format(self, audio_data: AudioData):
+        """校验音频格式（FunASR只接受16kHz单声道）"""
         if audio_data.sample_rate != 16000:
             raise ValueError(f"仅支持16000Hz采样率，当前为{audio_data.sample_rate}Hz")
         if audio_data.channels != 1:
             raise ValueError(f"仅支持单声道，当前为{audio_data.channels}声道")
+
+    def _audio_data_to_numpy(self, audio_data: AudioData) -> np.ndarray:
+        """格式转换：AudioData → numpy float32数组（适配FunASR）"""
+        self._check_format(audio_data)
         
         speech = np.frombuffer(audio_data.pcm_data, dtype=np.int16)
         speech = speech.astype(np.float32) / 32767.0
         return speech
 
-    def _simple_vad(self, speech_chunk: np.ndarray) -> bool:
-        """简易VAD：通过音频能量判断是否有有效语音"""
-        if len(speech_chunk) == 0:
-            return False
-        
-        rms = np.sqrt(np.mean(np.square(speech_chunk)))
-        return rms > 0.005  # 可根据环境调整阈值
-
     def _add_punctuation(self, text: str, is_final: bool = False) -> str:
         """
         核心：标点恢复逻辑（模型优先，规则降级）
         :param text: 无标点文本
         :param is_final: 是否是最后一个分片（决定是否清空缓存）
-        :return: 带标点文本
+        :return: 本次新增的带标点文本（非最后分片时只输出已提交、不会再变化的部分）
         """
         if not text.strip():
             return ""
         
-        # 步骤1：更新标点缓存（流式拼接）
+        # 步骤1：更新标点缓存（流式拼接，只追加原文，不再回填上次的结果）
         self.punc_buffer += text
         
-        # 步骤2：仅在「有有效文本+（最后分片/缓存足够长）」时做标点恢复
-        if len(self.punc_buffer) < 2 and not is_final:
-            return self.punc_buffer  # 文本过短时暂不处理
-        
         try:
-            # 方案A：使用标点模型（优先）
+            # 方案A：使用标点模型（优先），增量标点只对窗口内的新文本调用模型
             if self.use_punc_model and self.punc_model is not None:
-                # 调用标点模型
-                ##print(f"🔤 标点模型输入: {self.punc_buffer}")
-                punc_result = self.punc_model.generate(input=self.punc_buffer)
-                ##print(f"🔤 标点模型原始输出: {punc_result}")
-                
-                # 处理不同的返回格式
-                punctuated_text = self._extract_text_from_punc_result(punc_result)
-                    
-                # 清理结果
-                punctuated_text = punctuated_text.strip()
-                
+                punctuated_text = self.punctuator.punctuate(self.punc_buffer)
+                stable_text = self.punctuator.committed_text
             # 方案B：智能规则标点（降级）
             else:
                 punctuated_text = self._smart_rule_based_punc(self.punc_buffer)
+                stable_text = ""
         
         except Exception as e:
             print(f"⚠️  标点恢复失败，使用原文本：{e}")
             import traceback
             traceback.print_exc()
-            punctuated_text = self.punc_buffer
+            punctuated_text = stable_text = self.punc_buffer
         
-        # 步骤3：最后分片时清空缓存，否则保留末尾字符（避免断句）
+        # 步骤2：最后分片时输出剩余部分并清空缓存，否则只输出新提交的部分
         if is_final:
-            final_text = punctuated_text
+            final_text = punctuated_text[self._punc_emitted:]
             self.punc_buffer = ""  # 清空缓存
-            ##print(f"✅ 最终标点结果: {final_text}")
+            self._punc_emitted = 0
         else:
-            # 保留最后1-2个字符，避免断句（如"今天天气"→ 保留"天气"）
-            final_text = punctuated_text[:-2] if len(punctuated_text) > 2 else ""
-            self.punc_buffer = punctuated_text[-2:] if len(punctuated_text) > 2 else punctuated_text
-            ##print(f"📝 临时标点结果: {final_text}")
+            final_text = stable_text[self._punc_emitted:]
+            self._punc_emitted = max(self._punc_emitted, len(stable_text))
         
         return final_text.strip()
 
-    def _extract_text_from_punc_result(self, punc_result) -> str:
-        """从标点模型结果中提取文本"""
+    def _run_punc_model(self, text: str) -> str:
+        """调用标点模型（供增量标点器使用）"""
+        punc_result = self.punc_model.generate(input=text)
+        punctuated_text = self._extract_text_from_punc_result(punc_result, fallback=text).strip()
+        # 清理标点：移除连续的标点
+        punctuated_text = re.sub(r'([。！？])\1+', r'\1', punctuated_text)
+        punctuated_text = re.sub(r'([,，])\1+', r'\1', punctuated_text)
+        return punctuated_text
+
+    def _extract_text_from_punc_result(self, punc_result, fallback: Optional[str] = None) -> str:
+        """从标点模型结果中提取文本（无法提取时返回fallback，缺省为标点缓存）"""
+        if fallback is None:
+            fallback = self.punc_buffer
         if punc_result is None:
-            return self.punc_buffer
+            return fallback
             
         # 处理不同的返回格式
         if isinstance(punc_result, list):
             if len(punc_result) > 0:
                 if isinstance(punc_result[0], dict):
                     # 格式: [{'text': '带标点的文本'}]
-                    return punc_result[0].get("text", self.punc_buffer)
+                    return punc_result[0].get("text", fallback)
                 elif isinstance(punc_result[0], str):
                     # 格式: ['带标点的文本']
                     return punc_result[0]
@@ -213,16 +234,16 @@ class FunASRStreamingASR(BaseModule):
                     # 尝试转换为字符串
                     return str(punc_result[0])
             else:
-                return self.punc_buffer
+                return fallback
         elif isinstance(punc_result, dict):
             # 格式: {'text': '带标点的文本'}
-            return punc_result.get("text", self.punc_buffer)
+            return punc_result.get("text", fallback)
         elif isinstance(punc_result, str):
             # 格式: '带标点的文本'
             return punc_result
         else:
             # 其他格式，尝试转换
-            return str(punc_result) if punc_result else self.punc_buffer
+            return str(punc_result) if punc_result else fallback
 
     def _smart_rule_based_punc(self, text: str) -> str:
         """智能规则标点恢复（模型降级时使用）"""
@@ -279,13 +300,35 @@ class FunASRStreamingASR(BaseModule):
             else:
                 return text
 
-    def _numpy_to_text_data(self, asr_result: str, is_finish: bool) -> TextData:
+    def _numpy_to_text_data(self, asr_result: str, is_finish: bool, turn_id: Optional[int] = None) -> TextData:
         """格式转换：识别结果 → TextData"""
         return TextData(
             text=asr_result,
-            is_finish=is_finish
+            is_finish=is_finish,
+            turn_id=turn_id
         )
 
+    def _turn_for_output(self, is_final: bool) -> Optional[int]:
+        """识别结果所属的对话轮次：一句话第一次输出时开始新轮次，输出最终结果时打点并结束"""
+        if self.current_turn_id is None:
+            self.current_turn_id = tracer.new_turn()
+        turn_id = self.current_turn_id
+        if is_final:
+            tracer.mark(turn_id, "speech_end", at=self.last_speech_monotonic)
+            tracer.mark(turn_id, "asr_final")
+            self.current_turn_id = None
+            self.partial_text = ""
+        return turn_id
+
+    def _notify_partial(self, chunk_text: str):
+        """累计中间结果并通知回调"""
+        self.partial_text += chunk_text
+        if self.partial_callback:
+            try:
+                self.partial_callback(self.partial_text)
+            except Exception as e:
+                print(f"⚠️ 中间结果回调出错: {e}")
+
     def process(self, input_data: AudioData) -> TextData:
         """批量处理：完整音频识别+标点恢复"""
         # 1. 音频格式转换
@@ -322,9 +365,18 @@ class FunASRStreamingASR(BaseModule):
         """流式处理：音频分片识别+实时标点恢复"""
         # 重置所有缓存
         self.cache = {}
+        self.ring_buffer.clear()
+        self.vad.reset()
         self.punc_buffer = ""  # 存储未加标点的原始文本
+        self._punc_emitted = 0
+        self.punctuator.reset()
         self.vad_active = False
         self.last_speech_time = time.time()
+        self.last_speech_monotonic = time.monotonic()
+        self.current_turn_id = None
+        self.partial_text = ""
+        self._pending_endpoint = None
+        self._utterance_resumed = 0
         
         # 新增：完整句子缓存（用于标点恢复）
         self.sentence_buffer = ""
@@ -336,81 +388,39 @@ class FunASRStreamingASR(BaseModule):
                 try:
                     audio_chunk: AudioData = input_queue.get(timeout=1.0)
                 except queue.Empty:
+                    self._check_endpoint(output_queue)
                     # 检查静音超时 - 简化逻辑
                     if (time.time() - self.last_speech_time > self.silence_threshold and 
                         self.sentence_buffer):
                         # 静音超时，处理缓存的句子
                         final_text = self._process_sentence(self.sentence_buffer, is_final=True)
                         if final_text:
-                            output_queue.put(self._numpy_to_text_data(final_text, is_finish=True))
+                            output_queue.put(self._numpy_to_text_data(
+                                final_text, is_finish=True, turn_id=self._turn_for_output(is_final=True)))
                         self.sentence_buffer = ""
                     continue
                 
                 # 结束标记
                 if audio_chunk.pcm_data == b"" and audio_chunk.is_finish:
+                    # 结束仍在进行的语音段（识别剩余音频并断句）
+                    self._handle_vad_output(self.vad.flush(), output_queue)
+                    self.vad.reset()
+                    # 录音已结束，不再等待
+                    self._check_endpoint(output_queue, force=True)
                     # 处理最后缓存的文本
                     if self.sentence_buffer:
                         final_text = self._process_sentence(self.sentence_buffer, is_final=True)
-                        output_queue.put(self._numpy_to_text_data(final_text, is_finish=True))
+                        output_queue.put(self._numpy_to_text_data(
+                            final_text, is_finish=True, turn_id=self._turn_for_output(is_final=True)))
                     # 推送结束标记
                     output_queue.put(self._numpy_to_text_data("", is_finish=True))
                     ##print("🔤 ASR处理完成")
                     break
 
-                # 2. 格式转换
-                speech_chunk = self._audio_data_to_numpy(audio_chunk)
-                
-                # 3. 简易VAD过滤静音
-                is_speech = self._simple_vad(speech_chunk)
-                current_time = time.time()
-                
-                if is_speech:
-                    self.last_speech_time = current_time
-                    self.vad_active = True
-                    
-                    # 4. 流式ASR识别
-                    res = self.asr_model.generate(
-                        input=speech_chunk,
-                        cache=self.cache,
-                        is_final=False,
-                        chunk_size=self.chunk_size,
-                        encoder_chunk_look_back=self.encoder_chunk_look_back,
-                        decoder_chunk_look_back=self.decoder_chunk_look_back
-                    )
-                    
-                    # 5. 提取识别文本
-                    chunk_text = res[0]["text"] if res and len(res) > 0 else ""
-                    
-                    if chunk_text:
-                        print(f"🔤 ASR识别: {chunk_text}")
-                        
-                        # 6. 累积到句子缓存
-                        self.sentence_buffer += chunk_text
-                        
-                        # 7. 检查句子是否自然结束（中文常见结束词）
-                        # 如果句子较长且有明显的结束词，可以提前处理
-                        if len(self.sentence_buffer) >= 8:  # 句子较长时
-                            # 检查是否有自然结束词
-                            end_words = ['吗', '呢', '吧', '啊', '呀', '哦', '哈', '啦', '的', '了']
-                            if any(self.sentence_buffer.endswith(word) for word in end_words):
-                                # 提前处理句子
-                                final_text = self._process_sentence(self.sentence_buffer, is_final=False)
-                                if final_text:
-                                    # 只输出已经完成的句子部分
-                                    output_queue.put(self._numpy_to_text_data(final_text, is_finish=False))
-                                    # 清空缓存，但保留最后几个字符以防断句
-                                    self.sentence_buffer = self.sentence_buffer[-3:] if len(self.sentence_buffer) > 3 else ""
-                        
-                elif self.vad_active and not is_speech:
-                    # VAD从激活变静音，处理完整句子
-                    silence_duration = current_time - self.last_speech_time
-                    if silence_duration > 0.5 and self.sentence_buffer:  # 0.5秒静音
-                        # 处理缓存的句子
-                        final_text = self._process_sentence(self.sentence_buffer, is_final=True)
-                        if final_text:
-                            output_queue.put(self._numpy_to_text_data(final_text, is_finish=True))
-                        self.sentence_buffer = ""
-                        self.vad_active = False
+                # 2. 格式校验后送入帧级VAD，语音段音频写入环形缓冲
+                self._check_format(audio_chunk)
+                self._handle_vad_output(self.vad.process_pcm16(audio_chunk.pcm_data), output_queue)
+                self._check_endpoint(output_queue)
 
         except Exception as e:
             print(f"❌ ASR流式处理异常: {e}")
@@ -418,6 +428,104 @@ class FunASRStreamingASR(BaseModule):
             traceback.print_exc()
             output_queue.put(self._numpy_to_text_data("", is_finish=True))
 
+    def _handle_vad_output(self, vad_output, output_queue: queue.Queue):
+        """处理VAD输出：语音开始 → 回调；语音音频 → 按chunk_stride识别；语音结束 → 识别剩余音频并断句"""
+        for kind, payload in vad_output:
+            if kind == "audio":
+                # 3. 按chunk_stride取出对齐的分片（缓冲区内的视图，无拷贝）
+                self.ring_buffer.write(payload)
+                while True:
+                    speech_chunk = self.ring_buffer.read_stride(self.chunk_stride)
+                    if speech_chunk is None:
+                        break
+                    self._process_chunk(speech_chunk, output_queue)
+            elif kind == "speech_start":
+                self._on_speech_start(payload)
+            elif kind == "speech_end":
+                self._on_speech_end(payload, output_queue)
+
+    def _on_speech_start(self, event: VADEvent):
+        """语音段开始"""
+        if self.speech_start_callback:
+            try:
+                self.speech_start_callback()
+            except Exception as e:
+                print(f"⚠️ 语音开始回调出错: {e}")
+        self.vad_active = True
+        self.last_speech_time = time.time()
+        self.last_speech_monotonic = event.wall_time
+        # 停顿后又继续说：这句话还没结束
+        if self._pending_endpoint is not None:
+            self._pending_endpoint = None
+            self._utterance_resumed += 1
+            self.endpointer.on_resume()
+
+    def _on_speech_end(self, event: VADEvent, output_queue: queue.Queue):
+        """语音段结束（停顿）：以is_final识别不足一个步长的剩余音频，重置流式缓存，再由断句器决定何时输出整句"""
+        tail = self.ring_buffer.read_remaining()
+        if tail is None:
+            tail = np.zeros(self.vad.backend.frame_length, dtype=np.float32)  # 没有剩余音频时用一帧静音触发is_final
+        self._process_chunk(tail, output_queue, is_final=True)
+        self.cache = {}
+        self.vad_active = False
+        # 说话结束时刻取VAD检测到的最后一个语音帧（帧级精度），而不是检测到静音的时刻
+        self.last_speech_time = time.time() - (time.monotonic() - event.wall_time)
+        self.last_speech_monotonic = event.wall_time
+
+        if not self.sentence_buffer:
+            return
+        # 标点模型的结果作为断句依据（规则标点只是猜测，不参与判定）
+        punctuated = self._process_sentence(self.sentence_buffer, is_final=True) if self.use_punc_model else None
+        decision = self.endpointer.decide(self.sentence_buffer, punctuated)
+        self._pending_endpoint = {
+            "event": event,
+            "deadline": event.wall_time + decision.timeout_ms / 1000,
+            "decision": decision,
+            "text": self.sentence_buffer,
+            "punctuated": punctuated,
+        }
+        self._check_endpoint(output_queue)
+
+    def _check_endpoint(self, output_queue: queue.Queue, force: bool = False):
+        """停顿时长达到这句话的等待时长后输出整句"""
+        pending = self._pending_endpoint
+        if pending is None or (not force and time.monotonic() < pending["deadline"]):
+            return
+        self._pending_endpoint = None
+        if pending["punctuated"] is not None and pending["text"] == self.sentence_buffer:
+            final_text = pending["punctuated"]
+        else:
+            final_text = self._process_sentence(self.sentence_buffer, is_final=True)
+        self.sentence_buffer = ""
+        if final_text:
+            turn_id = self._turn_for_output(is_final=True)
+            output_queue.put(self._numpy_to_text_data(final_text, is_finish=True, turn_id=turn_id))
+            delay_ms = (time.monotonic() - pending["event"].wall_time) * 1000
+            self.endpointer.record(turn_id, final_text, pending["decision"], delay_ms, self._utterance_resumed)
+        self._utterance_resumed = 0
+
+    def _process_chunk(self, speech_chunk: np.ndarray, output_queue: queue.Queue, is_final: bool = False):
+        """识别语音段中的一个音频分片（chunk_stride对齐；is_final时为语音段末尾的剩余音频）"""
+        # 4. 流式ASR识别
+        res = self.asr_model.generate(
+            input=speech_chunk,
+            cache=self.cache,
+            is_final=is_final,
+            chunk_size=self.chunk_size,
+            encoder_chunk_look_back=self.encoder_chunk_look_back,
+            decoder_chunk_look_back=self.decoder_chunk_look_back
+        )
+
+        # 5. 提取识别文本
+        chunk_text = res[0]["text"] if res and len(res) > 0 else ""
+
+        if chunk_text:
+            print(f"🔤 ASR识别: {chunk_text}")
+
+            # 6. 累积到句子缓存（何时断句由停顿时的自适应断句器决定）
+            self.sentence_buffer += chunk_text
+            self._notify_partial(chunk_text)
+
     def _process_sentence(self, text: str, is_final: bool = False) -> str:
         """处理句子：添加标点"""
         if not text.strip():
@@ -439,16 +547,8 @@ class FunASRStreamingASR(BaseModule):
         
         try:
             if self.use_punc_model and self.punc_model is not None:
-                ##print(f"🔤 调用标点模型: '{text}'")
-                punc_result = self.punc_model.generate(input=text)
-                ##print(f"🔤 标点模型输出: {punc_result}")
-                
-                punctuated_text = self._extract_text_from_punc_result(punc_result)
-                punctuated_text = punctuated_text.strip()
-                
-                # 清理标点：移除连续的标点
-                punctuated_text = re.sub(r'([。！？])\1+', r'\1', punctuated_text)
-                punctuated_text = re.sub(r'([,，])\1+', r'\1', punctuated_text)
+                # 增量标点：同一句话已标过的前缀和相同文本不再重复送入模型
+                punctuated_text = self.punctuator.punctuate(text)
                 
                 print(f"✅ 标点结果: '{punctuated_text}'")
                 return punctuated_text
@@ -0,0 +1,247 @@
+# kv_prefix_cache.py
+"""
+ChatGLM3 跨轮次KV前缀缓存
+每轮对话的输入 = [gMASK]sop + 系统提示词(含记忆上下文) + 历史消息 + 新问题，
+其中系统提示词和历史在相邻两轮之间基本不变。这里按消息前缀缓存past_key_values：
+- 缓存键：逐条消息累积的SHA-256（记忆上下文变化 → 系统提示词变化 → 键变化，旧前缀自然失效）
+- 查询时找到最长的已缓存前缀，只对剩余的新消息做一次prefill，再把past_key_values交给stream_chat
+- 按张量字节预算做LRU淘汰
+ChatGLM3的KV以torch.cat拼接生成新张量，缓存的前缀在生成过程中不会被修改，可以反复复用。
+"""
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+try:
+    import torch
+except ImportError:  # 桩后端/无GPU环境下缓存自动停用
+    torch = None
+
+# 连续这么多次prefill失败（不是偶发的OOM等）才停用缓存
+MAX_CONSECUTIVE_FAILURES = 3
+
+
+class _PrefixEntry:
+    """一条缓存的前缀：past_key_values及其token数、显存占用"""
+    __slots__ = ("past_key_values", "num_tokens", "num_bytes")
+
+    def __init__(self, past_key_values, num_tokens: int, num_bytes: int):
+        self.past_key_values = past_key_values
+        self.num_tokens = num_tokens
+        self.num_bytes = num_bytes
+
+
+class PrefixKVCache:
+    """按消息前缀缓存ChatGLM3的past_key_values，只prefill新增的后缀"""
+
+    def __init__(self, model, tokenizer, memory_budget_bytes: int = 512 * 1024 * 1024, verbose: bool = True):
+        """
+        :param model: ChatGLM3模型（需支持forward(past_key_values, use_cache=True)）
+        :param tokenizer: ChatGLM3分词器（需提供get_prefix_tokens / build_single_message）
+        :param memory_budget_bytes: 缓存KV张量的字节预算，超出后淘汰最久未使用的前缀
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.memory_budget_bytes = memory_budget_bytes
+        self.verbose = verbose
+        self.enabled = self._is_supported()
+        self._entries: "OrderedDict[str, _PrefixEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        # 统计
+        self.hits = 0             # 整个前缀都已缓存
+        self.partial_hits = 0     # 复用了部分前缀
+        self.misses = 0           # 从头prefill
+        self.evictions = 0
+        self.tokens_reused = 0    # 累计复用（省去prefill）的token数
+        self.tokens_prefilled = 0 # 累计新prefill的token数
+        self.prefill_failures = 0 # prefill失败（该轮回退为完整prefill）的次数
+        self._consecutive_failures = 0
+        self.last_turn: Dict[str, int] = {}
+
+    def _is_supported(self) -> bool:
+        """只有真实的ChatGLM3模型和分词器才启用（桩模型没有forward）"""
+        return (
+            torch is not None
+            and hasattr(self.tokenizer, "get_prefix_tokens")
+            and hasattr(self.tokenizer, "build_single_message")
+            and hasattr(self.model, "transformer")
+        )
+
+    # ===================== 缓存键 =====================
+    @staticmethod
+    def _prefix_keys(messages: List[Dict[str, Any]]) -> List[str]:
+        """每个消息前缀messages[:i+1]对应的键（逐条累积哈希）"""
+        keys = []
+        digest = ""
+        for message in messages:
+            payload = json.dumps(
+                [digest, message.get("role"), message.get("metadata", ""), message.get("content")],
+                ensure_ascii=False,
+                default=str,
+            )
+            digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+            keys.append(digest)
+        return keys
+
+    # ===================== KV工具 =====================
+    @staticmethod
+    def _kv_length(past_key_values) -> int:
+        """ChatGLM3的KV形状为[seq, batch, heads, dim]"""
+        return past_key_values[0][0].shape[0]
+
+    @staticmethod
+    def _kv_bytes(past_key_values) -> int:
+        return sum(t.numel() * t.element_size() for layer in past_key_values for t in layer)
+
+    def _message_tokens(self, message: Dict[str, Any]) -> List[int]:
+        content = message.get("content")
+        if not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False)
+        return self.tokenizer.build_single_message(message["role"], message.get("metadata", ""), content)
+
+    def _prefill(self, token_ids: List[int], past_key_values=None):
+        """在已有KV之后追加token_ids，返回新的past_key_values"""
+        past_length = self._kv_length(past_key_values) if past_key_values is not None else 0
+        device = getattr(self.model, "device", None)
+        input_ids = torch.tensor([token_ids], dtype=torch.long, device=device)
+        position_ids = torch.arange(past_length, past_length + len(token_ids), dtype=torch.long, device=device).unsqueeze(0)
+        attention_mask = torch.ones((1, past_length + len(token_ids)), dtype=torch.long, device=device)
+        with torch.no_grad():
+            outputs = self.model(
+                input_ids=input_ids,
+                position_ids=position_ids,
+                attention_mask=attention_mask,
+                past_key_values=past_key_values,
+                use_cache=True,
+                return_dict=True,
+                return_last_logit=True,
+            )
+        return outputs.past_key_values
+
+    # ===================== 查询 =====================
+    def lookup(self, history: Optional[List[Dict[str, Any]]]):
+        """
+        获取history（系统提示词+历史消息）对应的past_key_values，必要时只prefill未缓存的部分。
+        返回None表示不使用缓存（stream_chat按原方式完整prefill）。
+        """
+        if not self.enabled or not history:
+            return None
+
+        messages = [dict(message) for message in history]  # stream_chat会修改history，先做快照
+        keys = self._prefix_keys(messages)
+
+        # 找最长的已缓存前缀
+        base_index, base_entry = -1, None
+        with self._lock:
+            for i in range(len(keys) - 1, -1, -1):
+                entry = self._entries.get(keys[i])
+                if entry is not None:
+                    self._entries.move_to_end(keys[i])
+                    base_index, base_entry = i, entry
+                    break
+
+        if base_index == len(keys) - 1:
+            self.hits += 1
+            self._record_turn(base_entry.num_tokens, 0)
+            return base_entry.past_key_values
+
+        # prefill剩余的消息（从头开始时带上[gMASK]sop前缀）
+        token_ids: List[int] = [] if base_entry is not None else list(self.tokenizer.get_prefix_tokens())
+        for message in messages[base_index + 1:]:
+            token_ids.extend(self._message_tokens(message))
+        try:
+            past_key_values = self._prefill(token_ids, base_entry.past_key_values if base_entry else None)
+        except Exception as e:
+            # 只有本轮回退为完整prefill；丢掉可能已失效的基础前缀（如模型重新加载后形状不匹配）
+            print(f"⚠️ KV前缀缓存prefill失败，本轮回退为完整prefill: {e}")
+            self._drop(keys[base_index] if base_entry is not None else None)
+            self.prefill_failures += 1
+            self._consecutive_failures += 1
+            if self._consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+                print(f"⚠️ KV前缀缓存连续{self._consecutive_failures}次prefill失败，已停用")
+                self.enabled = False
+                self.clear()
+            return None
+        self._consecutive_failures = 0
+
+        if base_entry is not None:
+            self.partial_hits += 1
+        else:
+            self.misses += 1
+        self._put(keys[-1], past_key_values)
+        self._record_turn(base_entry.num_tokens if base_entry else 0, len(token_ids))
+        return past_key_values
+
+    def _put(self, key: str, past_key_values):
+        entry = _PrefixEntry(past_key_values, self._kv_length(past_key_values), self._kv_bytes(past_key_values))
+        with self._lock:
+            if entry.num_bytes > self.memory_budget_bytes:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.num_bytes
+            self._entries[key] = entry
+            self._bytes += entry.num_bytes
+            while self._bytes > self.memory_budget_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.num_bytes
+                self.evictions += 1
+
+    def _drop(self, key: Optional[str]):
+        if key is None:
+            return
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry.num_bytes
+
+    def _record_turn(self, reused: int, prefilled: int):
+        self.tokens_reused += reused
+        self.tokens_prefilled += prefilled
+        self.last_turn = {"reused_tokens": reused, "prefilled_tokens": prefilled}
+        if self.verbose:
+            print(f"⚡ KV前缀缓存：复用{reused}个token，新prefill {prefilled}个token")
+
+    # ===================== 统计 =====================
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        with self._lock:
+            entries, used = len(self._entries), self._bytes
+        return {
+            "enabled": self.enabled,
+            "entries": entries,
+            "memory_mb": round(used / 1024 / 1024, 2),
+            "hits": self.hits,
+            "partial_hits": self.partial_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "tokens_reused": self.tokens_reused,
+            "tokens_prefilled": self.tokens_prefilled,
+            "prefill_failures": self.prefill_failures,
+            "last_turn": dict(self.last_turn),
+        }
+
+    def clear(self):
+        """清空缓存（释放显存）"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+# 每个模型实例一个缓存
+_caches: Dict[int, PrefixKVCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_prefix_cache(model, tokenizer) -> PrefixKVCache:
+    """获取（必要时创建）该模型对应的前缀缓存"""
+    with _caches_lock:
+        cache = _caches.get(id(model))
+        if cache is None or cache.model is not model or cache.tokenizer is not tokenizer:
+            cache = PrefixKVCache(model, tokenizer)
+            _caches[id(model)] = cache
+        return cache
@@ -0,0 +1,167 @@
+# latency_tracer.py
+"""
+端到端延迟追踪：ASR → LLM → TTS → 播放
+每轮对话分配一个turn_id，随AudioData/TextData在各模块间传递，
+各模块在关键节点打点（time.monotonic），汇总为各阶段的p50/p95/p99，
+并可导出Chrome trace / Perfetto 可读的JSON查看单轮时间线。
+"""
+import json
+import threading
+import time
+from typing import Dict, List, Optional, Any
+
+# 一轮对话的关键节点（按时间顺序）
+TURN_EVENTS = [
+    "speech_end",        # 用户说完（最后一次检测到语音）
+    "asr_final",         # ASR输出最终识别结果
+    "llm_first_token",   # LLM产出第一个字
+    "first_sentence",    # 第一个句子送入TTS
+    "tts_first_pcm",     # TTS产出第一段PCM
+    "first_playback",    # 第一段音频写入声卡
+    "turn_complete",     # 本轮播放结束
+]
+
+
+class TurnTrace:
+    """单轮对话的打点记录"""
+
+    def __init__(self, turn_id: int, label: str = ""):
+        self.turn_id = turn_id
+        self.label = label
+        self.marks: Dict[str, float] = {}
+
+    def duration(self, start_event: str, end_event: str) -> Optional[float]:
+        """两个节点之间的耗时（秒），任一节点缺失时返回None"""
+        if start_event in self.marks and end_event in self.marks:
+            return self.marks[end_event] - self.marks[start_event]
+        return None
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    """最近秩百分位数"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+class LatencyTracer:
+    """延迟追踪器：分配turn_id、记录打点、汇总统计、导出trace"""
+
+    def __init__(self, max_turns: int = 1000):
+        self.max_turns = max_turns
+        self._turns: Dict[int, TurnTrace] = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+        # monotonic时钟的零点（导出trace时使用相对时间）
+        self._origin = time.monotonic()
+
+    def new_turn(self, label: str = "") -> int:
+        """开始新的一轮对话，返回turn_id"""
+        with self._lock:
+            turn_id = self._next_id
+            self._next_id += 1
+            self._turns[turn_id] = TurnTrace(turn_id, label)
+            # 只保留最近max_turns轮
+            while len(self._turns) > self.max_turns:
+                self._turns.pop(next(iter(self._turns)))
+            return turn_id
+
+    def mark(self, turn_id: Optional[int], event: str, at: Optional[float] = None):
+        """记录节点时间（同一节点只记第一次）；at为time.monotonic()时间戳，缺省为当前时间"""
+        if turn_id is None:
+            return
+        timestamp = time.monotonic() if at is None else at
+        with self._lock:
+            trace = self._turns.get(turn_id)
+            if trace is not None and event not in trace.marks:
+                trace.marks[event] = timestamp
+
+    def last_turn_id(self) -> int:
+        """最近分配的turn_id（尚未分配时为0）"""
+        with self._lock:
+            return self._next_id - 1
+
+    def set_label(self, turn_id: Optional[int], label: str):
+        """设置本轮的说明文字（如用户输入）"""
+        with self._lock:
+            trace = self._turns.get(turn_id)
+            if trace is not None:
+                trace.label = label
+
+    def get_trace(self, turn_id: int) -> Optional[TurnTrace]:
+        with self._lock:
+            return self._turns.get(turn_id)
+
+    # ===================== 统计 =====================
+    def stage_stats(self) -> Dict[str, Dict[str, float]]:
+        """各阶段（相邻节点之间）以及端到端的耗时分布（毫秒）"""
+        with self._lock:
+            traces = list(self._turns.values())
+
+        pairs = list(zip(TURN_EVENTS, TURN_EVENTS[1:]))
+        pairs.append(("speech_end", "first_playback"))  # 端到端：说完到听到回复
+        stats = {}
+        for start_event, end_event in pairs:
+            values = sorted(
+                d * 1000 for d in (t.duration(start_event, end_event) for t in traces) if d is not None
+            )
+            if not values:
+                continue
+            stats[f"{start_event}→{end_event}"] = {
+                "count": len(values),
+                "p50": round(_percentile(values, 50), 1),
+                "p95": round(_percentile(values, 95), 1),
+                "p99": round(_percentile(values, 99), 1),
+            }
+        return stats
+
+    def print_summary(self):
+        """打印各阶段延迟统计"""
+        stats = self.stage_stats()
+        if not stats:
+            print("📊 暂无延迟追踪数据")
+            return
+        print("📊 各阶段延迟（ms）：")
+        for stage, s in stats.items():
+            print(f"   {stage:<36} n={s['count']:<4} p50={s['p50']:<8} p95={s['p95']:<8} p99={s['p99']}")
+
+    # ===================== 导出 =====================
+    def to_chrome_trace(self, turn_ids: Optional[List[int]] = None) -> Dict[str, Any]:
+        """生成Chrome trace格式（每轮一条轨道，阶段为区间事件，节点为瞬时事件）"""
+        with self._lock:
+            traces = [t for t in self._turns.values() if turn_ids is None or t.turn_id in turn_ids]
+
+        events = []
+        for trace in traces:
+            ordered = sorted(trace.marks.items(), key=lambda item: item[1])
+            events.append({
+                "name": "thread_name", "ph": "M", "pid": 1, "tid": trace.turn_id,
+                "args": {"name": f"turn {trace.turn_id} {trace.label[:20]}"},
+            })
+            for (start_event, start), (end_event, end) in zip(ordered, ordered[1:]):
+                events.append({
+                    "name": f"{start_event}→{end_event}", "ph": "X", "pid": 1, "tid": trace.turn_id,
+                    "ts": (start - self._origin) * 1e6, "dur": (end - start) * 1e6,
+                })
+            for event, timestamp in ordered:
+                events.append({
+                    "name": event, "ph": "i", "s": "t", "pid": 1, "tid": trace.turn_id,
+                    "ts": (timestamp - self._origin) * 1e6,
+                })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path: str, turn_ids: Optional[List[int]] = None):
+        """导出trace JSON（可在 chrome://tracing 或 ui.perfetto.dev 打开）"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome_trace(turn_ids), f, ensure_ascii=False)
+        print(f"💾 延迟追踪已导出: {path}")
+
+    def reset(self):
+        """清空所有记录"""
+        with self._lock:
+            self._turns.clear()
+
+
+# 全局追踪器（各模块共用）
+tracer = LatencyTracer()
@@ -0,0 +1,243 @@
+# llm_service.py
+"""
+常驻LLM生成服务：一个工作线程串行执行所有生成请求（GPU同一时间只跑一个生成）
+- 请求队列：submit()立即返回请求句柄，调用方通过deltas()逐段读取过滤后的增量文本
+- 协作式取消：StoppingCriteria在每个解码步之间检查取消标记，被取消/被新请求取代的生成立即停止占用GPU
+- 每个请求有自己的截止时间，超时同样在下一个解码步停止
+- 系统提示词的KV前缀缓存（kv_prefix_cache）在工作线程中、stream_chat之前查询：前缀prefill同样串行占用GPU，
+  并且受取消/截止时间约束（prefill本身是一次前向，开始后在其结束时生效）
+"""
+import time
+import queue
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+from kv_prefix_cache import get_prefix_cache
+from stream_filter import StreamingResponseFilter, DEFAULT_FILTER_WORDS
+
+try:
+    from transformers import StoppingCriteria, StoppingCriteriaList
+except ImportError:  # 桩后端环境：stream_chat只需要一个可迭代的判定函数列表
+    StoppingCriteria = object
+    StoppingCriteriaList = list
+
+
+class _CancelCriteria(StoppingCriteria):
+    """解码步之间检查请求是否已被取消或超时"""
+
+    def __init__(self, request: "GenerationRequest"):
+        self.request = request
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return self.request.should_stop()
+
+
+class GenerationRequest:
+    """一次生成请求的句柄：读取增量、取消、查询状态"""
+
+    def __init__(self, request_id: int, query: str, history: Optional[List[Dict]], past_key_values,
+                 timeout: Optional[float], filter_words: Optional[List[str]], gen_kwargs: Dict[str, Any]):
+        self.request_id = request_id
+        self.query = query
+        self.history = history
+        self.past_key_values = past_key_values
+        self.gen_kwargs = gen_kwargs
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.response_filter = StreamingResponseFilter(filter_words or [])
+        self.status = "queued"  # queued / running / done / error，或停止原因（cancelled / superseded / timeout）
+        self.error: Optional[str] = None
+        self.submit_time = time.monotonic()
+        self.start_time: Optional[float] = None
+        self.end_time: Optional[float] = None
+        self._events: queue.Queue = queue.Queue()
+        self._stop_reason: Optional[str] = None
+        self._done = threading.Event()
+
+    # ===================== 取消 =====================
+    def cancel(self, reason: str = "cancelled"):
+        """请求停止生成（排队中的请求不会再开始，运行中的请求在下一个解码步停止）"""
+        if self._stop_reason is None:
+            self._stop_reason = reason
+
+    def should_stop(self) -> bool:
+        if self._stop_reason is None and self.deadline is not None and time.monotonic() > self.deadline:
+            self._stop_reason = "timeout"
+        return self._stop_reason is not None
+
+    @property
+    def stop_reason(self) -> Optional[str]:
+        return self._stop_reason
+
+    # ===================== 结果 =====================
+    @property
+    def text(self) -> str:
+        """已生成的（过滤后的）回复"""
+        return self.response_filter.text
+
+    def is_done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def deltas(self, poll_interval: float = 0.1) -> Iterator[str]:
+        """逐段产出新生成的文本，请求结束（完成/取消/超时/出错）后返回"""
+        while True:
+            try:
+                kind, data = self._events.get(timeout=poll_interval)
+            except queue.Empty:
+                # 截止时间到了仍未开始或卡住：由调用方这一侧结束等待
+                if self.should_stop() and self.status == "queued":
+                    return
+                continue
+            if kind == "chunk":
+                yield data
+            else:
+                return
+
+    # ===================== 工作线程回调 =====================
+    def _emit(self, text: str):
+        self._events.put(("chunk", text))
+
+    def _finish(self, status: str, error: Optional[str] = None):
+        self.status = status
+        self.error = error
+        self.end_time = time.monotonic()
+        self._events.put(("end", status))
+        self._done.set()
+
+
+class LLMGenerationService:
+    """常驻生成线程 + 请求队列"""
+
+    def __init__(self, model, tokenizer, default_timeout: float = 60.0, use_prefix_cache: bool = True):
+        """
+        :param model: 提供ChatGLM3 stream_chat签名的模型
+        :param tokenizer: 对应的分词器
+        :param default_timeout: 请求默认的截止时间（秒，从提交开始计算）
+        :param use_prefix_cache: 未显式传入past_key_values的请求复用系统提示词/历史的KV前缀缓存
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.default_timeout = default_timeout
+        self.prefix_cache = get_prefix_cache(model, tokenizer) if use_prefix_cache else None
+        self._requests: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._pending: List[GenerationRequest] = []  # 排队中和运行中的请求
+        self._current: Optional[GenerationRequest] = None
+
+        # 统计
+        self.stats = {"submitted": 0, "done": 0, "cancelled": 0, "timeout": 0, "error": 0, "generate_time": 0.0}
+
+        self._worker = threading.Thread(target=self._worker_loop, name="LLM-Generation", daemon=True)
+        self._worker.start()
+
+    # ===================== 提交与取消 =====================
+    def submit(self, query: str, history: Optional[List[Dict]] = None, past_key_values=None,
+               timeout: Optional[float] = None, supersede: bool = True,
+               filter_words: Optional[List[str]] = DEFAULT_FILTER_WORDS, **gen_kwargs) -> GenerationRequest:
+        """
+        提交生成请求
+        :param past_key_values: 显式指定的KV前缀；为None时由工作线程查询KV前缀缓存
+        :param supersede: 为True时取消所有尚未结束的旧请求（新的一轮对话取代旧的）
+        :param filter_words: 流式过滤的关键词（None表示不过滤）
+        :param gen_kwargs: 透传给stream_chat的参数（temperature、top_p、system等）
+        """
+        if supersede:
+            self.cancel_all("superseded")
+        with self._lock:
+            request = GenerationRequest(
+                self._next_id, query, history, past_key_values,
+                timeout if timeout is not None else self.default_timeout, filter_words, gen_kwargs
+            )
+            self._next_id += 1
+            self._pending.append(request)
+            self.stats["submitted"] += 1
+        self._requests.put(request)
+        return request
+
+    def cancel_all(self, reason: str = "cancelled") -> int:
+        """取消所有排队中和运行中的请求，返回取消的个数"""
+        with self._lock:
+            pending = list(self._pending)
+        for request in pending:
+            request.cancel(reason)
+        return len(pending)
+
+    def current_request(self) -> Optional[GenerationRequest]:
+        return self._current
+
+    # ===================== 工作线程 =====================
+    def _worker_loop(self):
+        while True:
+            request = self._requests.get()
+            if request is None:
+                break
+            try:
+                if request.should_stop():
+                    self._finish(request, request.stop_reason)
+                    continue
+                self._current = request
+                self._run(request)
+            finally:
+                self._current = None
+
+    def _run(self, request: GenerationRequest):
+        request.status = "running"
+        request.start_time = time.monotonic()
+        response_filter = request.response_filter
+        try:
+            # 复用系统提示词的KV缓存（记忆上下文不变时跳过整段系统提示词的prefill），与生成一样串行执行
+            if request.past_key_values is None and self.prefix_cache is not None:
+                request.past_key_values = self.prefix_cache.lookup(request.history)
+                if request.should_stop():
+                    self._finish(request, request.stop_reason)
+                    return
+            for response, *_ in self.model.stream_chat(
+                tokenizer=self.tokenizer,
+                query=request.query,
+                history=request.history,
+                past_key_values=request.past_key_values,
+                return_past_key_values=True,
+                stopping_criteria=StoppingCriteriaList([_CancelCriteria(request)]),
+                **request.gen_kwargs
+            ):
+                # 模型没有检查stopping_criteria时，在产出之间兜底
+                if request.should_stop():
+                    break
+                new_content = response_filter.feed(response)
+                if new_content:
+                    request._emit(new_content)
+
+            tail = response_filter.flush()
+            if tail:
+                request._emit(tail)
+            self._finish(request, request.stop_reason or "done")
+        except Exception as e:
+            print(f"❌ LLM流式生成错误: {e}")
+            self._finish(request, "error", str(e))
+
+    def _finish(self, request: GenerationRequest, status: str, error: Optional[str] = None):
+        request._finish(status, error)
+        with self._lock:
+            if request in self._pending:
+                self._pending.remove(request)
+            self.stats[status] = self.stats.get(status, 0) + 1
+            if request.start_time is not None:
+                self.stats["generate_time"] += request.end_time - request.start_time
+
+    # ===================== 统计与关闭 =====================
+    def get_stats(self) -> Dict[str, Any]:
+        """获取服务统计"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["pending"] = len(self._pending)
+        stats["generate_time"] = round(stats["generate_time"], 3)
+        return stats
+
+    def shutdown(self):
+        """取消所有请求并停止工作线程"""
+        self.cancel_all("shutdown")
+        self._requests.put(None)
+        self._worker.join(timeout=2)
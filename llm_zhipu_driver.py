@@ -1,10 +1,10 @@
-from transformers import AutoTokenizer, AutoModel
 import warnings
 warnings.filterwarnings("ignore")
-import torch
 import time
 import random
 from memory_database import MemoryDatabase
+from kv_prefix_cache import get_prefix_cache
+from stream_filter import StreamingWordFilter, StreamingResponseFilter, DEFAULT_FILTER_WORDS
 import queue
 from typing import List, Dict, Optional
 # ========== 优化提示词工程和记忆系统 ==========
@@ -326,6 +326,10 @@ QUANTIZE = 8  # 从4bit改为8bit量化，平衡速度和内存
 
 def init_model_and_tokenizer():
     """优化模型加载，添加记忆系统"""
+    # torch/transformers只在加载真实模型时导入（桩后端的基准测试不需要安装它们）
+    import torch
+    from transformers import AutoTokenizer, AutoModel
+
     tokenizer = AutoTokenizer.from_pretrained(
         LOCAL_MODEL_PATH, 
         trust_remote_code=True,
@@ -385,9 +389,7 @@ def normal_chat(tokenizer, model):
                 system=CUSTOM_SYSTEM_PROMPT  # 显式传入自定义system，双重保障
             )
             # 过滤可能漏出的AI身份关键词（兜底）
-            filter_words = ["AI", "助手", "ChatGLM", "模型", "训练", "开发", "智谱"]
-            for word in filter_words:
-                response = response.replace(word, "")
+            response = StreamingWordFilter(DEFAULT_FILTER_WORDS).filter_text(response)
             # 输出回复（去掉ChatGLM3标识）
             print(f"miricle: {response}\n")
         except Exception as e:
@@ -412,7 +414,8 @@ def stream_chat(tokenizer, model):
         # 流式调用模型（传入自定义system）
         try:
             print("miricle: ", end="", flush=True)
-            final_response = ""
+            # 流式过滤AI身份关键词（只处理新增文本）
+            response_filter = StreamingResponseFilter(DEFAULT_FILTER_WORDS)
             # 逐字生成回复
             for response, history, _ in model.stream_chat(
                 tokenizer,
@@ -424,14 +427,9 @@ def stream_chat(tokenizer, model):
                 past_key_values=None,
                 return_past_key_values=True
             ):
-                # 过滤AI身份关键词
-                filter_words = ["AI", "助手", "ChatGLM", "模型", "训练", "开发", "智谱"]
-                for word in filter_words:
-                    response = response.replace(word, "")
                 # 输出新增的内容（避免重复打印）
-                new_content = response[len(final_response):]
-                print(new_content, end="", flush=True)
-                final_response = response
+                print(response_filter.feed(response), end="", flush=True)
+            print(response_filter.flush(), end="")
             print("\n")  # 换行分隔
         except Exception as e:
             print(f"\n❌ 流式对话出错：{e}")
@@ -475,8 +473,12 @@ def create_stream_generator(tokenizer, model, query: str, history: list, memory_
         # 更新system prompt
         history[0]["content"] = dynamic_prompt
     
-    # 使用模型的stream_chat方法
-    full_response = ""
+    # 复用系统提示词+历史的KV缓存，只prefill新增部分
+    past_key_values = get_prefix_cache(model, tokenizer).lookup(history)
+    
+    # 使用模型的stream_chat方法，流式过滤AI身份关键词
+    response_filter = StreamingResponseFilter(DEFAULT_FILTER_WORDS)
+    new_history = history
     for response, new_history, _ in model.stream_chat(
         tokenizer=tokenizer,
         query=query,
@@ -484,24 +486,21 @@ def create_stream_generator(tokenizer, model, query: str, history: list, memory_
         top_p=0.9,
         temperature=0.8,
         system=dynamic_prompt,
-        past_key_values=None,
+        past_key_values=past_key_values,
         return_past_key_values=True
     ):
-        # 过滤AI身份关键词
-        filter_words = ["AI", "助手", "ChatGLM", "模型", "训练", "开发", "智谱", "人工智能"]
-        filtered_response = response
-        for word in filter_words:
-            filtered_response = filtered_response.replace(word, "")
-        
-        # 提取新增的内容
-        if len(filtered_response) > len(full_response):
-            new_content = filtered_response[len(full_response):]
-            full_response = filtered_response
-            
-            yield new_content, new_history, full_response
+        # 提取过滤后新增的内容
+        new_content = response_filter.feed(response)
+        if new_content:
+            yield new_content, new_history, response_filter.text
+    
+    # 输出扣留的尾部
+    tail = response_filter.flush()
+    if tail:
+        yield tail, new_history, response_filter.text
     
     # 最后yield完整回复
-    yield "", new_history, full_response
+    yield "", new_history, response_filter.text
 # 在 llm_zhipu_driver.py 中添加流式生成器
 def stream_chat_with_memory(tokenizer, model, user_input, history=None, memory_system=None, temperature=0.8):
     """
@@ -535,8 +534,11 @@ def stream_chat_with_memory(tokenizer, model, user_input, history=None, memory_s
     
     print(f"🧠 LLM开始生成...")
     
-    # 使用模型的stream_chat方法获取流式响应
-    full_response = ""
+    # 复用系统提示词+历史的KV缓存，只prefill新增部分
+    past_key_values = get_prefix_cache(model, tokenizer).lookup(history)
+    
+    # 使用模型的stream_chat方法获取流式响应（流式过滤AI身份关键词）
+    response_filter = StreamingResponseFilter(DEFAULT_FILTER_WORDS + ["语言模型"])
     chunk_count = 0
     
     for response, new_history, _ in model.stream_chat(
@@ -546,26 +548,23 @@ def stream_chat_with_memory(tokenizer, model, user_input, history=None, memory_s
         top_p=0.9,
         temperature=temperature,
         system=dynamic_prompt,
-        past_key_values=None,
+        past_key_values=past_key_values,
         return_past_key_values=True
     ):
-        # 过滤AI身份关键词
-        filter_words = ["AI", "助手", "ChatGLM", "模型", "训练", "开发", "智谱", "人工智能", "语言模型"]
-        filtered_response = response
-        for word in filter_words:
-            filtered_response = filtered_response.replace(word, "")
-        
-        # 提取新增的内容
-        if len(filtered_response) > len(full_response):
-            new_content = filtered_response[len(full_response):]
-            full_response = filtered_response
-            
-            if new_content:
-                chunk_count += 1
-                # print(f"📝 LLM生成第{chunk_count}个分片: {new_content[:30]}...")
-                yield new_content, False, full_response
+        # 提取过滤后新增的内容
+        new_content = response_filter.feed(response)
+        if new_content:
+            chunk_count += 1
+            # print(f"📝 LLM生成第{chunk_count}个分片: {new_content[:30]}...")
+            yield new_content, False, response_filter.text
+    
+    # 输出扣留的尾部
+    tail = response_filter.flush()
+    if tail:
+        chunk_count += 1
+        yield tail, False, response_filter.text
     
     # 最终yield完整回复和结束标记
-    yield "", True, full_response
+    yield "", True, response_filter.text
     
     print(f"✅ LLM生成完成，共{chunk_count}个分片")
\ No newline at end of file
@@ -24,11 +24,15 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # 导入各个模块
 from audio_player import AudioDriver
+from audio_devices import create_backend
 from funasr_driver import FunASRStreamingASR
 from tts_driver import GenieTTSModule
-from control import init_control_modules, asr_to_llm, tts_to_play, key_control, cleanup, is_running as control_running, asr_input_q
+from control import init_control_modules, asr_to_llm, tts_to_play, key_control, cleanup, cancel_generation, on_partial_transcript, configure_chunk_policy, split_for_tts, chunk_policy, is_running as control_running, asr_input_q, FALLBACK_REPLY
+from topic_manager import TopicManager
 from base_interface import AudioData, TextData
 from sentence_processor import SentenceProcessor
+from latency_tracer import tracer
+from barge_in import BargeInController
 
 # ===================== 全局变量 =====================
 # 队列定义
@@ -41,6 +45,16 @@ tts_output_queue = None     # TTS → 播放（音频数据）
 audio_driver = None
 asr_module = None
 tts_module = None
+barge_in = None
+
+# 延迟追踪导出路径（Chrome trace格式）
+LATENCY_TRACE_PATH = "./latency_trace.json"
+# 每句话的断句延迟记录（用于调整断句参数）
+ENDPOINT_LOG_PATH = "./endpointing_log.json"
+# 音频设备（见audio_devices.create_backend）：无声卡的服务器上可用 "null" / "wav:reply.wav" 输出，
+# "wav:input.wav" 代替麦克风输入；AUDIO_INPUT为None时输出用声卡则输入也用麦克风
+AUDIO_OUTPUT = "pyaudio"
+AUDIO_INPUT = None
 
 # 线程控制
 threads = []
@@ -49,7 +63,7 @@ should_stop = threading.Event()
 # ===================== 初始化函数 =====================
 def init_modules():
     """初始化所有模块"""
-    global audio_driver, asr_module, tts_module
+    global audio_driver, asr_module, tts_module, barge_in
     global asr_input_queue, asr_output_queue, tts_input_queue, tts_output_queue
     
     print("=" * 60)
@@ -59,7 +73,7 @@ def init_modules():
     try:
         # 1. 初始化音频驱动
         print("[1/6] 初始化音频驱动...")
-        audio_driver = AudioDriver()
+        audio_driver = AudioDriver(backend=create_backend(AUDIO_OUTPUT, AUDIO_INPUT))
         time.sleep(0.5)
         
         # 2. 初始化ASR模块
@@ -77,6 +91,18 @@ def init_modules():
         init_control_modules()
         time.sleep(1)
         
+        # 用户开口时立即打断正在播放的回复（停止播放、TTS合成和LLM生成）
+        barge_in = BargeInController(audio_driver, tts_module, cancel_llm=cancel_generation)
+        asr_module.speech_start_callback = barge_in.on_speech_start
+        # 中间识别结果稳定后提前开始LLM生成
+        asr_module.partial_callback = on_partial_transcript
+        # LLM→TTS分块按实测TTS速度和播放缓冲深度调整
+        configure_chunk_policy(tts_module, audio_driver)
+        # 预热TTS缓存：兜底回复整句送入TTS；话题话术由LLM说出、经分块器切分，按同样的方式切分后预热
+        tts_module.prewarm_cache(
+            [FALLBACK_REPLY] + [chunk for phrase in TopicManager().get_fixed_phrases() for chunk in split_for_tts(phrase)]
+        )
+        
         # 5. 创建队列
         print("[5/6] 创建数据队列...")
         asr_input_queue = queue.Queue(maxsize=100)
@@ -237,8 +263,19 @@ def cleanup_resources():
     # 清理控制模块
     cleanup()
     
+    if barge_in and barge_in.events:
+        print(f"✋ 打断统计: {barge_in.get_stats()}")
+    if chunk_policy.chunk_lengths:
+        print(f"✂️ 分块统计: {chunk_policy.get_stats()}")
+    
     # 停止音频驱动
     if audio_driver:
+        playback_stats = audio_driver.get_playback_stats()
+        if playback_stats:
+            print(f"🔈 播放统计: {playback_stats}")
+        print(f"🎙️ 采集统计: {audio_driver.get_capture_stats()}")
+        if AUDIO_OUTPUT != "pyaudio":
+            print(f"🔌 音频设备统计: {audio_driver.get_device_stats()}")
         try:
             audio_driver.stop_record()
             audio_driver.stop_play()
@@ -265,6 +302,21 @@ def cleanup_resources():
             except:
                 pass
     
+    # 输出本次运行的各阶段延迟统计
+    tracer.print_summary()
+    if tracer.stage_stats():
+        try:
+            tracer.export_chrome_trace(LATENCY_TRACE_PATH)
+        except Exception as e:
+            print(f"⚠️ 延迟追踪导出失败: {e}")
+    endpointer = getattr(asr_module, "endpointer", None)
+    if endpointer is not None and endpointer.records:
+        print(f"⏱️ 断句统计: {endpointer.get_stats()}")
+        try:
+            endpointer.export(ENDPOINT_LOG_PATH)
+        except Exception as e:
+            print(f"⚠️ 断句记录导出失败: {e}")
+    
     print("✅ 所有资源已清理")
     print("👋 系统退出")
 
@@ -8,6 +8,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from enhanced_memory import EnhancedMemoryLLM
 from typing import Optional
+from stream_filter import StreamingResponseFilter, DEFAULT_FILTER_WORDS
 
 class MemoryAdapter:
     """记忆适配器：桥接现有系统和增强记忆模块"""
@@ -127,8 +128,8 @@ def process_query_stream(self, user_input: str, use_memory: bool = True,
     else:
         self.history[0]["content"] = dynamic_prompt
     
-    # 使用模型的stream_chat方法
-    full_response = ""
+    # 使用模型的stream_chat方法，流式过滤AI身份关键词
+    response_filter = StreamingResponseFilter(DEFAULT_FILTER_WORDS)
     for response, new_history, _ in self.model.stream_chat(
         tokenizer=self.tokenizer,
         query=user_input,
@@ -139,19 +140,17 @@ def process_query_stream(self, user_input: str, use_memory: bool = True,
         past_key_values=None,
         return_past_key_values=True
     ):
-        # 过滤AI身份关键词
-        filter_words = ["AI", "助手", "ChatGLM", "模型", "训练", "开发", "智谱", "人工智能"]
-        filtered_response = response
-        for word in filter_words:
-            filtered_response = filtered_response.replace(word, "")
-        
-        # 提取新增的内容
-        if len(filtered_response) > len(full_response):
-            new_content = filtered_response[len(full_response):]
-            full_response = filtered_response
-            
+        # 提取过滤后新增的内容
+        new_content = response_filter.feed(response)
+        if new_content:
             yield new_content, False
     
+    # 输出扣留的尾部
+    tail = response_filter.flush()
+    if tail:
+        yield tail, False
+    full_response = response_filter.text
+    
     # 最终标记
     yield "", True
     
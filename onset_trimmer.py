@@ -0,0 +1,216 @@
+# onset_trimmer.py
+"""
+TTS开头爆破音切除（向量化实现）
+- 带通滤波器系数按采样率只设计一次
+- 窗口能量用reshape得到的分窗视图一次算完，不再逐窗循环
+- StreamingOnsetTrimmer：流式版本，只处理每段音频流的第一个块（切除上限按整句的预计长度计算）
+"""
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# 分析参数（样本数，与原实现保持一致）
+MIN_SAMPLES = 1600          # 小于该长度的音频不处理
+ENERGY_ANALYSIS = 1600      # 能量突变检测的分析长度
+ENERGY_WINDOW = 160         # 10ms窗口
+ENERGY_MAX_POS = 480        # 爆发点必须在前30ms内
+LOWFREQ_ANALYSIS = 800      # 低频检测的分析长度
+LOWFREQ_WINDOW = 80         # 5ms窗口
+LOWFREQ_BAND = (50, 200)    # 爆破音主要频率范围（Hz）
+EMPIRICAL_WINDOW = 400      # 25ms窗口
+SHAPE_ANALYSIS = 800        # 波形形状检测的分析长度
+SHAPE_RUN = 10              # 连续突变的检查长度
+MAX_CUT = 3200              # 最多切除200ms
+FADE_IN = 800               # 50ms淡入
+
+
+class OnsetTrimmer:
+    """爆破音切除器：综合四种检测结果决定切除点，并对切除后的开头做余弦淡入"""
+
+    # 带通滤波器系数缓存：采样率 → (b, a)；scipy不可用时为None
+    _bandpass_cache: Dict[int, Optional[Tuple[np.ndarray, np.ndarray]]] = {}
+    # 淡入曲线缓存：长度 → 曲线
+    _fade_cache: Dict[int, np.ndarray] = {}
+
+    def __init__(self, sample_rate: int = 16000, bit_depth: int = 16, verbose: bool = True):
+        self.sample_rate = sample_rate
+        self.dtype = np.int16 if bit_depth == 16 else np.int32
+        self.verbose = verbose
+        self._bandpass = self._get_bandpass(sample_rate)
+
+    # ===================== 预计算 =====================
+    @classmethod
+    def _get_bandpass(cls, sample_rate: int):
+        """获取（必要时设计）该采样率下的巴特沃斯带通滤波器"""
+        if sample_rate not in cls._bandpass_cache:
+            try:
+                from scipy import signal
+                nyquist = sample_rate / 2
+                cls._bandpass_cache[sample_rate] = signal.butter(
+                    4,
+                    [LOWFREQ_BAND[0] / nyquist, LOWFREQ_BAND[1] / nyquist],
+                    btype='band'
+                )
+            except ImportError:
+                cls._bandpass_cache[sample_rate] = None
+        return cls._bandpass_cache[sample_rate]
+
+    @classmethod
+    def _get_fade(cls, length: int) -> np.ndarray:
+        """获取余弦淡入曲线"""
+        fade = cls._fade_cache.get(length)
+        if fade is None:
+            fade = np.cos(np.linspace(np.pi / 2, 0, length))
+            cls._fade_cache[length] = fade
+        return fade
+
+    @staticmethod
+    def _window_energies(segment: np.ndarray, window_size: int) -> np.ndarray:
+        """分窗平均能量（reshape为[窗口数, 窗口长度]的视图后按行求和）"""
+        num_windows = len(segment) // window_size
+        windows = segment[:num_windows * window_size].reshape(num_windows, window_size)
+        return np.sum(windows ** 2, axis=1) / window_size
+
+    # ===================== 四种检测 =====================
+    def _detect_energy_burst(self, samples: np.ndarray) -> int:
+        """能量突变检测：前30ms内能量突然增加的位置"""
+        segment = samples[:ENERGY_ANALYSIS].astype(np.float32)
+        energies = self._window_energies(segment, ENERGY_WINDOW)
+        energy_diffs = np.diff(energies)
+        threshold = np.max(energies) * 0.3
+
+        # 只有前30ms内的爆发点才算数（之后的爆发点不会返回切除位置）
+        max_index = min(len(energy_diffs), (ENERGY_MAX_POS + ENERGY_WINDOW - 1) // ENERGY_WINDOW)
+        hits = np.flatnonzero(energy_diffs[1:max_index] > threshold)
+        if len(hits) == 0:
+            return 0
+        i = hits[0] + 1
+        return max(0, (i - 1) * ENERGY_WINDOW)
+
+    def _detect_low_freq(self, samples: np.ndarray) -> int:
+        """低频检测：50-200Hz带通后第一个能量峰值"""
+        if self._bandpass is None:
+            return 0
+        from scipy import signal
+
+        segment = samples[:LOWFREQ_ANALYSIS].astype(np.float32)
+        b, a = self._bandpass
+        filtered = signal.filtfilt(b, a, segment)
+        energies = self._window_energies(filtered, LOWFREQ_WINDOW)
+        threshold = np.percentile(energies, 70)
+        hits = np.flatnonzero(energies > threshold)
+        if len(hits) == 0:
+            return 0
+        return max(0, (hits[0] - 1) * LOWFREQ_WINDOW)
+
+    def _empirical_cut(self, samples: np.ndarray) -> int:
+        """经验切除：第一个25ms窗口明显偏响时切25ms，否则切30ms"""
+        first_100ms = min(MIN_SAMPLES, len(samples))
+        num_windows = first_100ms // EMPIRICAL_WINDOW
+        windows = samples[:num_windows * EMPIRICAL_WINDOW].astype(np.float64).reshape(num_windows, EMPIRICAL_WINDOW)
+        rms = np.sqrt(np.mean(windows ** 2, axis=1))
+        if len(rms) >= 2 and rms[0] > rms[1] * 1.5:
+            return 400
+        return 480
+
+    def _detect_waveform_shape(self, samples: np.ndarray) -> int:
+        """波形形状检测：幅度突变且随后持续剧烈变化的位置"""
+        segment = samples[:SHAPE_ANALYSIS]
+        diff1 = np.abs(np.diff(segment))
+        threshold = np.percentile(diff1, 90)
+
+        n = len(diff1) - SHAPE_RUN
+        if n <= 0:
+            return 0
+        # 滑动平均：用累加和一次算出所有长度为SHAPE_RUN的窗口均值
+        cumsum = np.concatenate(([0.0], np.cumsum(diff1, dtype=np.float64)))
+        run_means = (cumsum[SHAPE_RUN:SHAPE_RUN + n] - cumsum[:n]) / SHAPE_RUN
+        hits = np.flatnonzero((diff1[:n] > threshold) & (run_means > threshold * 0.5))
+        if len(hits) == 0:
+            return 0
+        return max(0, int(hits[0]) - 20)
+
+    # ===================== 综合切除 =====================
+    def find_cut(self, samples: np.ndarray, total_samples: Optional[int] = None) -> int:
+        """
+        综合四种检测结果，返回切除的样本数
+        :param total_samples: 整句的样本数（samples只是开头一段时传入，用于计算20%的切除上限）
+        """
+        detection_results = [
+            pos for pos in (
+                self._detect_energy_burst(samples),
+                self._detect_low_freq(samples),
+                self._detect_waveform_shape(samples),
+            ) if pos > 0
+        ]
+        detection_results.append(self._empirical_cut(samples))
+
+        sorted_results = sorted(detection_results)
+        if len(sorted_results) >= 3:
+            start_index = sorted_results[len(sorted_results) // 2]
+        else:
+            start_index = int(np.mean(sorted_results))
+
+        # 确保不会切除太多（不超过整句的20%，且不超过200ms）
+        total = max(len(samples), total_samples or 0)
+        return min(start_index, min(total // 5, MAX_CUT))
+
+    def trim(self, pcm_data: bytes, total_samples: Optional[int] = None) -> bytes:
+        """切除开头爆破音并淡入，音频过短或切除后过短时返回原数据（total_samples见find_cut）"""
+        samples = np.frombuffer(pcm_data, dtype=self.dtype)
+        if len(samples) < MIN_SAMPLES:
+            return pcm_data
+
+        start_index = self.find_cut(samples, total_samples)
+        if start_index <= 0:
+            return pcm_data
+
+        processed_samples = samples[start_index:].copy()
+        fade_in_length = min(FADE_IN, len(samples) - start_index)
+        if fade_in_length > 0 and len(processed_samples) > fade_in_length:
+            fade_in = self._get_fade(fade_in_length)
+            processed_samples[:fade_in_length] = (processed_samples[:fade_in_length] * fade_in).astype(self.dtype)
+            if self.verbose:
+                print(f"  ✂️ 切除 {start_index} 样本 ({start_index/self.sample_rate*1000:.0f}ms)")
+
+        # 确保切除后音频不会太短
+        if len(processed_samples) > MIN_SAMPLES:
+            return processed_samples.tobytes()
+        return pcm_data
+
+
+class StreamingOnsetTrimmer:
+    """流式爆破音切除：只缓冲每段音频流开头的第一个块，切除后其余数据直接透传"""
+
+    def __init__(self, trimmer: OnsetTrimmer, first_block_bytes: int, expected_samples: Optional[int] = None):
+        """
+        :param expected_samples: 整句的预计样本数（切除上限按整句计算，而不是按首块）；None时按首块计算
+        """
+        self.trimmer = trimmer
+        self.first_block_bytes = first_block_bytes
+        self.expected_samples = expected_samples
+        self.reset()
+
+    def reset(self):
+        """开始新的音频流（新句子）"""
+        self._pending = b""
+        self._first_sent = False
+
+    def feed(self, pcm_data: bytes) -> bytes:
+        """输入一段PCM，返回可以立即输出的数据（首块未凑够时返回空）"""
+        if self._first_sent:
+            return pcm_data
+        self._pending += pcm_data
+        if len(self._pending) < self.first_block_bytes:
+            return b""
+        self._first_sent = True
+        first_block, self._pending = self._pending, b""
+        return self.trimmer.trim(first_block, self.expected_samples)
+
+    def flush(self) -> bytes:
+        """音频流结束：整段都不足首块时整体处理后输出（此时长度已知，不用预计值）"""
+        if self._first_sent or not self._pending:
+            return b""
+        self._first_sent = True
+        first_block, self._pending = self._pending, b""
+        return self.trimmer.trim(first_block)
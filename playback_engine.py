@@ -0,0 +1,237 @@
+# playback_engine.py
+"""
+回调模式播放引擎：声卡回调从预分配的环形缓冲取数据，写入方只负责往缓冲里填PCM
+- 输出流在各轮对话之间保持打开（空闲时输出静音），只有音频格式变化时才重新打开，轮次之间没有开关流的延迟和爆音
+- 抖动缓冲（jitter buffer）：每轮开始（或欠载后）先攒够jitter_target_ms再开始出声；整轮都已写入时不必等
+- 欠载（缓冲被播空而本轮尚未结束）计数、缓冲时长、播放位置都可随时查询，供调度策略作为反馈
+- flush()立即丢弃缓冲，下一次回调起输出静音（停止延迟≤一个回调周期）
+"""
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from latency_tracer import tracer
+
+# open_stream(sample_rate, channels, sample_width, frames_per_buffer, render) → 流对象（需有close()）
+# render(frame_count, underflow) → 恰好frame_count帧的PCM字节
+StreamOpener = Callable[[int, int, int, int, Callable[[int, bool], bytes]], Any]
+
+
+class PlaybackEngine:
+    """回调驱动的无缝播放（环形缓冲 + 抖动缓冲）"""
+
+    def __init__(self, open_stream: StreamOpener, sample_rate: int, channels: int = 1, sample_width: int = 2,
+                 buffer_seconds: float = 10.0, jitter_target_ms: float = 80, frames_per_buffer: int = 512):
+        """
+        :param open_stream: 打开回调模式输出流的函数（见StreamOpener）
+        :param buffer_seconds: 环形缓冲容量（秒），写满时写入方等待
+        :param jitter_target_ms: 开始出声前至少缓冲的音频时长
+        :param frames_per_buffer: 每次回调的帧数（决定flush的停止延迟）
+        """
+        self.open_stream = open_stream
+        self.buffer_seconds = buffer_seconds
+        self.jitter_target_ms = jitter_target_ms
+        self.frames_per_buffer = frames_per_buffer
+        self._cond = threading.Condition()
+        self._stream = None
+
+        # 统计
+        self.underruns = 0          # 本轮尚未结束时缓冲被播空的次数
+        self.device_underflows = 0  # 声卡报告的输出欠载次数
+        self.callbacks = 0
+        self.played_seconds = 0.0   # 累计播放的音频时长（不含静音）
+        self.silence_seconds = 0.0  # 累计输出的静音时长
+        self.reopens = 0            # 因格式变化重新打开流的次数
+        self._setup(sample_rate, channels, sample_width)
+
+    # ===================== 流与格式 =====================
+    def _setup(self, sample_rate: int, channels: int, sample_width: int):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.frame_bytes = channels * sample_width
+        self.bytes_per_second = sample_rate * self.frame_bytes
+        capacity = int(self.buffer_seconds * sample_rate) * self.frame_bytes
+        self._ring = np.zeros(capacity, dtype=np.uint8)
+        self._capacity = capacity
+        self._jitter_bytes = int(sample_rate * self.jitter_target_ms / 1000) * self.frame_bytes
+        self._write = 0    # 累计写入字节数
+        self._read = 0     # 累计读出字节数
+        self._playing = False                             # False：抖动缓冲攒数据中
+        self._segments: Deque[Tuple[int, Optional[int]]] = deque()  # (段末位置, 轮次)
+        self._turn_ends: Deque[Tuple[int, Optional[int]]] = deque()  # (轮次结束位置, 轮次)
+        self._turn_open = False                           # 已写入音频、尚未播到结束标记
+        self.current_turn_id: Optional[int] = None
+        self.turn_played_seconds = 0.0
+        self._stream = self.open_stream(sample_rate, channels, sample_width, self.frames_per_buffer, self.render)
+
+    def matches(self, sample_rate: int, channels: int, sample_width: int) -> bool:
+        return (sample_rate, channels, sample_width) == (self.sample_rate, self.channels, self.sample_width)
+
+    def reconfigure(self, sample_rate: int, channels: int, sample_width: int,
+                    abort: Optional[threading.Event] = None) -> bool:
+        """音频格式变化：等缓冲播完后按新格式重新打开流（被abort打断时返回False）"""
+        if self.matches(sample_rate, channels, sample_width):
+            return True
+        with self._cond:
+            # 剩余数据可能不足抖动缓冲目标：在写入位置补一个结束标记，render不再等抖动缓冲、直接播完
+            if self._write > self._read and not (self._turn_ends and self._turn_ends[-1][0] == self._write):
+                self._turn_ends.append((self._write, None))
+            while self._write > self._read:
+                if abort is not None and abort.is_set():
+                    return False
+                self._cond.wait(0.01)
+        self._close_stream()
+        self.reopens += 1
+        self._setup(sample_rate, channels, sample_width)
+        return True
+
+    def _close_stream(self):
+        if self._stream is not None:
+            try:
+                self._stream.close()
+            except Exception:
+                pass
+            self._stream = None
+
+    def close(self):
+        """关闭输出流"""
+        self._close_stream()
+
+    # ===================== 写入 =====================
+    def write(self, pcm_data: bytes, turn_id: Optional[int] = None, abort: Optional[threading.Event] = None) -> bool:
+        """写入PCM（缓冲满时等待播放腾出空间），被abort打断时返回False"""
+        src = np.frombuffer(pcm_data, dtype=np.uint8)
+        src = src[:len(src) // self.frame_bytes * self.frame_bytes]
+        offset = 0
+        while offset < len(src):
+            with self._cond:
+                space = self._capacity - (self._write - self._read)
+                n = min(space, len(src) - offset)
+                if n <= 0:
+                    if abort is not None and abort.is_set():
+                        return False
+                    self._cond.wait(0.01)
+                    continue
+                start = self._write % self._capacity
+                first = min(n, self._capacity - start)
+                self._ring[start:start + first] = src[offset:offset + first]
+                if n > first:
+                    self._ring[:n - first] = src[offset + first:offset + n]
+                self._write += n
+                if self._segments and self._segments[-1][1] == turn_id:
+                    self._segments[-1] = (self._write, turn_id)
+                else:
+                    self._segments.append((self._write, turn_id))
+                self._turn_open = True
+            offset += n
+            if abort is not None and abort.is_set():
+                return False
+        return True
+
+    def end_turn(self, turn_id: Optional[int] = None):
+        """本轮音频已全部写入（抖动缓冲不再等待，播到此处时本轮结束）"""
+        with self._cond:
+            self._turn_ends.append((self._write, turn_id))
+
+    def flush(self):
+        """丢弃缓冲中尚未播放的音频"""
+        with self._cond:
+            self._read = self._write
+            self._segments.clear()
+            self._turn_ends.clear()
+            self._playing = False
+            self._turn_open = False
+            self._cond.notify_all()
+
+    # ===================== 回调 =====================
+    def render(self, frame_count: int, underflow: bool = False) -> bytes:
+        """声卡回调：取出frame_count帧（不足部分补静音）"""
+        want = frame_count * self.frame_bytes
+        completed: List[Optional[int]] = []
+        started_turn = None
+        with self._cond:
+            self.callbacks += 1
+            if underflow:
+                self.device_underflows += 1
+            available = self._write - self._read
+            ends_pending = bool(self._turn_ends) and self._turn_ends[0][0] > self._read
+            if not self._playing and available > 0 and (available >= self._jitter_bytes or ends_pending):
+                self._playing = True
+
+            n = min(available, want) if self._playing else 0
+            if n:
+                start = self._read % self._capacity
+                first = min(n, self._capacity - start)
+                data = self._ring[start:start + first].tobytes()
+                if n > first:
+                    data += self._ring[:n - first].tobytes()
+                self._read += n
+                self.played_seconds += n / self.bytes_per_second
+                # 当前播放的轮次
+                turn_id = self._segments[0][1] if self._segments else None
+                if turn_id != self.current_turn_id:
+                    self.current_turn_id = turn_id
+                    self.turn_played_seconds = 0.0
+                    started_turn = turn_id
+                self.turn_played_seconds += n / self.bytes_per_second
+                while self._segments and self._segments[0][0] <= self._read:
+                    self._segments.popleft()
+            else:
+                data = b""
+
+            while self._turn_ends and self._turn_ends[0][0] <= self._read:
+                completed.append(self._turn_ends.popleft()[1])
+            if completed and self._write == self._read:
+                self._turn_open = False
+
+            if self._playing and self._write == self._read:
+                # 缓冲被播空：正好播到轮次结束是正常结束，否则是欠载，重新攒抖动缓冲
+                if n < want and not completed:
+                    self.underruns += 1
+                self._playing = False
+            if n < want:
+                self.silence_seconds += (want - n) / self.bytes_per_second
+            self._cond.notify_all()
+
+        if started_turn is not None:
+            tracer.mark(started_turn, "first_playback")
+        for turn_id in completed:
+            tracer.mark(turn_id, "turn_complete")
+        return data + bytes(want - n) if n < want else data
+
+    # ===================== 状态 =====================
+    @property
+    def buffered_duration(self) -> float:
+        """缓冲中尚未播放的音频时长（秒）"""
+        with self._cond:
+            return (self._write - self._read) / self.bytes_per_second
+
+    @property
+    def position(self) -> float:
+        """累计播放的音频时长（秒，不含静音）"""
+        return self.played_seconds
+
+    @property
+    def speaking(self) -> bool:
+        """本轮音频已开始写入、尚未播到结束标记"""
+        with self._cond:
+            return self._turn_open or self._write > self._read
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取播放统计"""
+        with self._cond:
+            buffered = (self._write - self._read) / self.bytes_per_second
+        return {
+            "format": f"{self.sample_rate}Hz/{self.channels}ch/{self.sample_width * 8}bit",
+            "buffered_ms": round(buffered * 1000, 1),
+            "jitter_target_ms": self.jitter_target_ms,
+            "position_s": round(self.position, 3),
+            "underruns": self.underruns,
+            "device_underflows": self.device_underflows,
+            "callbacks": self.callbacks,
+            "silence_s": round(self.silence_seconds, 3),
+            "reopens": self.reopens,
+        }
@@ -26,6 +26,15 @@ class RealtimeTTSProcessor:
                                 ##print("🎵 启动实时TTS处理器...")
             sentence_count = 0
             
+            # TTS模块带预合成调度器时：并发合成后续句子，按顺序输出
+            scheduler = getattr(self.tts_module, "lookahead_scheduler", None)
+            if scheduler is not None:
+                try:
+                    scheduler.run(input_queue, output_queue, is_running=lambda: self.is_running)
+                finally:
+                    self.is_running = False
+                return
+            
             try:
                 while self.is_running:
                     try:
@@ -43,7 +52,8 @@ class RealtimeTTSProcessor:
                                 pcm_data=b"",
                                 sample_rate=self.tts_module.sample_rate,
                                 channels=self.tts_module.channels,
-                                is_finish=True
+                                is_finish=True,
+                                turn_id=text_data.turn_id
                             ))
                                 ##print(f"✅ TTS处理完成，共合成{sentence_count}个句子")
                             break
@@ -61,7 +71,7 @@ class RealtimeTTSProcessor:
                         # 合成当前句子
                         try:
                             # 使用TTS模块的process方法
-                            audio_data = self.tts_module.process(TextData(text=text, is_finish=True))
+                            audio_data = self.tts_module.process(TextData(text=text, is_finish=True, turn_id=text_data.turn_id))
                             
                             elapsed = time.time() - start_time
                             
@@ -5,6 +5,7 @@
 import queue
 import time
 from base_interface import TextData
+from sentence_segmenter import IncrementalSentenceSegmenter
 
 class SentenceProcessor:
     """句子处理器：累积ASR片段，形成完整句子"""
@@ -13,8 +14,10 @@ class SentenceProcessor:
         self.min_length = min_length
         self.max_silence = max_silence
         self.buffer = ""
+        self.buffer_turn_id = None  # 缓存文本所属的对话轮次（延迟追踪用）
         self.last_update = time.time()
-        self.sentence_endings = ['。', '！', '？', '；', '.', '!', '?', ';']
+        # 句末判定：增量扫描（只扫描新追加的文本），处理引号、省略号和小数点
+        self.segmenter = IncrementalSentenceSegmenter(min_length=1, max_length=None)
     
     def process(self, text_data: TextData, output_queue: queue.Queue):
         """处理ASR文本，累积成完整句子后输出"""
@@ -35,10 +38,13 @@ class SentenceProcessor:
         
         # 更新缓存
         self.buffer += text
+        self.segmenter.add_text(text)
+        if self.buffer_turn_id is None:
+            self.buffer_turn_id = text_data.turn_id
         self.last_update = time.time()
         
-        # 检查句子完整性
-        if self._is_complete_sentence():
+        # ASR已断句（is_finish）或缓存构成完整句子时立即输出
+        if text_data.is_finish or self._is_complete_sentence():
             self._output_sentence(self.buffer, output_queue, False)
             self.buffer = ""
         
@@ -66,8 +72,8 @@ class SentenceProcessor:
         if not self.buffer:
             return False
         
-        # 以句子结束标点结尾
-        if self.buffer[-1] in self.sentence_endings:
+        # 以句子结束标点结尾（可带右引号/右括号）
+        if self.segmenter.at_boundary:
             return True
         
         # 长度足够且包含疑问词
@@ -89,11 +95,15 @@ class SentenceProcessor:
         if clean_sentence:
             reason = "超时" if is_timeout else "完整"
             ##print(f"📦 输出{reason}句子: {clean_sentence}")
-            output_queue.put(TextData(text=clean_sentence, is_finish=True))
+            output_queue.put(TextData(text=clean_sentence, is_finish=True, turn_id=self.buffer_turn_id))
+        self.buffer_turn_id = None
+        self.segmenter.reset()
     
     def reset(self):
         """重置处理器状态"""
         self.buffer = ""
+        self.buffer_turn_id = None
+        self.segmenter.reset()
         self.last_update = time.time()
 
 
@@ -0,0 +1,157 @@
+# sentence_segmenter.py
+"""
+增量分句：LLM逐token输出时切出完整句子送入TTS
+- 维护扫描游标，每个字符只扫描一次，已输出的句子不再重新扫描
+- 连续的结束符（？！、……、...）作为一个整体，紧随其后的右引号/右括号归入当前句
+- 小数点（3.14）不作为句子边界
+- 未达到min_length的句子与下一句合并；待输出文本达到max_length仍无结束符时在最后一个弱结束符（逗号等）处切分，
+  没有弱结束符时正好切在max_length处——输出的每句都不超过max_length（一次追加很长的文本时切成多句）
+- 设置soft_length时，待输出文本达到该长度后遇到弱结束符即切分（首句尽早送入TTS，见chunk_policy）
+结束符后面可能还有结束符或右引号，因此要等看到下一个字符（或flush）才切分。
+"""
+from typing import Any, Dict, List, Optional
+
+# 句子结束符
+SENTENCE_ENDINGS = set("。！？!?；;….")
+# 弱结束符（超长时的切分点）
+WEAK_ENDINGS = set("，,、：:")
+# 结束符之后仍属于当前句的右引号/右括号
+CLOSING_MARKS = set("”’」』）)】》\"'")
+
+
+class IncrementalSentenceSegmenter:
+    """流式文本 → 完整句子"""
+
+    def __init__(self, min_length: int = 3, max_length: Optional[int] = 40, soft_length: Optional[int] = None):
+        """
+        :param min_length: 句子的最短长度（字符），更短的与下一句合并
+        :param max_length: 没有结束符时待输出文本的最大长度，None表示不限制
+        :param soft_length: 达到该长度后在弱结束符处切分，None表示只在结束符处切分
+        """
+        self.min_length = min_length
+        self.max_length = max_length
+        self.soft_length = soft_length
+        # 统计
+        self.chars_scanned = 0
+        self.sentences_emitted = 0
+        self.forced_splits = 0
+        self.reset()
+
+    def reset(self):
+        """丢弃待输出的文本"""
+        self._buffer = ""
+        self._start = 0        # 待输出句子的起点
+        self._cursor = 0       # 下一个要扫描的位置
+        self._last_weak = -1   # 待输出部分中最后一个弱结束符的位置
+        self.at_boundary = False  # 扫描停在缓冲末尾的结束符上（待输出文本以完整句子结尾）
+
+    @property
+    def pending(self) -> str:
+        """尚未输出的文本"""
+        return self._buffer[self._start:]
+
+    # ===================== 输入 =====================
+    def add_text(self, text: str) -> List[str]:
+        """追加文本，返回新切出的完整句子"""
+        if not text:
+            return []
+        self._buffer += text
+        sentences: List[str] = []
+        self._scan(sentences)
+
+        # 压缩缓冲：丢掉已输出的部分
+        if self._start:
+            self._buffer = self._buffer[self._start:]
+            self._cursor -= self._start
+            self._last_weak = self._last_weak - self._start if self._last_weak >= self._start else -1
+            self._start = 0
+        return sentences
+
+    def flush(self) -> str:
+        """文本结束：返回剩余的全部文本（可能短于min_length）"""
+        remaining = self.pending.strip()
+        self.reset()
+        return remaining
+
+    @classmethod
+    def split(cls, text: str, min_length: int = 1, max_length: Optional[int] = None) -> List[str]:
+        """一次性切分完整文本"""
+        segmenter = cls(min_length=min_length, max_length=max_length)
+        sentences = segmenter.add_text(text)
+        remaining = segmenter.flush()
+        if remaining:
+            sentences.append(remaining)
+        return sentences
+
+    # ===================== 内部 =====================
+    def _scan(self, sentences: List[str]):
+        buf = self._buffer
+        n = len(buf)
+        i = self._cursor
+        self.at_boundary = False
+        while i < n:
+            self._limit(i, sentences)
+            ch = buf[i]
+            if ch in SENTENCE_ENDINGS:
+                if ch == "." and i > 0 and buf[i - 1].isdigit():
+                    if i + 1 >= n:
+                        break  # 可能是小数点，等下一个字符
+                    if buf[i + 1].isdigit():
+                        i += 1
+                        continue
+                j = i + 1
+                while j < n and buf[j] in SENTENCE_ENDINGS:
+                    j += 1
+                while j < n and buf[j] in CLOSING_MARKS:
+                    j += 1
+                if self.max_length is not None and j - self._start > self.max_length:
+                    j = self._start + self.max_length  # 超长的结束符串也不超过上限
+                elif j >= n:
+                    self.at_boundary = True  # 后面可能还有结束符/右引号，等下一个字符
+                    break
+                self._emit(j, sentences)
+                i = j
+                continue
+            if ch in WEAK_ENDINGS:
+                self._last_weak = i
+                if self.soft_length is not None and i + 1 - self._start >= self.soft_length:
+                    self._emit(i + 1, sentences, force=True)
+            i += 1
+        if i >= n:
+            self._limit(i, sentences)
+        self.chars_scanned += i - self._cursor
+        self._cursor = i
+
+    def _limit(self, i: int, sentences: List[str]):
+        """待输出文本[_start, i)达到max_length时强制切分，直到剩余部分短于max_length（上限可能在两次追加之间调小）"""
+        while self.max_length is not None and i - self._start >= self.max_length:
+            # 最后一个弱结束符之后没有其他弱结束符，切分后不需要重新查找
+            cut = self._last_weak + 1 if self._last_weak >= self._start else self._start + self.max_length
+            self.forced_splits += 1
+            self._emit(cut, sentences, force=True)
+
+    def _emit(self, end: int, sentences: List[str], force: bool = False):
+        """输出[_start, end)（太短且非强制切分时保留，与下一句合并）"""
+        sentence = self._buffer[self._start:end].strip()
+        if not sentence:
+            self._start = end
+            return
+        if len(sentence) < self.min_length and not force:
+            return
+        sentences.append(sentence)
+        self.sentences_emitted += 1
+        self._start = end
+        self._last_weak = -1
+        self._on_emit(sentence)
+
+    def _on_emit(self, sentence: str):
+        """每输出一句后调用（子类据此调整下一句的长度限制）"""
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取分句统计"""
+        return {
+            "chars_scanned": self.chars_scanned,
+            "sentences": self.sentences_emitted,
+            "forced_splits": self.forced_splits,
+            "pending_chars": len(self.pending),
+        }
@@ -0,0 +1,179 @@
+# speculative_llm.py
+"""
+推测式LLM启动：ASR的中间识别结果稳定一段时间后就提前提交生成请求
+- 用户通常在说完后还有0.5~1秒静音才会得到最终识别结果，再经过句子缓存才进入LLM
+- 中间结果在stable_time内不再变化时，用它提前开始prefill和解码（生成结果先留在请求里，不送TTS）
+- 最终识别结果到达时：文本一致（忽略标点和空白）则直接沿用该请求（命中），否则取消并重新生成（未命中）
+- 中间结果在推测开始后又发生变化时，立即取消旧的推测，释放GPU
+"""
+import re
+import time
+import threading
+from typing import Any, Callable, Dict, Optional
+
+# 比较识别结果时忽略的字符：标点、空白
+_IGNORED_CHARS = re.compile(r"[\W_]+")
+
+
+def normalize_transcript(text: str) -> str:
+    """识别结果归一化（中间结果没有标点，最终结果带标点）"""
+    return _IGNORED_CHARS.sub("", text or "").lower()
+
+
+class _Speculation:
+    """一次推测：对应的中间结果及提交的请求"""
+    __slots__ = ("text", "key", "request", "start_time")
+
+    def __init__(self, text: str, key: str, request):
+        self.text = text
+        self.key = key
+        self.request = request
+        self.start_time = time.monotonic()
+
+
+class SpeculativeLLM:
+    """根据稳定的中间识别结果提前启动LLM生成"""
+
+    def __init__(self, start_fn: Callable[[str], Any], stable_time: float = 0.3, min_chars: int = 4,
+                 poll_interval: float = 0.05, verbose: bool = True):
+        """
+        :param start_fn: 用识别文本提交生成请求的函数，返回GenerationRequest（不能取代正在进行的请求）
+        :param stable_time: 中间结果保持不变多久（秒）后开始推测
+        :param min_chars: 中间结果（归一化后）至少多少字才推测
+        :param poll_interval: 稳定性检查间隔（秒）
+        """
+        self.start_fn = start_fn
+        self.stable_time = stable_time
+        self.min_chars = min_chars
+        self.poll_interval = poll_interval
+        self.verbose = verbose
+
+        self._partial = ""                 # 最新的中间识别结果
+        self._partial_key = ""
+        self._changed_at = time.monotonic()
+        self._speculation: Optional[_Speculation] = None
+        self._lock = threading.Lock()
+
+        # 统计
+        self.started = 0          # 发起的推测次数
+        self.hits = 0             # 最终结果与推测一致，直接沿用
+        self.misses = 0           # 最终结果不一致，丢弃后重新生成
+        self.superseded = 0       # 推测后中间结果又变化，提前取消
+        self.no_speculation = 0   # 最终结果到达时没有推测
+        self.latency_saved = 0.0  # 命中时提前开始的时间总和（秒）
+        self.wasted_time = 0.0    # 被丢弃的推测从提交到取消的时间总和（秒）
+
+        self._running = True
+        self._monitor = threading.Thread(target=self._monitor_loop, name="推测式LLM", daemon=True)
+        self._monitor.start()
+
+    # ===================== 中间结果 =====================
+    def on_partial(self, text: str):
+        """ASR产出新的中间识别结果（整句累计文本）时调用"""
+        key = normalize_transcript(text)
+        with self._lock:
+            if key == self._partial_key:
+                return
+            self._partial, self._partial_key = text, key
+            self._changed_at = time.monotonic()
+            # 推测所依据的文本已过期
+            if self._speculation is not None and self._speculation.key != key:
+                self._discard("speculation_superseded")
+                self.superseded += 1
+
+    def _monitor_loop(self):
+        while self._running:
+            time.sleep(self.poll_interval)
+            with self._lock:
+                ready = (
+                    self._speculation is None
+                    and len(self._partial_key) >= self.min_chars
+                    and time.monotonic() - self._changed_at >= self.stable_time
+                )
+                text, key = self._partial, self._partial_key
+            if ready:
+                self._start(text, key)
+
+    def _start(self, text: str, key: str):
+        # 提交（含记忆检索和KV前缀prefill）不持锁，避免阻塞ASR线程
+        try:
+            request = self.start_fn(text)
+        except Exception as e:
+            print(f"⚠️ 推测式生成提交失败: {e}")
+            with self._lock:
+                if self._partial_key == key:
+                    self._partial_key = ""  # 等下一次中间结果再试
+            return
+        with self._lock:
+            # 提交期间中间结果已变化或最终结果已到达
+            if self._partial_key != key or self._speculation is not None:
+                request.cancel("speculation_superseded")
+                return
+            self._speculation = _Speculation(text, key, request)
+            self.started += 1
+        if self.verbose:
+            print(f"\n🔮 推测式生成开始: {text}")
+
+    def _discard(self, reason: str):
+        speculation = self._speculation
+        self._speculation = None
+        speculation.request.cancel(reason)
+        self.wasted_time += time.monotonic() - speculation.start_time
+
+    # ===================== 最终结果 =====================
+    def take(self, final_text: str):
+        """
+        最终识别结果到达：命中时返回推测的请求（调用方直接读取其增量），否则返回None（调用方重新提交）
+        """
+        key = normalize_transcript(final_text)
+        with self._lock:
+            speculation = self._speculation
+            self._partial, self._partial_key = "", ""
+            self._changed_at = time.monotonic()
+            if speculation is None:
+                self.no_speculation += 1
+                return None
+            # 文本不一致，或推测请求已被取消（打断/超时）
+            if speculation.key != key or speculation.request.stop_reason is not None:
+                self._discard("speculation_miss")
+                self.misses += 1
+                if self.verbose:
+                    print(f"🔮 推测未命中，重新生成（推测: {speculation.text}）")
+                return None
+            self._speculation = None
+            saved = time.monotonic() - speculation.start_time
+            self.hits += 1
+            self.latency_saved += saved
+        if self.verbose:
+            print(f"🔮 推测命中，提前 {saved * 1000:.0f}ms 开始生成")
+        return speculation.request
+
+    def reset(self):
+        """取消进行中的推测并清空中间结果"""
+        with self._lock:
+            if self._speculation is not None:
+                self._discard("cancelled")
+            self._partial, self._partial_key = "", ""
+
+    # ===================== 统计与关闭 =====================
+    def get_stats(self) -> Dict[str, Any]:
+        """获取推测统计"""
+        with self._lock:
+            decided = self.hits + self.misses
+            return {
+                "started": self.started,
+                "hits": self.hits,
+                "misses": self.misses,
+                "superseded": self.superseded,
+                "no_speculation": self.no_speculation,
+                "hit_rate": round(self.hits / decided, 3) if decided else 0.0,
+                "mean_latency_saved_ms": round(self.latency_saved / self.hits * 1000, 1) if self.hits else 0.0,
+                "total_latency_saved_s": round(self.latency_saved, 3),
+                "wasted_generation_s": round(self.wasted_time, 3),
+            }
+
+    def shutdown(self):
+        """停止稳定性检查线程并取消进行中的推测"""
+        self._running = False
+        self.reset()
+        self._monitor.join(timeout=1)
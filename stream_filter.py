@@ -0,0 +1,155 @@
+# stream_filter.py
+"""
+流式身份关键词过滤（Aho-Corasick多模式匹配）
+LLM每产出一段新文本只处理这段新文本，不再对整段累计回复反复replace：
+- 所有关键词编译为一个自动机，逐字符推进，总开销与回复长度成线性
+- 只扣留"可能是关键词开头"的尾部字符（最多 最长关键词长度-1 个），其余立即输出
+- 匹配到关键词时直接丢弃，不会因为前缀长度变化而吞字或重复
+"""
+from typing import Dict, Iterable, List, Tuple
+
+# 默认过滤的AI身份关键词
+DEFAULT_FILTER_WORDS = ["AI", "助手", "ChatGLM", "模型", "训练", "开发", "智谱", "人工智能"]
+
+
+class WordFilterAutomaton:
+    """编译好的关键词自动机（只读，可在多个流之间共享）"""
+
+    # 编译缓存：关键词元组 → 自动机
+    _compiled: Dict[Tuple[str, ...], "WordFilterAutomaton"] = {}
+
+    def __init__(self, words: Iterable[str]):
+        self.words = tuple(w for w in dict.fromkeys(words) if w)
+        self.max_length = max((len(w) for w in self.words), default=0)
+        # goto[节点] = {字符: 子节点}；depth = 节点对应前缀的长度；
+        # match_length = 以该节点结尾的最长关键词长度（0表示无匹配）
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.depth: List[int] = [0]
+        self.match_length: List[int] = [0]
+        self._build()
+
+    @classmethod
+    def get(cls, words: Iterable[str]) -> "WordFilterAutomaton":
+        """获取（必要时编译）关键词集合对应的自动机"""
+        key = tuple(words)
+        automaton = cls._compiled.get(key)
+        if automaton is None:
+            automaton = cls(key)
+            cls._compiled[key] = automaton
+        return automaton
+
+    def _build(self):
+        # 1. 字典树
+        for word in self.words:
+            node = 0
+            for ch in word:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.depth.append(self.depth[node] + 1)
+                    self.match_length.append(0)
+                    self.goto[node][ch] = nxt
+                node = nxt
+            self.match_length[node] = max(self.match_length[node], len(word))
+
+        # 2. BFS构建失配指针，并沿失配链继承匹配长度
+        queue = list(self.goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[child] = self.goto[f].get(ch, 0)
+                self.match_length[child] = max(self.match_length[child], self.match_length[self.fail[child]])
+
+    def step(self, node: int, ch: str) -> int:
+        """自动机推进一个字符"""
+        while node and ch not in self.goto[node]:
+            node = self.fail[node]
+        return self.goto[node].get(ch, 0)
+
+
+class StreamingWordFilter:
+    """单个回复流的过滤状态：feed(新文本) → 可立即输出的文本，flush() → 扣留的尾部"""
+
+    def __init__(self, words: Iterable[str] = DEFAULT_FILTER_WORDS):
+        self.automaton = WordFilterAutomaton.get(words)
+        self.reset()
+
+    def reset(self):
+        """开始新的回复"""
+        self._node = 0
+        self._pending = ""  # 可能属于某个关键词的尾部字符（长度 = 当前节点深度）
+        self.removed = 0    # 本回复中删除的关键词个数
+
+    def feed(self, text: str) -> str:
+        """输入新产出的文本，返回过滤后可以立即输出的部分"""
+        automaton = self.automaton
+        if not automaton.words:
+            return text
+
+        output = []
+        pending = self._pending
+        node = self._node
+        for ch in text:
+            node = automaton.step(node, ch)
+            pending += ch
+            match = automaton.match_length[node]
+            if match:
+                # 删除匹配到的关键词，之前扣留的字符不可能再构成匹配，直接输出
+                output.append(pending[:-match])
+                pending = ""
+                node = 0
+                self.removed += 1
+                continue
+            # 超出当前匹配深度的字符已经安全
+            safe = len(pending) - automaton.depth[node]
+            if safe > 0:
+                output.append(pending[:safe])
+                pending = pending[safe:]
+
+        self._pending = pending
+        self._node = node
+        return "".join(output)
+
+    def flush(self) -> str:
+        """回复结束：输出扣留的尾部字符"""
+        tail = self._pending
+        self._pending = ""
+        self._node = 0
+        return tail
+
+    def filter_text(self, text: str) -> str:
+        """一次性过滤整段文本"""
+        self.reset()
+        return self.feed(text) + self.flush()
+
+
+class StreamingResponseFilter:
+    """把stream_chat产出的累计回复转换为过滤后的增量"""
+
+    def __init__(self, words: Iterable[str] = DEFAULT_FILTER_WORDS):
+        self.word_filter = StreamingWordFilter(words)
+        self._raw_length = 0
+        self.text = ""  # 过滤后的累计回复
+
+    def feed(self, response: str) -> str:
+        """输入stream_chat的累计回复，返回过滤后新增的文本"""
+        delta = response[self._raw_length:]
+        self._raw_length = max(self._raw_length, len(response))
+        new_content = self.word_filter.feed(delta) if delta else ""
+        self.text += new_content
+        return new_content
+
+    def flush(self) -> str:
+        """回复结束：返回扣留的尾部"""
+        tail = self.word_filter.flush()
+        self.text += tail
+        return tail
@@ -0,0 +1,132 @@
+# streaming_punctuator.py
+"""
+增量标点恢复：CT-Transformer只在有界的滑动窗口上运行
+- 每次输入整句的无标点累计文本；已提交（滚出窗口）的部分直接复用，不再送入模型
+- 窗口超过window_chars时，把窗口前部提交（优先在模型给出的标点处切分），只保留context_chars作为下一次的上文
+- 模型结果按窗口文本缓存（LRU），同一段文本在停顿判定和最终输出时只算一次
+单次调用的开销只与窗口长度有关，不再随整句长度增长。
+"""
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Any, List, Optional
+
+# 模型可能插入的标点
+PUNCTUATION_MARKS = set("，。？！、；：,.?!;:")
+# 适合作为提交边界的标点
+BOUNDARY_MARKS = set("，。？！；,.?!;")
+_LEADING_MARKS = "".join(PUNCTUATION_MARKS)
+
+
+class StreamingPunctuator:
+    """对不断增长的无标点文本做增量标点恢复"""
+
+    def __init__(self, punc_fn: Callable[[str], str], window_chars: int = 40, context_chars: int = 15,
+                 cache_size: int = 256):
+        """
+        :param punc_fn: 标点函数：无标点文本 → 带标点文本（如CT-Transformer）
+        :param window_chars: 送入模型的最大未提交文本长度（字符）
+        :param context_chars: 提交后保留在窗口中的上文长度（字符）
+        :param cache_size: 缓存的窗口结果条数
+        """
+        if context_chars >= window_chars:
+            raise ValueError("context_chars必须小于window_chars")
+        self.punc_fn = punc_fn
+        self.window_chars = window_chars
+        self.context_chars = context_chars
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # 统计
+        self.calls = 0
+        self.model_calls = 0
+        self.cache_hits = 0
+        self.model_chars = 0  # 累计送入模型的字符数
+        self.reset()
+
+    def reset(self):
+        """开始新的句子"""
+        self._raw_committed = ""   # 已提交部分的原文
+        self.committed_text = ""   # 已提交部分的带标点文本（不会再改变）
+
+    # ===================== 标点 =====================
+    def punctuate(self, text: str) -> str:
+        """输入整句无标点累计文本，返回带标点文本"""
+        with self._lock:
+            self.calls += 1
+            if not text.startswith(self._raw_committed):
+                self.reset()  # 新的句子（或识别结果回改了已提交部分）
+            window = text[len(self._raw_committed):]
+            if not window:
+                return self.committed_text
+
+            punctuated = self._punctuate_window(window)
+            # 窗口过长：提交前部，保留上文
+            while len(window) > self.window_chars:
+                marks = self._align(window, punctuated)
+                if marks is None:
+                    break  # 模型改写了原文，无法对齐：本次不提交
+                cut = self._choose_cut(window, marks)
+                self._raw_committed += window[:cut]
+                self.committed_text += self._render(window[:cut], marks, 0, cut)
+                window = window[cut:]
+                punctuated = self._punctuate_window(window)
+            if self.committed_text:
+                punctuated = punctuated.lstrip(_LEADING_MARKS)  # 已提交部分以标点结尾，去掉窗口开头多余的标点
+            return self.committed_text + punctuated
+
+    def _punctuate_window(self, window: str) -> str:
+        cached = self._cache.get(window)
+        if cached is not None:
+            self._cache.move_to_end(window)
+            self.cache_hits += 1
+            return cached
+        result = self.punc_fn(window) or window
+        self.model_calls += 1
+        self.model_chars += len(window)
+        self._cache[window] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    # ===================== 对齐与切分 =====================
+    @staticmethod
+    def _align(raw: str, punctuated: str) -> Optional[List[str]]:
+        """把模型输出对齐回原文：marks[i] = 原文第i个字符之后插入的标点（对不上时返回None）"""
+        marks = [""] * len(raw)
+        i = 0
+        for ch in punctuated:
+            if i < len(raw) and ch == raw[i]:
+                i += 1
+            elif ch in PUNCTUATION_MARKS:
+                if i > 0:  # 句首的标点直接丢弃
+                    marks[i - 1] += ch
+            elif ch.isspace():
+                continue
+            else:
+                return None
+        return marks if i == len(raw) else None
+
+    def _choose_cut(self, window: str, marks: List[str]) -> int:
+        """提交位置：保留context_chars上文的前提下，最靠后的标点处；没有标点时强制在该处切分"""
+        limit = len(window) - self.context_chars
+        for i in range(limit - 1, 0, -1):
+            if marks[i] and marks[i][-1] in BOUNDARY_MARKS:
+                return i + 1
+        return limit
+
+    @staticmethod
+    def _render(raw: str, marks: List[str], start: int, end: int) -> str:
+        return "".join(raw[i] + marks[i] for i in range(start, end))
+
+    # ===================== 统计 =====================
+    def get_stats(self) -> Dict[str, Any]:
+        """获取标点统计"""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "model_calls": self.model_calls,
+                "cache_hits": self.cache_hits,
+                "model_chars": self.model_chars,
+                "cache_entries": len(self._cache),
+            }
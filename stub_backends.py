@@ -0,0 +1,301 @@
+# stub_backends.py
+"""
+确定性的CPU桩后端（ASR / LLM / TTS）
+不依赖FunASR模型、ChatGLM3权重、Genie TTS和声卡，用于在任意Linux机器上无界面地
+测量编排开销（队列、线程、分句、记忆）并做回归测试。
+- 与真实模块相同的接口：BaseModule.process / stream_process，以及ChatGLM3的stream_chat签名
+- 延迟/吞吐由LatencyProfile配置（首字延迟、tokens/s、RTF、首块延迟）
+- 输出完全确定：同样的输入总是得到同样的文本和PCM
+"""
+import time
+import queue
+import re
+import hashlib
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any
+
+import numpy as np
+
+from base_interface import BaseModule, AudioData, TextData
+from tts_scheduler import LookaheadTTSScheduler
+from chunk_policy import TTSRateEstimator
+from latency_tracer import tracer
+
+
+@dataclass
+class LatencyProfile:
+    """桩后端的延迟/吞吐配置（秒）"""
+    # ASR：每秒音频的处理耗时（实时率），以及语音结束到出最终结果的延迟
+    asr_rtf: float = 0.05
+    asr_final_delay: float = 0.05
+    # LLM：首个token延迟和生成速度（1个汉字算1个token）
+    llm_first_token_delay: float = 0.3
+    llm_tokens_per_second: float = 30.0
+    # TTS：实时率、首块延迟和每块音频时长
+    tts_rtf: float = 0.3
+    tts_first_chunk_delay: float = 0.1
+    tts_chunk_ms: int = 200
+    # 时间缩放：1.0=按配置等待，0=不等待（只测编排开销）
+    time_scale: float = 1.0
+
+    def sleep(self, seconds: float):
+        """按时间缩放等待"""
+        if seconds > 0 and self.time_scale > 0:
+            time.sleep(seconds * self.time_scale)
+
+
+# 预设配置
+PROFILES: Dict[str, LatencyProfile] = {
+    "instant": LatencyProfile(asr_rtf=0, asr_final_delay=0, llm_first_token_delay=0,
+                              llm_tokens_per_second=1e9, tts_rtf=0, tts_first_chunk_delay=0, time_scale=0),
+    "gpu": LatencyProfile(),
+    "cpu": LatencyProfile(asr_rtf=0.3, asr_final_delay=0.2, llm_first_token_delay=1.5,
+                          llm_tokens_per_second=6.0, tts_rtf=0.8, tts_first_chunk_delay=0.4),
+}
+
+# 确定性回复语料（带标点，便于分句）
+STUB_REPLIES = [
+    "你好呀！今天过得怎么样？我刚刚在听一首很温柔的歌，感觉心情都变好了。",
+    "嗯嗯，我记得你说过喜欢蓝色。蓝色让人觉得很安静，对吧？要不要和我聊聊最近的事情？",
+    "这个问题很有意思！我觉得可以先从小事做起，一步一步来。你觉得呢？",
+    "哈哈，说到旅行，我最想去海边看日出。你去过的地方里，最喜欢哪里呀？",
+]
+
+# 确定性识别结果语料
+STUB_TRANSCRIPTS = [
+    "你好，今天天气怎么样？",
+    "我想听你讲一个有趣的故事。",
+    "你还记得我喜欢什么颜色吗？",
+    "明天下午三点提醒我开会。",
+]
+
+
+def _stable_index(text: str, modulo: int) -> int:
+    """根据文本内容得到稳定的下标（不受Python哈希随机化影响）"""
+    return int(hashlib.md5(text.encode("utf-8")).hexdigest(), 16) % modulo
+
+
+# ===================== ASR桩 =====================
+class StubASRModule(BaseModule):
+    """ASR桩：按实时率消耗音频，在收到录音结束标记时输出确定性的识别结果"""
+
+    def __init__(self, profile: Optional[LatencyProfile] = None, transcripts: Optional[List[str]] = None):
+        self.profile = profile or PROFILES["gpu"]
+        self.transcripts = transcripts or STUB_TRANSCRIPTS
+        self.utterance_index = 0
+        self.partial_callback = None  # 与FunASRStreamingASR一致的中间结果回调
+
+    def _next_transcript(self) -> str:
+        text = self.transcripts[self.utterance_index % len(self.transcripts)]
+        self.utterance_index += 1
+        return text
+
+    def _consume(self, audio_data: AudioData):
+        """按实时率模拟识别耗时"""
+        seconds = len(audio_data.pcm_data) / (2 * audio_data.channels * audio_data.sample_rate)
+        self.profile.sleep(seconds * self.profile.asr_rtf)
+
+    def process(self, input_data: AudioData) -> TextData:
+        self._consume(input_data)
+        self.profile.sleep(self.profile.asr_final_delay)
+        return TextData(text=self._next_transcript(), is_finish=True)
+
+    def stream_process(self, input_queue: queue.Queue, output_queue: queue.Queue):
+        heard_audio = False
+        while True:
+            try:
+                audio_chunk: AudioData = input_queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+
+            if audio_chunk.pcm_data == b"" and audio_chunk.is_finish:
+                if heard_audio:
+                    turn_id = tracer.new_turn()
+                    tracer.mark(turn_id, "speech_end")
+                    self.profile.sleep(self.profile.asr_final_delay)
+                    tracer.mark(turn_id, "asr_final")
+                    output_queue.put(TextData(text=self._next_transcript(), is_finish=True, turn_id=turn_id))
+                output_queue.put(TextData(text="", is_finish=True))
+                break
+
+            heard_audio = True
+            self._consume(audio_chunk)
+            if self.partial_callback:
+                # 桩识别结果事先已知：中间结果直接给出整句（无标点）
+                self.partial_callback(re.sub(r"[^\w]+", "", self.transcripts[self.utterance_index % len(self.transcripts)]))
+
+
+# ===================== LLM桩 =====================
+class StubTokenizer:
+    """分词器桩：每个字符一个token"""
+
+    def encode(self, text: str) -> List[int]:
+        return [ord(ch) for ch in text]
+
+    def decode(self, ids: List[int]) -> str:
+        return "".join(chr(i) for i in ids)
+
+
+class StubChatModel:
+    """ChatGLM3桩：与stream_chat/chat签名一致，逐字输出确定性回复"""
+
+    def __init__(self, profile: Optional[LatencyProfile] = None, replies: Optional[List[str]] = None):
+        self.profile = profile or PROFILES["gpu"]
+        self.replies = replies or STUB_REPLIES
+        self.prefill_tokens = 0  # 累计prefill的token数（用于统计）
+
+    def _reply_for(self, query: str) -> str:
+        return self.replies[_stable_index(query, len(self.replies))]
+
+    def stream_chat(self, tokenizer, query: str, history: Optional[List[Dict]] = None, role: str = "user",
+                    past_key_values=None, max_length: int = 8192, do_sample=True, top_p=0.8, temperature=0.8,
+                    logits_processor=None, return_past_key_values=False, **kwargs):
+        """流式生成：每步产出累计回复（与ChatGLM3一致）"""
+        history = list(history or [])
+        # prefill：有past_key_values时只需处理新的query
+        prefill = len(query)
+        if past_key_values is None:
+            prefill += sum(len(str(msg.get("content", ""))) for msg in history)
+        self.prefill_tokens += prefill
+
+        stopping_criteria = kwargs.get("stopping_criteria")
+        reply = self._reply_for(query)
+        self.profile.sleep(self.profile.llm_first_token_delay)
+
+        history.append({"role": role, "content": query})
+        response = ""
+        for i, ch in enumerate(reply):
+            if i > 0:
+                self.profile.sleep(1.0 / self.profile.llm_tokens_per_second)
+            if stopping_criteria is not None and any(c(None, None) for c in stopping_criteria):
+                break
+            response += ch
+            new_history = history + [{"role": "assistant", "content": response}]
+            if return_past_key_values:
+                yield response, new_history, ("stub_past", prefill + i + 1)
+            else:
+                yield response, new_history
+
+    def chat(self, tokenizer, query: str, history: Optional[List[Dict]] = None, **kwargs):
+        """非流式生成"""
+        response = ""
+        new_history = list(history or [])
+        for response, new_history, *_ in self.stream_chat(tokenizer, query, history=history, **kwargs):
+            pass
+        return response, new_history
+
+
+# ===================== TTS桩 =====================
+class StubTTSModule(BaseModule):
+    """TTS桩：按实时率"合成"确定性的正弦波PCM，接口与GenieTTSModule一致"""
+
+    def __init__(self, profile: Optional[LatencyProfile] = None, sample_rate: int = 32000,
+                 seconds_per_char: float = 0.2, num_workers: int = 1):
+        self.profile = profile or PROFILES["gpu"]
+        self.sample_rate = sample_rate
+        self.channels = 1
+        self.bit_depth = 16
+        self.sample_width = 2
+        self.seconds_per_char = seconds_per_char
+        self.last_first_audio_latency = 0.0
+        self.startup_timings = {}
+        self.cancelled_through_turn = 0
+        self.rate_estimator = TTSRateEstimator()
+        self.lookahead_scheduler = LookaheadTTSScheduler(
+            synthesize=self._iter_sentence_audio,
+            make_audio=self._make_audio,
+            num_workers=num_workers
+        ) if num_workers > 1 else None
+
+    def _synthesize_samples(self, text: str) -> np.ndarray:
+        """确定性PCM：每个字符一段正弦音，频率由字符决定"""
+        char_samples = int(self.sample_rate * self.seconds_per_char)
+        t = np.arange(char_samples) / self.sample_rate
+        pieces = [
+            (0.2 * np.sin(2 * np.pi * (200 + ord(ch) % 400) * t) * 32767).astype(np.int16)
+            for ch in text
+        ]
+        return np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.int16)
+
+    def _iter_sentence_audio(self, text: str):
+        """逐块产出PCM，按首块延迟和实时率等待"""
+        synth_start = time.perf_counter()
+        samples = self._synthesize_samples(text)
+        chunk_samples = max(1, int(self.sample_rate * self.profile.tts_chunk_ms / 1000))
+        self.profile.sleep(self.profile.tts_first_chunk_delay)
+        for start in range(0, len(samples), chunk_samples):
+            chunk = samples[start:start + chunk_samples]
+            self.profile.sleep(len(chunk) / self.sample_rate * self.profile.tts_rtf)
+            yield chunk.tobytes()
+        self.rate_estimator.record(len(text), time.perf_counter() - synth_start, len(samples) / self.sample_rate)
+
+    def _make_audio(self, pcm_data: bytes, is_finish: bool, text_data: Optional[TextData] = None) -> AudioData:
+        turn_id = text_data.turn_id if text_data is not None else None
+        if pcm_data:
+            tracer.mark(turn_id, "tts_first_pcm")
+        return AudioData(
+            pcm_data=pcm_data,
+            sample_rate=self.sample_rate,
+            channels=self.channels,
+            bit_depth=self.bit_depth,
+            is_finish=is_finish,
+            turn_id=turn_id
+        )
+
+    def process(self, input_data: TextData) -> AudioData:
+        pcm_data = b"".join(self._iter_sentence_audio(input_data.text))
+        return self._make_audio(pcm_data, True, input_data)
+
+    def stream_process(self, input_queue: queue.Queue, output_queue: queue.Queue):
+        if self.lookahead_scheduler is not None:
+            self.lookahead_scheduler.run(input_queue, output_queue)
+            return
+
+        while True:
+            try:
+                text_data = input_queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+
+            if text_data.is_finish and not text_data.text:
+                output_queue.put(self._make_audio(b"", True, text_data))
+                break
+
+            text = text_data.text.strip()
+            if not text or self._is_cancelled(text_data):
+                continue
+
+            start_time = time.time()
+            first = True
+            for pcm_data in self._iter_sentence_audio(text):
+                if self._is_cancelled(text_data):
+                    break
+                if first:
+                    self.last_first_audio_latency = time.time() - start_time
+                    first = False
+                output_queue.put(self._make_audio(pcm_data, False, text_data))
+
+    def cancel_turns(self, through_turn_id: int):
+        self.cancelled_through_turn = max(self.cancelled_through_turn, through_turn_id)
+        if self.lookahead_scheduler is not None:
+            self.lookahead_scheduler.cancel_turns(through_turn_id)
+
+    def _is_cancelled(self, text_data: TextData) -> bool:
+        return text_data.turn_id is not None and text_data.turn_id <= self.cancelled_through_turn
+
+    def prewarm_cache(self, texts: List[str]) -> int:
+        return 0
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        return {}
+
+
+def create_stub_backends(profile_name: str = "gpu", tts_workers: int = 1):
+    """创建一整套桩后端：(asr_module, tokenizer, llm_model, tts_module)"""
+    profile = PROFILES[profile_name]
+    return (
+        StubASRModule(profile),
+        StubTokenizer(),
+        StubChatModel(profile),
+        StubTTSModule(profile, num_workers=tts_workers),
+    )
@@ -5,6 +5,22 @@ import time
 class TopicManager:
     """话题管理器：主动话题、话题延续、话题切换"""
     
+    # 固定话术（也用于TTS缓存预热）
+    IDLE_GREETING = "好久没说话了，最近怎么样？"
+    HYPOTHETICAL_QUESTIONS = [
+        "如果有一天你能和动物说话，你会先和哪种动物聊天？",
+        "如果你能去任何一个时代生活一天，你会选择什么时候？",
+        "如果你有一种超能力，但只能在周二使用，你会选什么能力？"
+    ]
+    SHARE_STORY_PROMPT = "诶，我最近遇到一件很有趣的事情，你要不要听听看？"
+    TRANSITIONS = [
+        "对了，突然想到...",
+        "话说回来...",
+        "换个话题聊聊？",
+        "诶，你知道吗...",
+        "说起来..."
+    ]
+    
     def __init__(self):
         self.conversation_history = []
         self.topic_pool = {
@@ -20,7 +36,7 @@ class TopicManager:
     def get_active_topic(self, idle_time: float) -> str:
         """根据空闲时间获取主动话题"""
         if idle_time > 60:  # 1分钟以上无交互
-            return "好久没说话了，最近怎么样？"
+            return self.IDLE_GREETING
         elif idle_time > 30:  # 30秒以上
             category = random.choice(list(self.topic_pool.keys()))
             topic = random.choice(self.topic_pool[category])
@@ -28,19 +44,28 @@ class TopicManager:
             # 根据话题类型生成不同的开场
             if category == "趣味":
                 if topic == "假设问题":
-                    questions = [
-                        "如果有一天你能和动物说话，你会先和哪种动物聊天？",
-                        "如果你能去任何一个时代生活一天，你会选择什么时候？",
-                        "如果你有一种超能力，但只能在周二使用，你会选什么能力？"
-                    ]
-                    return random.choice(questions)
+                    return random.choice(self.HYPOTHETICAL_QUESTIONS)
                 elif topic == "分享趣事":
-                    return "诶，我最近遇到一件很有趣的事情，你要不要听听看？"
+                    return self.SHARE_STORY_PROMPT
             
-            return f"对了，你平时喜欢{topic}吗？"
+            return self._topic_question(topic)
         
         return None  # 不需要主动话题
     
+    @staticmethod
+    def _topic_question(topic: str) -> str:
+        """普通话题的开场问句"""
+        return f"对了，你平时喜欢{topic}吗？"
+    
+    def get_fixed_phrases(self) -> list:
+        """列出所有可能说出的固定话术（供TTS缓存预热）"""
+        phrases = [self.IDLE_GREETING, self.SHARE_STORY_PROMPT]
+        phrases.extend(self.HYPOTHETICAL_QUESTIONS)
+        phrases.extend(self.TRANSITIONS)
+        for topics in self.topic_pool.values():
+            phrases.extend(self._topic_question(topic) for topic in topics)
+        return phrases
+    
     def should_switch_topic(self) -> bool:
         """检查是否需要切换话题"""
         if not self.current_topic:
@@ -69,11 +94,4 @@ class TopicManager:
     
     def get_topic_transition(self) -> str:
         """获取话题过渡语句"""
-        transitions = [
-            "对了，突然想到...",
-            "话说回来...",
-            "换个话题聊聊？",
-            "诶，你知道吗...",
-            "说起来..."
-        ]
-        return random.choice(transitions)
\ No newline at end of file
+        return random.choice(self.TRANSITIONS)
\ No newline at end of file
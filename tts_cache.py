@@ -0,0 +1,237 @@
+# tts_cache.py
+"""
+TTS合成结果缓存：
+- 内存层：按字节预算淘汰的LRU
+- 磁盘层：每条记录一个WAV文件，程序重启后仍然有效；按字节预算淘汰最久未使用的文件（启动时按mtime恢复顺序）
+缓存键 = 规范化文本 + 角色/参考音频/引擎参数 的SHA-256
+"""
+import os
+import json
+import wave
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+
+
+@dataclass
+class CachedAudio:
+    """缓存中的一条合成结果"""
+    pcm_data: bytes
+    sample_rate: int = 16000
+    channels: int = 1
+    bit_depth: int = 16
+
+
+class TTSAudioCache:
+    """内容寻址的TTS音频缓存（内存LRU + 磁盘持久化）"""
+
+    def __init__(self, cache_dir: Optional[str] = "./tts_cache", memory_budget_bytes: int = 64 * 1024 * 1024,
+                 disk_budget_bytes: Optional[int] = 512 * 1024 * 1024):
+        """
+        :param cache_dir: 磁盘缓存目录，为None时只使用内存层
+        :param memory_budget_bytes: 内存层的PCM字节预算，超出后淘汰最久未使用的记录
+        :param disk_budget_bytes: 磁盘层的文件字节预算，超出后删除最久未使用的文件，None表示不限制
+        """
+        self.cache_dir = cache_dir
+        self.memory_budget_bytes = memory_budget_bytes
+        self.disk_budget_bytes = disk_budget_bytes
+        self._memory: "OrderedDict[str, CachedAudio]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()  # 缓存键 → 文件字节数（最久未使用的在前）
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        # 命中统计
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._scan_disk()
+
+    # ===================== 缓存键 =====================
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """文本规范化：去除首尾空白、合并连续空白"""
+        return " ".join(text.split())
+
+    def make_key(self, text: str, **params: Any) -> str:
+        """根据规范化文本和合成参数生成缓存键"""
+        payload = json.dumps(
+            {"text": self.normalize_text(text), "params": params},
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # ===================== 读写 =====================
+    def get(self, key: str) -> Optional[CachedAudio]:
+        """查询缓存：先查内存，再查磁盘（磁盘命中会提升到内存层）"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry
+
+        entry = self._load_from_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._put_memory(key, entry)
+            self._touch_disk(key)
+        return entry
+
+    def put(self, key: str, pcm_data: bytes, sample_rate: int, channels: int, bit_depth: int):
+        """写入缓存（内存层 + 磁盘层）"""
+        if not pcm_data:
+            return
+        entry = CachedAudio(pcm_data=pcm_data, sample_rate=sample_rate, channels=channels, bit_depth=bit_depth)
+        with self._lock:
+            self._put_memory(key, entry)
+        self._save_to_disk(key, entry)
+
+    def contains(self, key: str) -> bool:
+        """判断是否已缓存（不计入命中统计）"""
+        with self._lock:
+            if key in self._memory:
+                return True
+        return self.cache_dir is not None and os.path.exists(self._disk_path(key))
+
+    def _touch_disk(self, key: str):
+        """磁盘命中：移到LRU末尾并更新mtime（重启后按mtime恢复顺序，调用方需持有锁）"""
+        if key not in self._disk:
+            return
+        self._disk.move_to_end(key)
+        try:
+            os.utime(self._disk_path(key))
+        except OSError:
+            pass
+
+    def _put_memory(self, key: str, entry: CachedAudio):
+        """写入内存层并按字节预算淘汰（调用方需持有锁）"""
+        size = len(entry.pcm_data)
+        if size > self.memory_budget_bytes:
+            return  # 单条超出预算，只保留在磁盘层
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old.pcm_data)
+        self._memory[key] = entry
+        self._memory_bytes += size
+        while self._memory_bytes > self.memory_budget_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted.pcm_data)
+            self.evictions += 1
+
+    # ===================== 磁盘层 =====================
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.wav")
+
+    def _scan_disk(self):
+        """启动时按mtime建立磁盘层的LRU顺序，并按预算淘汰"""
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".wav"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            files.append((stat.st_mtime, name[:-4], stat.st_size))
+        with self._lock:
+            for _, key, size in sorted(files):
+                self._disk[key] = size
+                self._disk_bytes += size
+            self._evict_disk()
+
+    def _add_disk(self, key: str, size: int):
+        """登记新写入的文件并按预算淘汰（调用方需持有锁）"""
+        self._disk_bytes += size - self._disk.pop(key, 0)
+        self._disk[key] = size
+        self._evict_disk()
+
+    def _evict_disk(self):
+        """超出磁盘预算时删除最久未使用的文件（调用方需持有锁）"""
+        if self.disk_budget_bytes is None:
+            return
+        while self._disk_bytes > self.disk_budget_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self.disk_evictions += 1
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+
+    def _load_from_disk(self, key: str) -> Optional[CachedAudio]:
+        """从磁盘读取一条记录，不存在或损坏时返回None"""
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with wave.open(path, "rb") as wf:
+                return CachedAudio(
+                    pcm_data=wf.readframes(wf.getnframes()),
+                    sample_rate=wf.getframerate(),
+                    channels=wf.getnchannels(),
+                    bit_depth=wf.getsampwidth() * 8,
+                )
+        except Exception as e:
+            print(f"⚠️ TTS缓存文件损坏，已忽略: {path} ({e})")
+            return None
+
+    def _save_to_disk(self, key: str, entry: CachedAudio):
+        """写入磁盘（先写临时文件再替换，避免中途退出留下半个文件）"""
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with wave.open(tmp_path, "wb") as wf:
+                wf.setnchannels(entry.channels)
+                wf.setsampwidth(entry.bit_depth // 8)
+                wf.setframerate(entry.sample_rate)
+                wf.writeframes(entry.pcm_data)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._add_disk(key, os.path.getsize(path))
+        except Exception as e:
+            print(f"⚠️ TTS缓存写入失败: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    # ===================== 统计 =====================
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存命中统计"""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "evictions": self.evictions,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "disk_evictions": self.disk_evictions,
+            }
+
+    def clear_memory(self):
+        """清空内存层（磁盘层保留）"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
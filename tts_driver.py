@@ -9,7 +9,13 @@ from dataclasses import dataclass
 from typing import List, Optional, Dict, Any
 import time
 import wave
+import json
 import logging
+from tts_cache import TTSAudioCache
+from onset_trimmer import OnsetTrimmer, StreamingOnsetTrimmer
+from tts_scheduler import LookaheadTTSScheduler
+from chunk_policy import TTSRateEstimator
+from latency_tracer import tracer
 os.environ["GENIE_DATA_DIR"] = r"C:\Users\k\Agent\Genie-TTS\GenieData"
 #======================这是一个日志过滤器，用于过滤掉特定的警告======================
 class GenieTTSFilter(logging.Filter):
@@ -27,11 +33,13 @@ class AudioData:
     channels: int = 1
     is_finish: bool = False  # 标记是否是最后一个音频分片
     bit_depth: int = 16      # 位深
+    turn_id: Optional[int] = None  # 所属对话轮次（延迟追踪用）
 
 @dataclass
 class TextData:
     text: str
     is_finish: bool = True
+    turn_id: Optional[int] = None  # 所属对话轮次（延迟追踪用）
 
 ChatHistory = List[Dict[str, str]]
 
@@ -64,15 +72,45 @@ LOCAL_CHAR_LANG = "Chinese"
 REFERENCE_AUDIO_PATH = r"C:\Users\k\Agent\Genie-TTS\CharacterModels\v2ProPlus\feibi\prompt_wav\zh_vo_Main_Linaxita_2_1_10_26.wav"
 REFERENCE_AUDIO_TEXT = "在此之前,请您务必继续享受雨季拉古纳的时光"
 SAVE_DIR = "./tts_output"
+# 内存合成：直接从tts_async取PCM，不再经过临时WAV文件（False时回退到旧的落盘路径）
+IN_MEMORY_SYNTHESIS = True
+# 子句级流式输出：引擎每产出一段音频就立即推送，不必等整句合成完
+STREAM_PARTIAL_AUDIO = True
+# 流式模式下首块至少凑够的时长（毫秒），用于去除开头爆破音
+STREAM_FIRST_BLOCK_MS = 200
+# 合成结果缓存（重复出现的句子直接播放，无需再次合成）
+TTS_CACHE_ENABLED = True
+TTS_CACHE_DIR = "./tts_cache"
+TTS_CACHE_MEMORY_MB = 64
+TTS_CACHE_DISK_MB = 512
+# 预合成工作线程数：>1时当前句子播放期间并发合成后续句子（每个线程持有独立的角色实例）
+TTS_LOOKAHEAD_WORKERS = 2
+# 最多同时在途（合成中或等待播放）的句子数
+TTS_LOOKAHEAD_MAX_PENDING = 4
+# 音频格式清单：按模型目录+修改时间缓存检测结果，模型不变时启动无需再合成探测音频
+FORMAT_MANIFEST_PATH = os.path.join(SAVE_DIR, "audio_format_manifest.json")
 
 # ===================== 4. Genie TTS 流式模块实现（移除懒加载） =====================
 class GenieTTSModule(BaseModule):
     def __init__(self):
         """初始化时立即加载模型（移除懒加载）"""
         print("🔄 TTS模块初始化中...")
+        # 每个线程独立的asyncio事件循环（用于驱动tts_async）
+        self._thread_local = threading.local()
+        # 轮次号不大于该值的句子被取消（用户打断时设置）
+        self.cancelled_through_turn = 0
+        # 实测合成速度（供LLM→TTS分块策略使用）
+        self.rate_estimator = TTSRateEstimator()
+        # 启动各步骤耗时（秒）
+        self.startup_timings = {}
+        init_start = time.perf_counter()
         
         try:
+            # 确保输出目录存在
+            os.makedirs(SAVE_DIR, exist_ok=True)
+            
             # 1. 加载TTS模型
+            step_start = time.perf_counter()
             print(f"🔄 加载TTS模型: {LOCAL_CHAR_NAME}")
             load_character(
                 character_name=LOCAL_CHAR_NAME,
@@ -80,8 +118,10 @@ class GenieTTSModule(BaseModule):
                 language=LOCAL_CHAR_LANG
             )
             print(f"✅ TTS模型 {LOCAL_CHAR_NAME} 加载成功")
+            self.startup_timings["load_character"] = time.perf_counter() - step_start
             
             # 2. 设置参考音频
+            step_start = time.perf_counter()
             print(f"🔄 设置参考音频: {REFERENCE_AUDIO_PATH}")
             set_reference_audio(
                 character_name=LOCAL_CHAR_NAME,
@@ -90,21 +130,124 @@ class GenieTTSModule(BaseModule):
                 language=LOCAL_CHAR_LANG
             )
             print(f"✅ 参考音频设置成功")
-            
-            # 3. 检测音频格式
-            self._detect_audio_format()
-            
-            # 确保输出目录存在
-            os.makedirs(SAVE_DIR, exist_ok=True)
-            
+            self.startup_timings["set_reference_audio"] = time.perf_counter() - step_start
+            
+            # 3. 检测音频格式（优先读取格式清单）
+            step_start = time.perf_counter()
+            if self._load_format_manifest():
+                self.startup_timings["format_manifest"] = time.perf_counter() - step_start
+            else:
+                if self._detect_audio_format():
+                    self._save_format_manifest()
+                self.startup_timings["format_probe"] = time.perf_counter() - step_start
+            self.last_first_audio_latency = 0.0
+            # 爆破音切除器（滤波器系数按检测到的采样率预先设计好）
+            self.onset_trimmer = OnsetTrimmer(self.sample_rate, self.bit_depth)
+            
+            # 4. 合成结果缓存
+            step_start = time.perf_counter()
+            self.audio_cache = TTSAudioCache(
+                cache_dir=TTS_CACHE_DIR,
+                memory_budget_bytes=TTS_CACHE_MEMORY_MB * 1024 * 1024,
+                disk_budget_bytes=TTS_CACHE_DISK_MB * 1024 * 1024
+            ) if TTS_CACHE_ENABLED else None
+            self.startup_timings["audio_cache"] = time.perf_counter() - step_start
+            
+            # 5. 预合成调度器（多工作线程并发合成后续句子，角色副本在工作线程中后台加载）
+            step_start = time.perf_counter()
+            self._worker_characters = []
+            self.lookahead_scheduler = LookaheadTTSScheduler(
+                synthesize=self._iter_sentence_audio,
+                make_audio=self._make_audio,
+                num_workers=TTS_LOOKAHEAD_WORKERS,
+                max_pending=TTS_LOOKAHEAD_MAX_PENDING,
+                worker_init=self._init_tts_worker
+            ) if TTS_LOOKAHEAD_WORKERS > 1 else None
+            self.startup_timings["lookahead_scheduler"] = time.perf_counter() - step_start
+            
+            self.startup_timings["total"] = time.perf_counter() - init_start
+            print("⏱️  TTS启动耗时：" + "，".join(
+                f"{step}={seconds*1000:.0f}ms" for step, seconds in self.startup_timings.items()
+            ))
             print("✅ TTS模块初始化完成")
             
         except Exception as e:
             print(f"❌ TTS模块初始化失败: {e}")
             raise
 
-    def _detect_audio_format(self):
-        """检测TTS音频格式"""
+    #======================音频格式清单=====================
+    def _model_signature(self) -> Optional[Dict[str, Any]]:
+        """模型签名：模型目录、角色名和目录内文件的最新修改时间（模型更新后签名随之变化）；目录不存在时为None"""
+        if not os.path.isdir(LOCAL_MODEL_DIR):
+            return None
+        latest_mtime = 0.0
+        for root, _, files in os.walk(LOCAL_MODEL_DIR):
+            for filename in files:
+                try:
+                    latest_mtime = max(latest_mtime, os.path.getmtime(os.path.join(root, filename)))
+                except OSError:
+                    continue
+        return {
+            "model_dir": os.path.abspath(LOCAL_MODEL_DIR),
+            "character": LOCAL_CHAR_NAME,
+            "mtime": latest_mtime
+        }
+
+    def _load_format_manifest(self) -> bool:
+        """从格式清单读取音频格式，签名一致时返回True"""
+        try:
+            with open(FORMAT_MANIFEST_PATH, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return False
+        
+        signature = self._model_signature()
+        if signature is None:
+            return False  # 无法校验模型，不信任清单
+        entry = manifest.get(signature["model_dir"]) if isinstance(manifest, dict) else None
+        if not isinstance(entry, dict) or entry.get("character") != signature["character"] \
+                or entry.get("mtime") != signature["mtime"]:
+            return False
+        # 旧版本写入或手工编辑的记录可能缺字段/类型不对：当作没有清单，重新探测一次
+        fields = ("sample_rate", "channels", "sample_width")
+        if not all(isinstance(entry.get(field), int) and entry[field] > 0 for field in fields):
+            return False
+        
+        self.sample_rate = entry["sample_rate"]
+        self.channels = entry["channels"]
+        self.sample_width = entry["sample_width"]
+        self.bit_depth = self.sample_width * 8
+        print(f"📊 TTS音频格式（来自清单）：采样率={self.sample_rate}Hz, 声道={self.channels}, 位深={self.bit_depth}bit")
+        return True
+
+    def _save_format_manifest(self):
+        """把检测到的音频格式写入清单（其他模型目录的记录保留）"""
+        signature = self._model_signature()
+        if signature is None:
+            return
+        try:
+            with open(FORMAT_MANIFEST_PATH, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+        if not isinstance(manifest, dict):
+            manifest = {}
+        
+        manifest[signature["model_dir"]] = {
+            "character": signature["character"],
+            "mtime": signature["mtime"],
+            "sample_rate": self.sample_rate,
+            "channels": self.channels,
+            "sample_width": self.sample_width
+        }
+        try:
+            with open(FORMAT_MANIFEST_PATH, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            print(f"⚠️ 音频格式清单写入失败: {e}")
+
+    def _detect_audio_format(self) -> bool:
+        """检测TTS音频格式（合成探测音频），成功返回True，失败时使用默认格式并返回False"""
         try:
             # 生成一个简短的测试音频文件
             test_text = "测试音频格式"
@@ -137,6 +280,7 @@ class GenieTTSModule(BaseModule):
                 os.remove(test_path)
             except:
                 pass
+            return True
                 
         except Exception as e:
             print(f"❌ 音频格式检测失败: {e}")
@@ -146,43 +290,260 @@ class GenieTTSModule(BaseModule):
             self.channels = 1
             self.bit_depth = 16
             self.sample_width = 2
+            return False
 
     def process(self, input_data: TextData) -> AudioData:
         """
         批量处理（非流式）：输入TextData，输出AudioData
         """
-        # 1. 生成音频文件
-        timestamp = int(time.time())
-        save_path = os.path.join(SAVE_DIR, f"{LOCAL_CHAR_NAME}_{timestamp}.wav")
-        
         ##print(f"🔄 批量处理TTS: {input_data.text[:50]}...")
+        key = self._cache_key(input_data.text, variant="full")
+        cached = self.audio_cache.get(key) if self.audio_cache else None
+        if cached is not None:
+            tracer.mark(input_data.turn_id, "tts_first_pcm")
+            return AudioData(
+                pcm_data=cached.pcm_data,
+                sample_rate=cached.sample_rate,
+                channels=cached.channels,
+                bit_depth=cached.bit_depth,
+                is_finish=True,
+                turn_id=input_data.turn_id
+            )
+        
+        pcm_data = self._synthesize_pcm(input_data.text, split_sentence=True)
+        if self.audio_cache:
+            self.audio_cache.put(key, pcm_data, self.sample_rate, self.channels, self.bit_depth)
+
+        ##print(f"✅ 批量TTS完成，音频大小: {len(pcm_data)} 字节")
+
+        return self._make_audio(pcm_data, True, input_data)
+
+    #======================合成路径（内存 / 临时文件）=====================
+    def _get_event_loop(self) -> asyncio.AbstractEventLoop:
+        """获取当前线程专属的事件循环（tts_async需要在事件循环中驱动）"""
+        loop = getattr(self._thread_local, "loop", None)
+        if loop is None or loop.is_closed():
+            loop = asyncio.new_event_loop()
+            self._thread_local.loop = loop
+        return loop
+
+    def _current_character(self) -> str:
+        """当前线程使用的角色名（预合成工作线程各自持有一份角色副本）"""
+        return getattr(self._thread_local, "character_name", LOCAL_CHAR_NAME)
+
+    def _chunk_to_pcm(self, chunk) -> bytes:
+        """把tts_async产出的音频块统一转成PCM字节"""
+        if chunk is None:
+            return b""
+        if isinstance(chunk, (bytes, bytearray, memoryview)):
+            return bytes(chunk)
+        samples = np.asarray(chunk)
+        if samples.dtype.kind == "f":
+            # 浮点样本：[-1, 1] → int16
+            samples = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+        return samples.tobytes()
+
+    def _iter_pcm_chunks(self, text: str, split_sentence: bool = False):
+        """内存合成：逐块产出tts_async生成的PCM数据，全程不落盘"""
+        loop = self._get_event_loop()
+        agen = tts_async(
+            character_name=self._current_character(),
+            text=text,
+            play=False,
+            split_sentence=split_sentence
+        )
+        try:
+            while True:
+                try:
+                    chunk = loop.run_until_complete(agen.__anext__())
+                except StopAsyncIteration:
+                    break
+                pcm = self._chunk_to_pcm(chunk)
+                if pcm:
+                    yield pcm
+        finally:
+            loop.run_until_complete(agen.aclose())
+
+    def _synthesize_pcm_in_memory(self, text: str, split_sentence: bool = False) -> bytes:
+        """内存合成：收集全部PCM块后一次性返回"""
+        return b"".join(self._iter_pcm_chunks(text, split_sentence=split_sentence))
+
+    def _synthesize_pcm_via_file(self, text: str, split_sentence: bool = False) -> bytes:
+        """旧路径：合成到临时WAV → 读回PCM → 删除文件（保留用于对比测试）"""
+        self._file_counter = getattr(self, "_file_counter", 0) + 1
+        save_path = os.path.join(SAVE_DIR, f"sentence_{int(time.time())}_{self._file_counter}.wav")
         tts(
-            character_name=LOCAL_CHAR_NAME,
-            text=input_data.text,
+            character_name=self._current_character(),
+            text=text,
             play=False,
-            split_sentence=True,
+            split_sentence=split_sentence,
             save_path=save_path
         )
+        try:
+            # 只读取音频帧，跳过WAV文件头（否则文件头会被当成PCM播放出来）
+            with wave.open(save_path, "rb") as wf:
+                return wf.readframes(wf.getnframes())
+        finally:
+            try:
+                os.remove(save_path)
+            except OSError:
+                pass
+
+    def _synthesize_pcm(self, text: str, split_sentence: bool = False) -> bytes:
+        """按配置选择合成路径，返回PCM字节"""
+        if IN_MEMORY_SYNTHESIS:
+            return self._synthesize_pcm_in_memory(text, split_sentence=split_sentence)
+        return self._synthesize_pcm_via_file(text, split_sentence=split_sentence)
+
+    #======================合成结果缓存=====================
+    def _cache_key(self, text: str, variant: str) -> str:
+        """缓存键：文本 + 角色、参考音频、输出格式等所有影响合成结果的参数"""
+        return self.audio_cache.make_key(
+            text,
+            variant=variant,
+            character=LOCAL_CHAR_NAME,
+            model_dir=LOCAL_MODEL_DIR,
+            language=LOCAL_CHAR_LANG,
+            reference_audio=REFERENCE_AUDIO_PATH,
+            reference_text=REFERENCE_AUDIO_TEXT,
+            sample_rate=self.sample_rate,
+            channels=self.channels,
+            bit_depth=self.bit_depth
+        ) if self.audio_cache else ""
+
+    def _iter_sentence_audio(self, text: str):
+        """合成单个句子（优先读缓存），逐段产出PCM；未命中时合成完成后写入缓存"""
+        if not self.audio_cache:
+            yield from self._measure_synthesis(text, self._iter_sentence_audio_uncached(text))
+            return
         
-        # 2. 读取音频文件为PCM数据
-        with open(save_path, "rb") as f:
-            pcm_data = f.read()
+        key = self._cache_key(text, variant="sentence")
+        cached = self.audio_cache.get(key)
+        if cached is not None:
+            yield cached.pcm_data
+            return
         
-        ##print(f"✅ 批量TTS完成，音频大小: {len(pcm_data)} 字节")
+        pieces = []
+        for pcm in self._measure_synthesis(text, self._iter_sentence_audio_uncached(text)):
+            pieces.append(pcm)
+            yield pcm
+        self.audio_cache.put(key, b"".join(pieces), self.sample_rate, self.channels, self.bit_depth)
+
+    def prewarm_cache(self, texts: List[str]) -> int:
+        """预先合成常用语句（兜底回复、问候语、话题引导）写入缓存，返回新合成的条数"""
+        if not self.audio_cache:
+            return 0
+        synthesized = 0
+        for text in texts:
+            text = text.strip()
+            if not text or self.audio_cache.contains(self._cache_key(text, variant="sentence")):
+                continue
+            try:
+                for _ in self._iter_sentence_audio(text):
+                    pass
+                synthesized += 1
+            except Exception as e:
+                print(f"⚠️ 预合成失败: {text[:20]}... ({e})")
+        print(f"✅ TTS缓存预热完成，新合成 {synthesized} 条")
+        return synthesized
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """获取TTS缓存命中统计"""
+        return self.audio_cache.get_stats() if self.audio_cache else {}
+
+    #======================打断（取消待合成句子）=====================
+    def cancel_turns(self, through_turn_id: int):
+        """取消轮次号不大于through_turn_id的句子：未合成的跳过，合成中的在下一段停止"""
+        self.cancelled_through_turn = max(self.cancelled_through_turn, through_turn_id)
+        if getattr(self, "lookahead_scheduler", None) is not None:
+            self.lookahead_scheduler.cancel_turns(through_turn_id)
+
+    def _is_cancelled(self, text_data: TextData) -> bool:
+        return text_data.turn_id is not None and text_data.turn_id <= self.cancelled_through_turn
+
+    def _measure_synthesis(self, text: str, chunks):
+        """透传合成分段，合成完成后记录耗时和音频时长（被取消的句子不记录）"""
+        start = time.perf_counter()
+        total_bytes = 0
+        for pcm in chunks:
+            total_bytes += len(pcm)
+            yield pcm
+        bytes_per_second = self.sample_rate * self.sample_width * self.channels
+        self.rate_estimator.record(len(text), time.perf_counter() - start, total_bytes / bytes_per_second)
+
+    def _iter_sentence_audio_uncached(self, text: str):
+        """
+        合成单个句子并逐段产出已去除爆破音的PCM
+        流式模式：首段凑够STREAM_FIRST_BLOCK_MS后切除开头爆破音再推送，后续分段直接透传
+        非流式模式：整句合成后一次性产出
+        """
+        if not (STREAM_PARTIAL_AUDIO and IN_MEMORY_SYNTHESIS):
+            yield self._process_audio_start(self._synthesize_pcm(text, split_sentence=False))
+            return
+        
+        frame_bytes = self.sample_width * self.channels
+        first_block_bytes = int(self.sample_rate * STREAM_FIRST_BLOCK_MS / 1000) * frame_bytes
+        # 切除上限按整句的预计时长计算（按实测的每字音频时长估算）
+        expected_samples = int(len(text) * self.rate_estimator.audio_per_char * self.sample_rate)
+        stream_trimmer = StreamingOnsetTrimmer(self.onset_trimmer, first_block_bytes, expected_samples)
+        
+        # split_sentence=True：让引擎按子句切分，逗号处就能产出第一段音频
+        for pcm in self._iter_pcm_chunks(text, split_sentence=True):
+            out = stream_trimmer.feed(pcm)
+            if out:
+                yield out
         
-        # 3. 返回AudioData格式
+        # 整句都不足首块时长：整体处理后输出
+        tail = stream_trimmer.flush()
+        if tail:
+            yield tail
+
+    #======================预合成工作线程=====================
+    def _init_tts_worker(self, worker_index: int):
+        """工作线程初始化：0号线程复用主角色，其余线程各自加载一份角色副本（独立推理会话，可真正并发）"""
+        if worker_index == 0:
+            self._thread_local.character_name = LOCAL_CHAR_NAME
+            return
+        
+        character_name = f"{LOCAL_CHAR_NAME}_worker{worker_index}"
+        load_character(
+            character_name=character_name,
+            onnx_model_dir=LOCAL_MODEL_DIR,
+            language=LOCAL_CHAR_LANG
+        )
+        set_reference_audio(
+            character_name=character_name,
+            audio_path=REFERENCE_AUDIO_PATH,
+            audio_text=REFERENCE_AUDIO_TEXT,
+            language=LOCAL_CHAR_LANG
+        )
+        self._worker_characters.append(character_name)
+        self._thread_local.character_name = character_name
+        print(f"✅ TTS工作线程 #{worker_index} 已加载角色副本: {character_name}")
+
+    def _make_audio(self, pcm_data: bytes, is_finish: bool, text_data: Optional[TextData] = None) -> AudioData:
+        """把PCM封装为当前输出格式的AudioData（带上来源句子的对话轮次）"""
+        turn_id = text_data.turn_id if text_data is not None else None
+        if pcm_data:
+            tracer.mark(turn_id, "tts_first_pcm")
         return AudioData(
             pcm_data=pcm_data,
             sample_rate=self.sample_rate,
             channels=self.channels,
             bit_depth=self.bit_depth,
-            is_finish=True
+            is_finish=is_finish,
+            turn_id=turn_id
         )
 
     def stream_process(self, input_queue: queue.Queue, output_queue: queue.Queue):
         """实时流式处理：每收到一个句子就立即合成（同步版本）"""
         print("🔄 启动实时TTS流式处理...")
         
+        # 启用预合成时：句子N播放期间并发合成N+1，按顺序输出
+        if self.lookahead_scheduler is not None:
+            self.lookahead_scheduler.run(input_queue, output_queue)
+            return
+        
         sentence_count = 0
         
         while True:
@@ -195,65 +556,37 @@ class GenieTTSModule(BaseModule):
                 
                 # 如果是结束标记
                 if text_data.is_finish and not text_data.text:
-                    output_queue.put(AudioData(
-                        pcm_data=b"",
-                        sample_rate=self.sample_rate,
-                        channels=self.channels,
-                        bit_depth=self.bit_depth,
-                        is_finish=True
-                    ))
+                    output_queue.put(self._make_audio(b"", True, text_data))
                     ##print(f"✅ TTS流式处理完成，共合成{sentence_count}个句子")
                     break
                 
                 # 处理当前文本
                 text = text_data.text.strip()
-                if not text:
+                if not text or self._is_cancelled(text_data):
                     continue
                 
                 sentence_count += 1
                 ##print(f"🎵 TTS开始合成句子 #{sentence_count}: {text[:50]}...")
                 
-                # 使用同步方法合成当前句子
+                # 合成当前句子（流式模式下边合成边推送）
                 start_time = time.time()
                 
                 try:
-                    # 为每个句子生成临时音频文件
-                    timestamp = int(time.time())
-                    save_path = os.path.join(SAVE_DIR, f"sentence_{timestamp}_{sentence_count}.wav")
-                    
-                    # 合成单个句子
-                    tts(
-                        character_name=LOCAL_CHAR_NAME,
-                        text=text,
-                        play=False,
-                        split_sentence=False,  # 已经是完整句子，不需要再分割
-                        save_path=save_path
-                    )
-                    
-                    # 读取音频数据
-                    with open(save_path, "rb") as f:
-                        pcm_data = f.read()
-                        ##去除开头的气泡音
-                    pcm_data = self._process_audio_start(pcm_data)
+                    total_bytes = 0
+                    for pcm_data in self._iter_sentence_audio(text):
+                        # 被打断：停止合成本句
+                        if self._is_cancelled(text_data):
+                            break
+                        if total_bytes == 0:
+                            # 记录本句首段音频的延迟
+                            self.last_first_audio_latency = time.time() - start_time
+                        total_bytes += len(pcm_data)
+                        
+                        # 发送音频数据
+                        output_queue.put(self._make_audio(pcm_data, False, text_data))
                     
                     elapsed = time.time() - start_time
-                    
-                    # 发送音频数据
-                    output_queue.put(AudioData(
-                        pcm_data=pcm_data,
-                        sample_rate=self.sample_rate,
-                        channels=self.channels,
-                        bit_depth=self.bit_depth,
-                        is_finish=False
-                    ))
-                    
-                    ##print(f"✅ TTS句子 #{sentence_count} 合成完成，大小: {len(pcm_data)} 字节，耗时: {elapsed:.2f}秒")
-                    
-                    # 清理临时文件
-                    try:
-                        os.remove(save_path)
-                    except:
-                        pass
+                    ##print(f"✅ TTS句子 #{sentence_count} 合成完成，大小: {total_bytes} 字节，首段: {self.last_first_audio_latency:.2f}秒，耗时: {elapsed:.2f}秒")
                     
                 except Exception as e:
                     print(f"❌ TTS合成句子 #{sentence_count} 失败: {e}")
@@ -270,214 +603,17 @@ class GenieTTSModule(BaseModule):
         """
         专门处理TTS开头爆破音的函数
         爆破音特征：低频能量高、突然的能量爆发、持续时间短（<50ms）
+        具体检测逻辑见 onset_trimmer.OnsetTrimmer
         """
-        import numpy as np
-        
-        # 将字节转换为numpy数组
-        dtype = np.int16 if self.bit_depth == 16 else np.int32
-        samples = np.frombuffer(pcm_data, dtype=dtype)
-        
-        if len(samples) < 1600:  # 小于100ms的音频不处理
-            return pcm_data
-        
-        # 1. 爆破音专用检测算法
-        def detect_plosive_noise(audio_data):
-            """检测爆破音噪音"""
-            # 分析前100ms（1600个样本）
-            analysis_length = min(1600, len(audio_data))
-            segment = audio_data[:analysis_length].astype(np.float32)
-            
-            # 计算短期能量（用于检测突发能量）
-            window_size = 160  # 10ms窗口
-            num_windows = analysis_length // window_size
-            
-            energies = []
-            for i in range(num_windows):
-                window = segment[i * window_size:(i + 1) * window_size]
-                energy = np.sum(window ** 2) / window_size
-                energies.append(energy)
-            
-            # 计算能量变化率（爆破音的特点是能量突然增加）
-            energy_diffs = np.diff(energies)
-            
-            # 检测能量突然爆发的点
-            sudden_increase_threshold = np.max(energies) * 0.3
-            
-            for i in range(1, len(energy_diffs)):
-                if energy_diffs[i] > sudden_increase_threshold:
-                    # 爆破音通常在前3个窗口内
-                    if i * window_size < 480:  # 前30ms内
-                        # 向前找更合适的起始点（可能在爆发的稍前位置）
-                        return max(0, (i - 1) * window_size)
-            
-            return 0
-        
-        # 2. 低频爆破音检测（爆破音通常在低频）
-        def detect_low_freq_plosive(audio_data):
-            """检测低频爆破音"""
-            try:
-                from scipy import signal
-                
-                analysis_length = min(800, len(audio_data))
-                segment = audio_data[:analysis_length].astype(np.float32)
-                
-                # 设计带通滤波器（50-200Hz，爆破音主要频率范围）
-                lowcut = 50
-                highcut = 200
-                nyquist = self.sample_rate / 2
-                
-                # 巴特沃斯带通滤波器
-                b, a = signal.butter(
-                    4, 
-                    [lowcut/nyquist, highcut/nyquist], 
-                    btype='band'
-                )
-                
-                # 应用滤波器
-                filtered = signal.filtfilt(b, a, segment)
-                
-                # 计算滤波后的能量
-                window_size = 80  # 5ms
-                num_windows = analysis_length // window_size
-                
-                filtered_energies = []
-                for i in range(num_windows):
-                    window = filtered[i * window_size:(i + 1) * window_size]
-                    energy = np.sum(window ** 2) / window_size
-                    filtered_energies.append(energy)
-                
-                # 找到第一个低频能量峰值
-                energy_threshold = np.percentile(filtered_energies, 70)
-                
-                for i, energy in enumerate(filtered_energies):
-                    if energy > energy_threshold:
-                        # 爆破音通常持续1-2个窗口（5-10ms）
-                        return max(0, (i - 1) * window_size)
-                        
-            except ImportError:
-                # scipy不可用时使用简化方法
-                pass
-            
-            return 0
-        
-        # 3. 经验法则：根据TTS引擎特性直接切除
-        def empirical_cut_for_tts():
-            """根据经验直接切除固定长度"""
-            # Genie TTS通常在开头有固定模式的噪音
-            # 尝试切除前30-50ms（480-800个样本）
-            
-            # 先检查前100ms的能量分布
-            first_100ms = min(1600, len(samples))
-            
-            # 分成4个25ms的窗口
-            window_25ms = 400  # 16kHz * 0.025s
-            windows = []
-            
-            for i in range(0, first_100ms, window_25ms):
-                if i + window_25ms <= first_100ms:
-                    window = samples[i:i+window_25ms]
-                    rms = np.sqrt(np.mean(window.astype(np.float64) ** 2))
-                    windows.append(rms)
-            
-            # 如果第一个窗口能量明显高于后面，很可能是噪音
-            if len(windows) >= 2 and windows[0] > windows[1] * 1.5:
-                return 400  # 切除前25ms
-            
-            # 默认切除30ms（480个样本）
-            return 480
-        
-        # 4. 波形形状检测（爆破音的波形特征）
-        def detect_by_waveform_shape(audio_data):
-            """通过波形形状检测爆破音"""
-            analysis_length = min(800, len(audio_data))
-            segment = audio_data[:analysis_length]
-            
-            # 计算波形的一阶和二阶差分（检测突变）
-            diff1 = np.diff(segment)
-            diff2 = np.diff(diff1)
-            
-            # 寻找幅度突变点
-            amplitude_threshold = np.percentile(np.abs(diff1), 90)
-            
-            for i in range(len(diff1) - 10):
-                # 检查是否有一系列的突变
-                if np.abs(diff1[i]) > amplitude_threshold:
-                    # 检查后续几个点是否也有较大变化
-                    subsequent = np.abs(diff1[i:i+10])
-                    if np.mean(subsequent) > amplitude_threshold * 0.5:
-                        return max(0, i - 20)  # 稍微提前一点
-            
-            return 0
-        
-        # 5. 综合多种检测方法
-        def combined_detection():
-            """综合使用多种检测方法"""
-            detection_results = []
-            
-            # 方法1：能量突变检测
-            pos1 = detect_plosive_noise(samples)
-            if pos1 > 0:
-                detection_results.append(pos1)
-            
-            # 方法2：低频检测（需要scipy）
-            pos2 = detect_low_freq_plosive(samples)
-            if pos2 > 0:
-                detection_results.append(pos2)
-            
-            # 方法3：波形形状检测
-            pos3 = detect_by_waveform_shape(samples)
-            if pos3 > 0:
-                detection_results.append(pos3)
-            
-            # 方法4：经验切除
-            pos4 = empirical_cut_for_tts()
-            detection_results.append(pos4)
-            
-            # 如果所有方法都认为有噪音，取中间值
-            if detection_results:
-                # 去掉最大最小值，取中间值
-                sorted_results = sorted(detection_results)
-                if len(sorted_results) >= 3:
-                    # 取中位数
-                    return sorted_results[len(sorted_results) // 2]
-                else:
-                    # 取平均值
-                    return int(np.mean(sorted_results))
-            
-            return 480  # 默认切除30ms
-        
-        # 执行检测
-        start_index = combined_detection()
-        
-        # 确保不会切除太多（不超过20%，且不超过200ms）
-        max_cut = min(len(samples) // 5, 3200)  # 200ms或20%
-        start_index = min(start_index, max_cut)
-        
-        # 应用切除
-        if start_index > 0:
-            # 添加更长的淡入效果来平滑过渡（50ms）
-            fade_in_length = min(800, len(samples) - start_index)  # 50ms淡入
-            
-            # 复制切除后的音频
-            processed_samples = samples[start_index:].copy()
-            
-            if fade_in_length > 0 and len(processed_samples) > fade_in_length:
-                # 使用更平滑的淡入曲线（余弦曲线）
-                fade_in = np.cos(np.linspace(np.pi/2, 0, fade_in_length))
-                processed_samples[:fade_in_length] = (processed_samples[:fade_in_length] * fade_in).astype(dtype)
-                
-                print(f"  ✂️ 切除 {start_index} 样本 ({start_index/self.sample_rate*1000:.0f}ms)")
-            
-            # 确保切除后音频不会太短
-            if len(processed_samples) > 1600:  # 至少100ms
-                return processed_samples.tobytes()
-        
-        # 如果没有切除或切除后太短，返回原始数据
-        return pcm_data
+        return self.onset_trimmer.trim(pcm_data)
     def __del__(self):
         """清理资源"""
         try:
             print("🧹 清理TTS模块资源...")
+            if getattr(self, "lookahead_scheduler", None) is not None:
+                self.lookahead_scheduler.shutdown()
+            for character_name in getattr(self, "_worker_characters", []):
+                unload_character(character_name=character_name)
             unload_character(character_name=LOCAL_CHAR_NAME)
             clear_reference_audio_cache()
             print("✅ TTS模块资源已清理")
@@ -0,0 +1,237 @@
+# tts_scheduler.py
+"""
+预合成调度器：句子N播放时，工作线程已经在合成句子N+1、N+2...
+每个句子对应一个分片队列，输出线程按句子顺序逐个排空（重排序缓冲），
+所以即使后面的句子先合成完，AudioData仍按原顺序输出；队首句子的分片一产出就立即转发。
+"""
+import queue
+import threading
+import time
+from typing import Callable, Iterable, Optional, Dict, Any
+
+from base_interface import AudioData, TextData
+
+
+class _SynthesisJob:
+    """一个待合成的句子及其分片输出队列"""
+    __slots__ = ("seq", "text", "text_data", "chunks")
+
+    def __init__(self, seq: int, text: str, text_data: TextData):
+        self.seq = seq
+        self.text = text
+        self.text_data = text_data
+        self.chunks: queue.Queue = queue.Queue()
+
+
+class LookaheadTTSScheduler:
+    """多线程预合成调度器：并发合成后续句子，按输入顺序输出AudioData"""
+
+    def __init__(
+        self,
+        synthesize: Callable[[str], Iterable[bytes]],
+        make_audio: Callable[[bytes, bool, Optional[TextData]], AudioData],
+        num_workers: int = 2,
+        max_pending: int = 4,
+        worker_init: Optional[Callable[[int], None]] = None,
+    ):
+        """
+        :param synthesize: 合成函数，输入句子文本，逐段产出PCM
+        :param make_audio: 把PCM封装为AudioData（pcm, is_finish, 来源TextData）
+        :param num_workers: 工作线程数
+        :param max_pending: 最多同时在途（合成中或等待输出）的句子数
+        :param worker_init: 工作线程启动时调用（参数为线程序号），用于加载线程专属的角色
+        """
+        self.synthesize = synthesize
+        self.make_audio = make_audio
+        self.num_workers = num_workers
+        self.worker_init = worker_init
+        self._jobs: queue.Queue = queue.Queue()
+        self._slots = threading.Semaphore(max_pending)
+
+        # 统计
+        self.sentences = 0
+        self.errors = 0
+        self.head_wait_time = 0.0  # 输出线程等待队首句子合成的累计时间（播放等合成的时间）
+        self.cancelled = 0         # 被打断而放弃的句子数
+        # 轮次号不大于该值的句子被取消（打断时设置）
+        self.cancelled_through_turn = 0
+        # 初始化成功（或尚在初始化）的工作线程数；全部初始化失败时记录错误，句子直接按失败输出
+        self._alive_workers = num_workers
+        self._alive_lock = threading.Lock()
+        self.init_error: Optional[Exception] = None
+
+        self._workers = []
+        for i in range(num_workers):
+            worker = threading.Thread(target=self._worker_loop, args=(i,), name=f"TTS-Worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    # ===================== 工作线程 =====================
+    def _worker_loop(self, worker_index: int):
+        """工作线程：取句子合成，把分片写入该句子自己的队列"""
+        if self.worker_init:
+            try:
+                self.worker_init(worker_index)
+            except Exception as e:
+                print(f"❌ TTS工作线程 #{worker_index} 初始化失败: {e}")
+                with self._alive_lock:
+                    self._alive_workers -= 1
+                    if self._alive_workers > 0:
+                        return
+                    self.init_error = e
+                print("❌ 所有TTS工作线程初始化失败，后续句子将直接报错")
+                self._fail_queued_jobs()
+                return
+
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            # 排队期间被取消：不再合成
+            if self.is_cancelled(job.text_data):
+                job.chunks.put(("done", None))
+                continue
+            try:
+                for pcm in self.synthesize(job.text):
+                    # 句子被取消：不再继续合成，释放算力
+                    if self.is_cancelled(job.text_data):
+                        break
+                    if pcm:
+                        job.chunks.put(("pcm", pcm))
+                job.chunks.put(("done", None))
+            except Exception as e:
+                job.chunks.put(("error", e))
+
+    def _fail_queued_jobs(self):
+        """没有可用的工作线程：排队的句子全部按失败输出，避免输出线程一直等待"""
+        while True:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                return
+            if job is not None:
+                job.chunks.put(("error", self.init_error))
+
+    # ===================== 调度 =====================
+    def run(self, input_queue: queue.Queue, output_queue: queue.Queue, is_running: Callable[[], bool] = lambda: True):
+        """
+        处理一轮对话：从input_queue读句子提交合成，收到结束标记后等全部输出完再返回
+        :param is_running: 返回False时放弃未输出的句子并退出
+        """
+        pending: queue.Queue = queue.Queue()  # 按输入顺序排列的句子（重排序缓冲）
+        emitter = threading.Thread(
+            target=self._emit_loop, args=(pending, output_queue, is_running), name="TTS-Emitter", daemon=True
+        )
+        emitter.start()
+
+        seq = 0
+        ended = False
+        try:
+            while is_running():
+                try:
+                    text_data = input_queue.get(timeout=1.0)
+                except queue.Empty:
+                    continue
+
+                # 结束标记：排在所有句子之后输出
+                if text_data.is_finish and not text_data.text:
+                    pending.put(("end", text_data))
+                    ended = True
+                    break
+
+                text = text_data.text.strip()
+                if not text or self.is_cancelled(text_data):
+                    continue
+
+                # 在途句子数达到上限时等待（对上游形成背压）
+                while not self._slots.acquire(timeout=0.1):
+                    if not is_running():
+                        return
+                seq += 1
+                job = _SynthesisJob(seq, text, text_data)
+                pending.put(("job", job))
+                self._jobs.put(job)
+                if self.init_error is not None:
+                    self._fail_queued_jobs()
+        finally:
+            if not ended:
+                pending.put(("stop", None))
+            emitter.join()
+
+    def _emit_loop(self, pending: queue.Queue, output_queue: queue.Queue, is_running: Callable[[], bool]):
+        """输出线程：按顺序排空每个句子的分片队列"""
+        while True:
+            kind, item = pending.get()
+            if kind == "end":
+                output_queue.put(self.make_audio(b"", True, item))
+                return
+            if kind == "stop":
+                self._drain(pending)
+                return
+
+            job: _SynthesisJob = item
+            try:
+                while True:
+                    wait_start = time.time()
+                    try:
+                        chunk_kind, data = job.chunks.get(timeout=0.1)
+                    except queue.Empty:
+                        self.head_wait_time += time.time() - wait_start
+                        if not is_running():
+                            self._drain(pending)
+                            return
+                        continue
+                    self.head_wait_time += time.time() - wait_start
+
+                    if chunk_kind == "pcm":
+                        if not self.is_cancelled(job.text_data):
+                            output_queue.put(self.make_audio(data, False, job.text_data))
+                    elif chunk_kind == "error":
+                        self.errors += 1
+                        print(f"❌ TTS合成句子 #{job.seq} 失败: {data}")
+                        break
+                    else:
+                        if self.is_cancelled(job.text_data):
+                            self.cancelled += 1
+                        else:
+                            self.sentences += 1
+                        break
+            finally:
+                self._slots.release()
+
+    def _drain(self, pending: queue.Queue):
+        """放弃尚未输出的句子，归还它们占用的名额"""
+        while True:
+            try:
+                kind, _ = pending.get_nowait()
+            except queue.Empty:
+                return
+            if kind == "job":
+                self._slots.release()
+
+    # ===================== 取消 =====================
+    def cancel_turns(self, through_turn_id: int):
+        """取消轮次号不大于through_turn_id的所有句子（排队的不再合成，合成中的在下一段停止，已合成的不再输出）"""
+        self.cancelled_through_turn = max(self.cancelled_through_turn, through_turn_id)
+
+    def is_cancelled(self, text_data: Optional[TextData]) -> bool:
+        turn_id = getattr(text_data, "turn_id", None)
+        return turn_id is not None and turn_id <= self.cancelled_through_turn
+
+    # ===================== 统计与关闭 =====================
+    def get_stats(self) -> Dict[str, Any]:
+        """获取调度统计"""
+        return {
+            "workers": self.num_workers,
+            "sentences": self.sentences,
+            "errors": self.errors,
+            "head_wait_time": round(self.head_wait_time, 3),
+            "cancelled": self.cancelled,
+        }
+
+    def shutdown(self):
+        """停止所有工作线程"""
+        for _ in self._workers:
+            self._jobs.put(None)
+        for worker in self._workers:
+            worker.join(timeout=2)
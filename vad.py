@@ -0,0 +1,273 @@
+# vad.py
+"""
+帧级语音活动检测（VAD）：10~30ms帧 + 起始确认 + 拖尾（hangover）+ 预录（pre-roll）
+- EnergyZCRVAD：短时能量/过零率状态机，噪声底自适应，无额外依赖
+- FsmnVAD：FunASR fsmn-vad 流式模型（可选，需安装funasr）
+- StreamingVAD：把任意长度的采集分片送入检测后端，输出有序的 speech_start / audio / speech_end，
+  语音起点之前pre_roll_ms的音频会一并输出，避免安静的字头被截掉
+"""
+import time
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from audio_ring_buffer import AudioRingBuffer
+
+
+@dataclass
+class VADEvent:
+    """语音起止事件"""
+    kind: str           # "speech_start" / "speech_end"
+    sample: int         # 在音频流中的位置（样本序号）：起点为第一个语音帧开头，终点为最后一个语音帧末尾
+    sample_rate: int
+    wall_time: float    # 该位置对应的采集时刻（time.monotonic()，按实时采集换算）
+
+    @property
+    def time(self) -> float:
+        """在音频流中的时间（秒）"""
+        return self.sample / self.sample_rate
+
+
+# ===================== 检测后端 =====================
+class EnergyZCRVAD:
+    """短时能量 + 过零率 状态机"""
+
+    def __init__(self, sample_rate: int = 16000, frame_ms: int = 20, energy_threshold: float = 0.005,
+                 noise_ratio: float = 3.0, zcr_threshold: float = 0.25, onset_ms: int = 60, hangover_ms: int = 500):
+        """
+        :param frame_ms: 帧长（10~30ms）
+        :param energy_threshold: RMS能量的最低门限（噪声底很低时生效）
+        :param noise_ratio: 门限 = max(energy_threshold, 噪声底 × noise_ratio)
+        :param zcr_threshold: 过零率高于该值且能量达到门限一半时也算语音（清辅音）
+        :param onset_ms: 连续多长的语音帧才确认语音开始（抗瞬态噪声）
+        :param hangover_ms: 语音后连续多长的静音才确认语音结束
+        """
+        self.sample_rate = sample_rate
+        self.frame_length = sample_rate * frame_ms // 1000
+        self.frame_ms = frame_ms
+        self.energy_threshold = energy_threshold
+        self.noise_ratio = noise_ratio
+        self.zcr_threshold = zcr_threshold
+        self.onset_frames = max(1, onset_ms // frame_ms)
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        # 检测相对音频的最大滞后（确认起点需要的帧数）
+        self.max_delay_samples = self.onset_frames * self.frame_length
+        self.reset()
+
+    def reset(self):
+        self.in_speech = False
+        self.noise_floor = self.energy_threshold / self.noise_ratio
+        self._speech_run = 0       # 静音状态下连续语音帧数
+        self._silence_run = 0      # 语音状态下连续静音帧数
+        self._last_speech_end = 0  # 最后一个语音帧的结束位置
+        self._position = 0         # 已分析的样本数（整帧）
+
+    @property
+    def silence_ms(self) -> float:
+        """语音状态下当前已持续的静音时长（毫秒）"""
+        return self._silence_run * self.frame_ms
+
+    def frame_is_speech(self, frames: np.ndarray) -> np.ndarray:
+        """逐帧判定（frames形状为[帧数, 帧长]）"""
+        rms = np.sqrt(np.mean(np.square(frames), axis=1))
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frames.shape[1] - 1)
+        threshold = max(self.energy_threshold, self.noise_floor * self.noise_ratio)
+        voiced = rms > threshold
+        unvoiced = (rms > threshold * 0.5) & (zcr > self.zcr_threshold)
+        is_speech = voiced | unvoiced
+        # 只用静音帧更新噪声底（指数平滑）
+        quiet = rms[~is_speech]
+        if len(quiet) and not self.in_speech:
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * float(np.mean(quiet))
+        return is_speech
+
+    def process(self, samples: np.ndarray) -> List[Tuple[str, int]]:
+        """分析整帧样本（长度需为帧长整数倍），返回[(事件类型, 样本位置)]"""
+        num_frames = len(samples) // self.frame_length
+        if num_frames == 0:
+            return []
+        flags = self.frame_is_speech(samples[:num_frames * self.frame_length].reshape(num_frames, self.frame_length))
+        events = []
+        for i, is_speech in enumerate(flags):
+            frame_start = self._position + i * self.frame_length
+            if not self.in_speech:
+                self._speech_run = self._speech_run + 1 if is_speech else 0
+                if self._speech_run >= self.onset_frames:
+                    self.in_speech = True
+                    self._silence_run = 0
+                    self._last_speech_end = frame_start + self.frame_length
+                    events.append(("speech_start", frame_start - (self.onset_frames - 1) * self.frame_length))
+            elif is_speech:
+                self._silence_run = 0
+                self._last_speech_end = frame_start + self.frame_length
+            else:
+                self._silence_run += 1
+                if self._silence_run >= self.hangover_frames:
+                    self.in_speech = False
+                    self._speech_run = 0
+                    events.append(("speech_end", self._last_speech_end))
+        self._position += num_frames * self.frame_length
+        return events
+
+    def flush(self) -> List[Tuple[str, int]]:
+        """音频流结束：仍在语音中时以最后一个语音帧结束"""
+        if self.in_speech:
+            self.in_speech = False
+            return [("speech_end", self._last_speech_end)]
+        return []
+
+
+class FsmnVAD:
+    """FunASR fsmn-vad 流式后端（按chunk_ms送入模型，模型返回毫秒级起止点）"""
+
+    def __init__(self, sample_rate: int = 16000, chunk_ms: int = 200, model=None):
+        if model is None:
+            from funasr import AutoModel
+            model = AutoModel(model="fsmn-vad", model_revision="v2.0.4", disable_update=True)
+        self.model = model
+        self.sample_rate = sample_rate
+        self.chunk_ms = chunk_ms
+        self.frame_length = sample_rate * chunk_ms // 1000
+        # 模型确认起点的滞后：一个chunk + 模型内部的起点确认窗口（约300ms）
+        self.max_delay_samples = self.frame_length + sample_rate * 3 // 10
+        self.reset()
+
+    def reset(self):
+        self.in_speech = False
+        self.cache = {}
+        self._position = 0
+
+    @property
+    def silence_ms(self) -> float:
+        return 0.0  # 模型内部判定静音，不对外暴露
+
+    def _generate(self, samples: np.ndarray, is_final: bool) -> List[Tuple[str, int]]:
+        res = self.model.generate(input=samples, cache=self.cache, is_final=is_final, chunk_size=self.chunk_ms)
+        events = []
+        for begin_ms, end_ms in (res[0].get("value", []) if res else []):
+            if begin_ms >= 0 and not self.in_speech:
+                self.in_speech = True
+                events.append(("speech_start", begin_ms * self.sample_rate // 1000))
+            if end_ms >= 0 and self.in_speech:
+                self.in_speech = False
+                events.append(("speech_end", end_ms * self.sample_rate // 1000))
+        return events
+
+    def process(self, samples: np.ndarray) -> List[Tuple[str, int]]:
+        num_chunks = len(samples) // self.frame_length
+        events = []
+        for i in range(num_chunks):
+            events.extend(self._generate(samples[i * self.frame_length:(i + 1) * self.frame_length], False))
+        self._position += num_chunks * self.frame_length
+        return events
+
+    def flush(self) -> List[Tuple[str, int]]:
+        events = self._generate(np.zeros(self.frame_length, dtype=np.float32), True)
+        if self.in_speech:
+            self.in_speech = False
+            events.append(("speech_end", self._position))
+        return events
+
+
+def create_vad_backend(backend: str = "energy", sample_rate: int = 16000, **kwargs):
+    """创建检测后端：energy（默认）或 fsmn（需要funasr，加载失败时回退为energy）"""
+    # 两个后端各自的参数（如hangover_ms只对能量VAD有效，fsmn-vad在模型内部判定）
+    fsmn_keys = ("chunk_ms", "model")
+    if backend == "fsmn":
+        try:
+            return FsmnVAD(sample_rate=sample_rate, **{k: v for k, v in kwargs.items() if k in fsmn_keys})
+        except Exception as e:
+            print(f"⚠️ fsmn-vad加载失败，回退为能量/过零率VAD: {e}")
+    return EnergyZCRVAD(sample_rate=sample_rate, **{k: v for k, v in kwargs.items() if k not in fsmn_keys})
+
+
+# ===================== 流式VAD =====================
+class StreamingVAD:
+    """任意长度采集分片 → 有序的 ("speech_start", VADEvent) / ("audio", 样本视图) / ("speech_end", VADEvent)"""
+
+    def __init__(self, sample_rate: int = 16000, backend: str = "energy", pre_roll_ms: int = 300, **backend_kwargs):
+        """
+        :param backend: "energy" 或 "fsmn"
+        :param pre_roll_ms: 语音起点之前额外输出的音频时长
+        """
+        self.sample_rate = sample_rate
+        self.backend = create_vad_backend(backend, sample_rate, **backend_kwargs)
+        self.pre_roll_samples = sample_rate * pre_roll_ms // 1000
+        # 单次分析的最大样本数（大分片拆开处理，保证历史缓冲始终够用）
+        self.max_block = self.backend.frame_length * max(1, sample_rate // 10 // self.backend.frame_length)
+        self.history = AudioRingBuffer(self.pre_roll_samples + self.backend.max_delay_samples + 2 * self.max_block)
+        self.reset()
+
+    def reset(self):
+        """开始新的音频流"""
+        self.backend.reset()
+        self.history.clear()
+        self.position = 0           # 已写入的样本数
+        self._analyzed = 0          # 已送入检测后端的样本数
+        self._forward_from: Optional[int] = None  # 语音中：下一段待输出音频的起点
+
+    @property
+    def in_speech(self) -> bool:
+        return self._forward_from is not None
+
+    @property
+    def silence_ms(self) -> float:
+        """语音状态下当前已持续的静音时长（毫秒）"""
+        return self.backend.silence_ms
+
+    # ===================== 输入 =====================
+    def process_pcm16(self, pcm_data: bytes) -> Iterator[Tuple[str, object]]:
+        """输入16bit单声道PCM"""
+        view = memoryview(pcm_data)
+        step = self.max_block * 2
+        for offset in range(0, len(view), step):
+            self.position += self.history.write_pcm16(view[offset:offset + step])
+            yield from self._analyze()
+
+    def process(self, samples: np.ndarray) -> Iterator[Tuple[str, object]]:
+        """输入float32样本"""
+        for offset in range(0, len(samples), self.max_block):
+            self.position += self.history.write(samples[offset:offset + self.max_block])
+            yield from self._analyze()
+
+    def flush(self) -> Iterator[Tuple[str, object]]:
+        """音频流结束：输出剩余的语音及结束事件"""
+        yield from self._emit(self.backend.flush())
+        if self.in_speech:
+            yield from self._forward(self.position)
+            self._forward_from = None
+
+    # ===================== 内部 =====================
+    def _analyze(self) -> Iterator[Tuple[str, object]]:
+        frame_length = self.backend.frame_length
+        num_samples = (self.position - self._analyzed) // frame_length * frame_length
+        if num_samples:
+            pending = self.history.latest(self.position - self._analyzed)[:num_samples]
+            self._analyzed += num_samples
+            yield from self._emit(self.backend.process(pending))
+        # 语音中：已写入的音频直接输出
+        if self.in_speech:
+            yield from self._forward(self.position)
+
+    def _emit(self, events: List[Tuple[str, int]]) -> Iterator[Tuple[str, object]]:
+        now = time.monotonic()
+        for kind, sample in events:
+            event = VADEvent(kind, sample, self.sample_rate, now - (self.position - sample) / self.sample_rate)
+            if kind == "speech_start" and not self.in_speech:
+                # 从起点前pre_roll处开始输出（不早于历史缓冲里最旧的样本）
+                oldest = self.position - min(self.position, self.history.capacity)
+                self._forward_from = max(oldest, sample - self.pre_roll_samples)
+                yield kind, event
+            elif kind == "speech_end" and self.in_speech:
+                yield from self._forward(max(sample, self._forward_from))
+                self._forward_from = None
+                yield kind, event
+
+    def _forward(self, end: int) -> Iterator[Tuple[str, object]]:
+        """输出[_forward_from, end)之间的音频（缓冲区视图，需在下一次写入前消费）"""
+        if end > self._forward_from:
+            window = self.history.latest(self.position - self._forward_from)
+            yield "audio", window[:end - self._forward_from]
+            self._forward_from = end